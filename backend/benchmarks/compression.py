@@ -0,0 +1,128 @@
+"""Transfer sizes per endpoint with and without response compression.
+
+    cd backend
+    python -m benchmarks.compression
+    python -m benchmarks.compression --build ../frontend/build
+
+Seeds the in-memory stand-in with one account's quotes and customizations
+and fetches each endpoint as identity, gzip and brotli, counting the bytes
+actually sent. ``--build`` also totals a precompressed frontend build.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+os.environ.setdefault("ADMIN_EMAILS", "bench@example.com")
+
+import httpx  # noqa: E402
+
+from benchmarks.load import PASSWORD, install_stand_in  # noqa: E402
+
+ENCODINGS = ("identity", "gzip", "br")
+STATIC_EXTENSIONS = {".js", ".css", ".html", ".json", ".svg", ".map", ".txt", ".ico"}
+
+
+async def seed(client, rows, rng):
+    response = await client.post("/api/auth/register", json={
+        "email": "bench@example.com", "password": PASSWORD,
+        "business_name": "Bench Fireworks", "phone": "555-0100", "account_type": "wholesale",
+    })
+    response.raise_for_status()
+    auth = {"Authorization": "Bearer %s" % response.json()["access_token"]}
+    products = (await client.get("/api/products")).json()["products"]
+    lines = [
+        {"product_id": p["id"], "size": rng.choice(p["sizes"]), "quantity": rng.choice([1, 12, 30, 250]),
+         "message": "Please call before delivery"}
+        for p in (rng.choice(products) for _ in range(rows))
+    ]
+    for start in range(0, rows, 100):
+        response = await client.post("/api/quotes/batch", json={
+            "user_email": "bench@example.com", "business_name": "Bench Fireworks",
+            "lines": lines[start:start + 100],
+        })
+        response.raise_for_status()
+    for index in range(rows):
+        response = await client.post("/api/customizations", headers=auth, json={
+            "product_id": rng.choice(products)["id"], "business_name": "Bench Fireworks",
+            "phone_number": "555-0100", "logo_url": None, "logo_position": {"x": index % 100, "y": 50},
+        })
+        response.raise_for_status()
+    return auth, lines
+
+
+async def measure(args):
+    rng = random.Random(args.seed)
+    app = install_stand_in(0)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            auth, lines = await seed(client, args.rows, rng)
+            requests = {
+                "GET /api/products": ("GET", "/api/products", {}),
+                "GET /api/quotes": ("GET", "/api/quotes?limit=%d" % args.rows, {"headers": auth}),
+                "GET /api/quotes (ndjson)": ("GET", "/api/quotes?stream=true", {"headers": auth}),
+                "GET /api/customizations": ("GET", "/api/customizations?limit=%d" % args.rows, {"headers": auth}),
+                "POST /api/pricing/estimate": ("POST", "/api/pricing/estimate", {"json": {"lines": lines}}),
+                "GET /api/admin/stats": ("GET", "/api/admin/stats", {"headers": auth}),
+            }
+            report = {}
+            for name, (method, path, kwargs) in requests.items():
+                row = {}
+                for encoding in ENCODINGS:
+                    headers = {**kwargs.get("headers", {}), "Accept-Encoding": encoding}
+                    started = time.perf_counter()
+                    response = await client.request(method, path, **{**kwargs, "headers": headers})
+                    await response.aread()
+                    elapsed = time.perf_counter() - started
+                    response.raise_for_status()
+                    row[encoding] = {
+                        "bytes": response.num_bytes_downloaded,
+                        "content_encoding": response.headers.get("content-encoding", "identity"),
+                        "ms": round(elapsed * 1000, 2),
+                    }
+                identity = row["identity"]["bytes"]
+                for encoding in ENCODINGS[1:]:
+                    row[encoding]["saved"] = "%.1f%%" % (100 - 100 * row[encoding]["bytes"] / identity)
+                report[name] = row
+            return report
+
+
+def build_sizes(build_dir: Path) -> dict:
+    totals = {"files": 0, "identity": 0, "gzip": 0, "br": 0}
+    for path in build_dir.rglob("*"):
+        if not path.is_file() or path.suffix not in STATIC_EXTENSIONS:
+            continue
+        size = path.stat().st_size
+        gz, br = Path(str(path) + ".gz"), Path(str(path) + ".br")
+        totals["files"] += 1
+        totals["identity"] += size
+        # Files too small to precompress go out as they are
+        totals["gzip"] += gz.stat().st_size if gz.exists() else size
+        totals["br"] += br.stat().st_size if br.exists() else size
+    for encoding in ("gzip", "br"):
+        if totals["identity"]:
+            totals["%s_saved" % encoding] = "%.1f%%" % (100 - 100 * totals[encoding] / totals["identity"])
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500, help="quotes and customizations to seed")
+    parser.add_argument("--build", type=Path, help="precompressed frontend build directory")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    result = {"rows": args.rows, "endpoints": asyncio.run(measure(args))}
+    if args.build:
+        result["frontend_build"] = build_sizes(args.build)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
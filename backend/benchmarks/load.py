@@ -0,0 +1,384 @@
+"""Mixed-workload load test with RPS and latency percentiles as JSON.
+
+Drives browse / login / upload / customize / quote scenarios from
+``--concurrency`` closed-loop clients against the app booted in-process
+(ASGI, no sockets), under uvicorn in a child process, or an existing
+deployment. The first two run on the in-memory Mongo stand-in.
+
+    cd backend
+    python -m benchmarks.load run --out base.json
+    python -m benchmarks.load run --target uvicorn --concurrency 100 --duration 30 --out new.json
+    python -m benchmarks.load run --target http://localhost:8001 --mix browse=80,quote=20
+    python -m benchmarks.load diff base.json new.json --threshold 10
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+# Every simulated client shares one address and a small account pool, so the
+# in-process and uvicorn targets measure the app, not its rate limits
+for _route_class in ("LOGIN", "REGISTER", "UPLOAD"):
+    for _key in ("IP", "ACCOUNT"):
+        os.environ.setdefault("RATE_LIMIT_%s_%s" % (_route_class, _key), "0")
+
+import httpx  # noqa: E402
+
+from benchmarks.memory_mongo import MemoryClient  # noqa: E402
+
+DEFAULT_MIX = "browse=50,login=10,upload=5,customize=15,quote=20"
+PASSWORD = "LoadTest123!"
+PERCENTILES = (50, 90, 99)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit("unknown scenario %r, expected one of %s" % (name, ", ".join(SCENARIOS)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def make_logo(seed):
+    from PIL import Image
+    image = Image.new("RGBA", (64, 64), (seed % 256, (seed * 7) % 256, (seed * 13) % 256, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class Session:
+    """Per-client state: one seeded account and its most recent upload."""
+
+    def __init__(self, client, account, products, rng):
+        self.client = client
+        self.email, self.token, self.logo_url = account
+        self.products = products
+        self.rng = rng
+        self.samples = []
+
+    @property
+    def auth(self):
+        return {"Authorization": "Bearer %s" % self.token}
+
+    async def request(self, scenario, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.samples.append((scenario, time.perf_counter() - started, status))
+        return response
+
+
+async def browse(session):
+    headers = {"Accept-Encoding": "gzip"}
+    await session.request("browse", "GET", "/api/products", headers=headers)
+    product = session.rng.choice(session.products)
+    await session.request("browse", "GET", "/api/products/%s" % product["id"], headers=headers)
+
+
+async def login(session):
+    response = await session.request("login", "POST", "/api/auth/login", json={
+        "email": session.email, "password": PASSWORD,
+    })
+    if response is not None and response.status_code == 200:
+        session.token = response.json()["access_token"]
+
+
+async def upload(session):
+    # Mostly fresh content, with some repeats to exercise deduplication
+    logo = make_logo(session.rng.randrange(1000))
+    response = await session.request("upload", "POST", "/api/upload", headers=session.auth,
+                                     files={"file": ("logo.png", logo, "image/png")})
+    if response is not None and response.status_code == 200:
+        session.logo_url = response.json()["file_url"]
+
+
+async def customize(session):
+    product = session.rng.choice([p for p in session.products if p.get("customizable")] or session.products)
+    await session.request("customize", "POST", "/api/customizations", headers=session.auth, json={
+        "product_id": product["id"],
+        "business_name": "Load Test Fireworks",
+        "phone_number": "555-0100",
+        "logo_url": session.logo_url,
+        "logo_position": {"x": 50, "y": 50},
+    })
+    await session.request("customize", "GET", "/api/customizations?limit=20", headers=session.auth)
+
+
+async def quote(session):
+    product = session.rng.choice(session.products)
+    await session.request("quote", "POST", "/api/quotes", json={
+        "user_email": session.email,
+        "business_name": "Load Test Fireworks",
+        "product_name": product["name"],
+        "customization_data": {"product_id": product["id"]},
+        "quantity": session.rng.randint(1, 500),
+    })
+    await session.request("quote", "GET", "/api/quotes?limit=20", headers=session.auth)
+
+
+SCENARIOS = {
+    "browse": browse,
+    "login": login,
+    "upload": upload,
+    "customize": customize,
+    "quote": quote,
+}
+
+
+async def seed_accounts(client, count):
+    accounts = []
+    for index in range(count):
+        email = "load_%d_%s@example.com" % (index, uuid.uuid4().hex[:6])
+        response = await client.post("/api/auth/register", json={
+            "email": email, "password": PASSWORD,
+            "business_name": "Load %d" % index, "phone": "555-0100",
+        })
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        response = await client.post("/api/upload", headers={"Authorization": "Bearer %s" % token},
+                                     files={"file": ("logo.png", make_logo(index), "image/png")})
+        response.raise_for_status()
+        accounts.append((email, token, response.json()["file_url"]))
+    return accounts
+
+
+async def drive(client, args):
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    products = (await client.get("/api/products")).json()["products"]
+    accounts = await seed_accounts(client, args.accounts)
+
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(index):
+        rng = random.Random(args.seed + index)
+        session = Session(client, accounts[index % len(accounts)], products, rng)
+        while time.perf_counter() < deadline:
+            await SCENARIOS[rng.choices(names, weights)[0]](session)
+        return session.samples
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return [sample for samples in results for sample in samples], elapsed
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    def stats(rows):
+        latencies = sorted(latency for _, latency, _ in rows)
+        errors = sum(1 for _, _, status in rows if not 200 <= status < 400)
+        statuses = Counter(str(status) for _, _, status in rows)
+        result = {
+            "requests": len(rows),
+            "errors": errors,
+            "status": dict(sorted(statuses.items())),
+            "rps": round(len(rows) / elapsed, 1),
+        }
+        for pct in PERCENTILES:
+            value = percentile(latencies, pct)
+            result["p%d_ms" % pct] = round(value * 1000, 2) if value is not None else None
+        result["max_ms"] = round(latencies[-1] * 1000, 2) if latencies else None
+        return result
+
+    by_scenario = defaultdict(list)
+    for sample in samples:
+        by_scenario[sample[0]].append(sample)
+    return {
+        "overall": stats(samples),
+        "scenarios": {name: stats(rows) for name, rows in sorted(by_scenario.items())},
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(client, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise SystemExit("server did not become ready within %.0fs" % timeout)
+
+
+def install_stand_in(latency_ms):
+    import server
+    from database import Database
+    server.app.state.db = Database(MemoryClient(latency=latency_ms / 1000.0), "load_%s" % uuid.uuid4().hex[:8])
+    return server.app
+
+
+async def run_in_process(args):
+    app = install_stand_in(args.latency_ms)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+            return await drive(client, args)
+
+
+async def run_over_http(args, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await wait_ready(client)
+        return await drive(client, args)
+
+
+def run(args):
+    if args.target == "inprocess":
+        samples, elapsed = asyncio.run(run_in_process(args))
+    elif args.target == "uvicorn":
+        port = free_port()
+        child = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.load", "serve",
+            "--port", str(port), "--latency-ms", str(args.latency_ms),
+        ])
+        try:
+            samples, elapsed = asyncio.run(run_over_http(args, "http://127.0.0.1:%d" % port))
+        finally:
+            child.terminate()
+            child.wait(timeout=30)
+    else:
+        samples, elapsed = asyncio.run(run_over_http(args, args.target.rstrip("/")))
+
+    report = {
+        "meta": {
+            "target": args.target,
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "latency_ms": args.latency_ms if args.target in ("inprocess", "uvicorn") else None,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - elapsed)),
+        },
+        **summarize(samples, elapsed),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def serve(args):
+    import uvicorn
+    app = install_stand_in(args.latency_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def diff(args):
+    with open(args.base) as handle:
+        base = json.load(handle)
+    with open(args.new) as handle:
+        new = json.load(handle)
+
+    rows, regressions = {}, []
+    sections = [("overall", base["overall"], new["overall"])] + [
+        (name, base["scenarios"][name], new["scenarios"][name])
+        for name in sorted(set(base["scenarios"]) & set(new["scenarios"]))
+    ]
+    for name, before, after in sections:
+        row = {}
+        for key in ["rps"] + ["p%d_ms" % pct for pct in PERCENTILES]:
+            delta = change(before.get(key), after.get(key))
+            row[key] = {"base": before.get(key), "new": after.get(key), "change_pct": delta}
+            if delta is None:
+                continue
+            # Throughput regresses downwards, latency upwards
+            worse = -delta if key == "rps" else delta
+            if worse > args.threshold:
+                regressions.append("%s %s %+.1f%%" % (name, key, delta))
+        rows[name] = row
+
+    # Runs with different settings are not comparable; say so rather than refuse
+    mismatched = [key for key in ("target", "mix", "concurrency", "latency_ms")
+                  if base["meta"].get(key) != new["meta"].get(key)]
+    print(json.dumps({
+        "threshold_pct": args.threshold,
+        "settings_differ": mismatched,
+        "regressions": regressions,
+        "changes": rows,
+    }, indent=2))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a workload and report percentiles")
+    run_parser.add_argument("--target", default="inprocess",
+                            help="'inprocess', 'uvicorn', or the base URL of a running server")
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight pairs, e.g. %s" % DEFAULT_MIX)
+    run_parser.add_argument("--accounts", type=int, default=10, help="accounts registered before the run")
+    run_parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated round-trip for the stand-in")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--out", help="also write the report to this file")
+
+    serve_parser = commands.add_parser("serve", help="uvicorn on the stand-in (used by --target uvicorn)")
+    serve_parser.add_argument("--port", type=int, default=8001)
+    serve_parser.add_argument("--latency-ms", type=float, default=2.0)
+
+    diff_parser = commands.add_parser("diff", help="compare two reports; exits 1 on regression")
+    diff_parser.add_argument("base")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--threshold", type=float, default=10.0,
+                             help="percent change in rps or a percentile that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "serve":
+        serve(args)
+    else:
+        sys.exit(diff(args))
+
+
+if __name__ == "__main__":
+    main()
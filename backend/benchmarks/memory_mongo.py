@@ -0,0 +1,440 @@
+"""In-process stand-in for the subset of the motor API the backend uses.
+
+Benchmarks run against this when no mongod is available. Every operation can
+carry a simulated round-trip latency, either awaited (how motor behaves) or
+slept synchronously (how the old pymongo calls behaved inside async routes).
+"""
+import asyncio
+import copy
+import itertools
+import time
+from bson import ObjectId
+
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None, False
+        value = value[part]
+    return value, True
+
+
+def _compare(op, value, expected):
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if op == "$ne":
+        return value != expected
+    if op == "$eq":
+        return value == expected
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > expected
+    if op == "$gte":
+        return value >= expected
+    if op == "$lt":
+        return value < expected
+    if op == "$lte":
+        return value <= expected
+    raise NotImplementedError(op)
+
+
+def matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value, present = _get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for op, expected in condition.items():
+                if op == "$exists":
+                    if present != bool(expected):
+                        return False
+                elif not _compare(op, value, expected):
+                    return False
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        result = {}
+        for key in include:
+            value, found = _get_path(doc, key)
+            if found:
+                _set_path(result, key, copy.deepcopy(value))
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = copy.deepcopy(doc)
+    for key, value in projection.items():
+        if not value:
+            result.pop(key, None)
+    return result
+
+
+def apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for key, value in fields.items():
+                _set_path(doc, key, copy.deepcopy(value))
+        elif op == "$inc":
+            for key, value in fields.items():
+                current, _ = _get_path(doc, key)
+                _set_path(doc, key, (current or 0) + value)
+        elif op == "$unset":
+            for key in fields:
+                doc.pop(key, None)
+        elif op == "$max":
+            for key, value in fields.items():
+                current, present = _get_path(doc, key)
+                if not present or value > current:
+                    _set_path(doc, key, value)
+        elif op == "$min":
+            for key, value in fields.items():
+                current, present = _get_path(doc, key)
+                if not present or value < current:
+                    _set_path(doc, key, value)
+        elif op == "$push":
+            for key, value in fields.items():
+                current, _ = _get_path(doc, key)
+                _set_path(doc, key, (current or []) + [copy.deepcopy(value)])
+        elif op == "$setOnInsert":
+            continue
+        else:
+            raise NotImplementedError(op)
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _sort_key(value):
+    # Mongo orders missing/None before everything else
+    return (value is not None, value)
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class BulkWriteResult:
+    def __init__(self, inserted_count, upserted_count, modified_count):
+        self.inserted_count = inserted_count
+        self.upserted_count = upserted_count
+        self.modified_count = modified_count
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._buffer = None
+
+    def sort(self, key, direction=None):
+        if isinstance(key, list):
+            self._sort.extend(key)
+        else:
+            self._sort.append((key, direction or 1))
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _materialize(self):
+        docs = [d for d in self._collection._docs.values() if matches(d, self._query)]
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda d: _sort_key(_get_path(d, key)[0]), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(d, self._projection) for d in docs]
+
+    async def to_list(self, length=None):
+        await self._collection._client._delay()
+        docs = self._materialize()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._buffer is None:
+            await self._collection._client._delay()
+            self._buffer = iter(self._materialize())
+        try:
+            return next(self._buffer)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def explain(self):
+        return self._collection._explain(self._query, self._sort)
+
+
+class MemoryCollection:
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+        self._docs = {}
+        self._indexes = {"_id_": {"key": [("_id", 1)], "unique": True}}
+
+    def _unique_violation(self, doc, ignore_id=None):
+        for name, spec in self._indexes.items():
+            if not spec.get("unique") or name == "_id_":
+                continue
+            fields = [k for k, _ in spec["key"]]
+            key = tuple(_get_path(doc, f)[0] for f in fields)
+            for other in self._docs.values():
+                if other["_id"] == ignore_id:
+                    continue
+                if tuple(_get_path(other, f)[0] for f in fields) == key:
+                    return name
+        return None
+
+    def _insert(self, document):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._docs or self._unique_violation(document):
+            from pymongo.errors import DuplicateKeyError
+            raise DuplicateKeyError("E11000 duplicate key error collection: %s" % self.name)
+        self._docs[document["_id"]] = copy.deepcopy(document)
+        return document["_id"]
+
+    def _explain(self, query, sort):
+        fields = [k for k in (query or {}) if not k.startswith("$")]
+        for name, spec in self._indexes.items():
+            keys = [k for k, _ in spec["key"]]
+            if fields and keys[:len(fields)] == fields[:len(keys)] and keys[0] in fields:
+                return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}}}
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        await self._client._delay()
+        cursor = MemoryCursor(self, query, projection)
+        if sort:
+            cursor.sort(sort)
+        docs = cursor.limit(1)._materialize()
+        return docs[0] if docs else None
+
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        cursor = MemoryCursor(self, query, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    async def insert_one(self, document):
+        await self._client._delay()
+        return InsertOneResult(self._insert(document))
+
+    def _write_batch(self, operations, ordered):
+        # Mirrors the driver: collect per-operation errors, stop at the first
+        # one when ordered, then raise them together as a BulkWriteError
+        from pymongo.errors import BulkWriteError, DuplicateKeyError
+        results, errors = [], []
+        for index, operation in enumerate(operations):
+            try:
+                results.append(operation())
+            except DuplicateKeyError as exc:
+                errors.append({"index": index, "code": 11000, "errmsg": str(exc)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(results)})
+        return results
+
+    async def insert_many(self, documents, ordered=True):
+        await self._client._delay()
+        return InsertManyResult(self._write_batch(
+            [lambda d=d: self._insert(d) for d in documents], ordered))
+
+    def _update(self, query, update, upsert, many):
+        matched = [d for d in self._docs.values() if matches(d, query)]
+        if not many:
+            matched = matched[:1]
+        for doc in matched:
+            apply_update(doc, update)
+        upserted_id = None
+        if not matched and upsert:
+            doc = {k: copy.deepcopy(v) for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(doc, update, inserting=True)
+            upserted_id = self._insert(doc)
+        return UpdateResult(len(matched), len(matched), upserted_id)
+
+    async def update_one(self, query, update, upsert=False):
+        await self._client._delay()
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query, update, upsert=False):
+        await self._client._delay()
+        return self._update(query, update, upsert, many=True)
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False, return_document=False):
+        await self._client._delay()
+        cursor = MemoryCursor(self, query, None)
+        if sort:
+            cursor.sort(sort)
+        found = cursor.limit(1)._materialize()
+        if not found:
+            if not upsert:
+                return None
+            result = self._update(query, update, True, many=False)
+            return project(self._docs[result.upserted_id], projection) if return_document else None
+        before = found[0]
+        stored = self._docs[before["_id"]]
+        apply_update(stored, update)
+        return project(stored if return_document else before, projection)
+
+    async def delete_one(self, query):
+        await self._client._delay()
+        for key, doc in list(self._docs.items()):
+            if matches(doc, query):
+                del self._docs[key]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def delete_many(self, query):
+        await self._client._delay()
+        doomed = [k for k, d in self._docs.items() if matches(d, query)]
+        for key in doomed:
+            del self._docs[key]
+        return DeleteResult(len(doomed))
+
+    async def count_documents(self, query):
+        await self._client._delay()
+        return sum(1 for d in self._docs.values() if matches(d, query))
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._client._delay()
+        counts = {"inserted": 0, "upserted": 0, "modified": 0}
+
+        def apply(request):
+            kind = type(request).__name__
+            doc = request._doc
+            if kind == "InsertOne":
+                self._insert(doc)
+                counts["inserted"] += 1
+            elif kind in ("UpdateOne", "UpdateMany"):
+                result = self._update(request._filter, doc, request._upsert, many=kind == "UpdateMany")
+                counts["modified"] += result.modified_count
+                counts["upserted"] += 1 if result.upserted_id is not None else 0
+            else:
+                raise NotImplementedError(kind)
+
+        self._write_batch([lambda r=r: apply(r) for r in requests], ordered)
+        return BulkWriteResult(counts["inserted"], counts["upserted"], counts["modified"])
+
+    async def create_index(self, keys, name=None, unique=False, **kwargs):
+        await self._client._delay()
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        name = name or "_".join("%s_%s" % pair for pair in keys)
+        self._indexes[name] = {"key": list(keys), "unique": unique, **kwargs}
+        return name
+
+    async def drop_index(self, name):
+        await self._client._delay()
+        self._indexes.pop(name, None)
+
+    async def index_information(self):
+        await self._client._delay()
+        return copy.deepcopy(self._indexes)
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self._client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self._client, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, *args, **kwargs):
+        await self._client._delay()
+        return {"ok": 1.0}
+
+
+class MemoryClient:
+    """Motor-shaped client; ``blocking=True`` reproduces sync-driver stalls."""
+
+    def __init__(self, latency=0.0, blocking=False):
+        self.latency = latency
+        self.blocking = blocking
+        self._databases = {}
+        self.operations = itertools.count()
+
+    async def _delay(self):
+        next(self.operations)
+        if not self.latency:
+            return
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def close(self):
+        pass
@@ -0,0 +1,106 @@
+"""In-process stand-in for the subset of redis.asyncio the shared cache uses.
+
+Several ``SharedCache`` instances pointed at one ``MemoryRedis`` behave like
+workers sharing a Redis server, pub/sub included. Setting ``down`` makes
+every command fail the way an unreachable server does.
+"""
+import asyncio
+import time
+
+from redis.exceptions import ConnectionError
+
+
+class MemoryRedis:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.down = False
+        self._data = {}
+        self._subscribers = {}
+
+    async def _delay(self):
+        if self.down:
+            raise ConnectionError("Error connecting to stand-in Redis")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    async def get(self, key):
+        await self._delay()
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        await self._delay()
+        if nx and self._live(key):
+            return None
+        expires = None
+        if px is not None:
+            expires = time.monotonic() + px / 1000
+        elif ex is not None:
+            expires = time.monotonic() + ex
+        self._data[key] = (self._encode(value), expires)
+        return True
+
+    async def delete(self, *keys):
+        await self._delay()
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    async def incr(self, key, amount=1):
+        await self._delay()
+        entry = self._live(key)
+        value = int(entry[0]) + amount if entry else amount
+        self._data[key] = (self._encode(value), entry[1] if entry else None)
+        return value
+
+    async def pexpire(self, key, milliseconds):
+        await self._delay()
+        entry = self._live(key)
+        if not entry:
+            return False
+        self._data[key] = (entry[0], time.monotonic() + milliseconds / 1000)
+        return True
+
+    async def publish(self, channel, message):
+        await self._delay()
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": self._encode(message)})
+        return len(queues)
+
+    def pubsub(self):
+        return MemoryPubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class MemoryPubSub:
+    def __init__(self, redis):
+        self._redis = redis
+        self._queue = asyncio.Queue()
+        self._channels = []
+
+    async def subscribe(self, *channels):
+        await self._redis._delay()
+        for channel in channels:
+            self._redis._subscribers.setdefault(channel, []).append(self._queue)
+            self._channels.append(channel)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def aclose(self):
+        for channel in self._channels:
+            self._redis._subscribers.get(channel, []).remove(self._queue)
+        self._channels = []
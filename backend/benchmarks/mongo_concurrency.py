@@ -0,0 +1,166 @@
+"""p50/p99 latency of the API under concurrent clients, sync vs async driver.
+
+"before" reproduces the old behaviour: Mongo calls that block the event loop
+(pymongo inside ``async def``). "after" uses the awaitable data layer.
+
+    cd backend
+    python -m benchmarks.mongo_concurrency                      # in-process stand-in
+    python -m benchmarks.mongo_concurrency --mongo-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from catalog import CatalogSnapshot  # noqa: E402
+from database import Database  # noqa: E402
+from benchmarks.memory_mongo import MemoryClient  # noqa: E402
+
+
+class _BlockingCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._cursor)
+
+
+class _BlockingCollection:
+    # Async signatures over a synchronous pymongo collection: exactly what
+    # the routes did before, so the loop stalls for every round-trip.
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _BlockingCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class _BlockingDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        return _BlockingCollection(self._database[name])
+
+    __getitem__ = __getattr__
+
+
+class _BlockingClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return _BlockingDatabase(self._client[name])
+
+    def close(self):
+        self._client.close()
+
+
+def build_database(mode, args):
+    name = "bench_%s" % uuid.uuid4().hex[:8]
+    if args.mongo_url:
+        if mode == "before":
+            from pymongo import MongoClient
+            return Database(_BlockingClient(MongoClient(args.mongo_url)), name)
+        return Database.connect(args.mongo_url, name)
+    return Database(MemoryClient(latency=args.latency_ms / 1000.0, blocking=mode == "before"), name)
+
+
+async def seed(database, users, quotes_per_user):
+    emails = []
+    for i in range(users):
+        email = "bench%d@example.com" % i
+        await database.users.create({
+            "id": str(uuid.uuid4()), "email": email, "password": b"x",
+            "business_name": "Bench %d" % i, "phone": "555-0100",
+            "account_type": "regular", "wholesale_approved": True,
+            "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+        })
+        for _ in range(quotes_per_user):
+            await database.quotes.create({
+                "id": str(uuid.uuid4()), "user_email": email, "business_name": "Bench",
+                "product_name": "Custom Feather Flag - Premium", "customization_data": {},
+                "quantity": 10, "message": None, "status": "pending",
+                "created_at": datetime.utcnow(),
+            })
+        emails.append(email)
+    return emails
+
+
+async def run(mode, args):
+    database = build_database(mode, args)
+    emails = await seed(database, args.users, args.quotes_per_user)
+    server.app.dependency_overrides[server.get_db] = lambda: database
+    snapshot = CatalogSnapshot.build(0, server.PRODUCTS)
+    server.app.dependency_overrides[server.get_catalog] = lambda: snapshot
+    paths = ["/api/auth/me", "/api/quotes", "/api/products", "/api/customizations"]
+    latencies = []
+
+    async def client_loop(client, index):
+        token = server.create_access_token({"sub": emails[index % len(emails)]})
+        headers = {"Authorization": "Bearer %s" % token}
+        for i in range(args.requests):
+            started = time.perf_counter()
+            response = await client.get(paths[(index + i) % len(paths)], headers=headers)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i) for i in range(args.clients)))
+        elapsed = time.perf_counter() - started
+    server.app.dependency_overrides.clear()
+    database.close()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--quotes-per-user", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated round-trip for the stand-in")
+    parser.add_argument("--mongo-url", default=None, help="benchmark a real mongod instead of the stand-in")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(mode, args)) for mode in ("before", "after")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Pricing a large cart: vectorized engine vs a per-line Python loop.
+
+    cd backend
+    python -m benchmarks.pricing --lines 10000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+import server  # noqa: E402
+from catalog import CatalogSnapshot  # noqa: E402
+from pricing import PRICE_LISTS, QUANTITY_TIERS, SIZE_STEP  # noqa: E402
+
+snapshot = CatalogSnapshot.build(0, server.PRODUCTS)
+
+
+def make_cart(count, seed):
+    rng = random.Random(seed)
+    products = snapshot.catalog.products
+    cart = []
+    for _ in range(count):
+        product = rng.choice(products)
+        cart.append({
+            "product_id": product["id"],
+            "size": rng.choice(product["sizes"]),
+            "quantity": rng.choice([1, 5, 12, 30, 75, 250]),
+        })
+    return cart
+
+
+def price_per_line(cart, price_list):
+    # The straightforward version: look everything up and multiply per line
+    subtotal = 0
+    field = "base_price" if price_list == PRICE_LISTS[0] else "wholesale_price"
+    for line in cart:
+        product = snapshot.catalog.get(line["product_id"])
+        step = product["sizes"].index(line["size"])
+        discount = [d for minimum, d in QUANTITY_TIERS if line["quantity"] >= minimum][-1]
+        unit = round(product[field] * 100 * (1 + SIZE_STEP * step) * (1 - discount))
+        subtotal += unit * line["quantity"]
+    return subtotal / 100
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20, help="best of N runs is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    cart = make_cart(args.lines, args.seed)
+    engine = snapshot.pricing
+    rows, columns = zip(*(engine.resolve(l["product_id"], l["size"]) for l in cart))
+    quantities = [l["quantity"] for l in cart]
+
+    loop_s, loop_total = best_of(args.repeat, lambda: price_per_line(cart, "wholesale"))
+    estimate_s, estimate = best_of(args.repeat, lambda: engine.estimate(cart, "wholesale"))
+    kernel_s, kernel = best_of(args.repeat, lambda: engine.price(rows, columns, quantities, "wholesale"))
+    assert estimate["subtotal"] == loop_total == kernel["subtotal"] / 100
+
+    print(json.dumps({
+        "lines": args.lines,
+        "subtotal": estimate["subtotal"],
+        "per_line_loop_ms": round(loop_s * 1000, 2),
+        "estimate_ms": round(estimate_s * 1000, 2),
+        "matrix_gather_ms": round(kernel_s * 1000, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""N single POST /api/quotes calls vs one POST /api/quotes/batch.
+
+    cd backend
+    python -m benchmarks.quote_batch --lines 80
+    python -m benchmarks.quote_batch --lines 80 --mongo-url mongodb://localhost:27017
+
+Requests go through an in-process ASGI transport, so there is no network
+round-trip per HTTP call; real-world savings are larger than reported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.mongo_concurrency import build_database  # noqa: E402
+from catalog import CatalogSnapshot  # noqa: E402
+
+snapshot = CatalogSnapshot.build(0, server.PRODUCTS)
+
+
+def make_lines(count):
+    products = snapshot.catalog.products
+    return [
+        {
+            "product_id": products[i % len(products)]["id"],
+            "size": products[i % len(products)]["sizes"][0],
+            "quantity": 10 + i,
+            "customization_data": {"business_name": "Bench Fireworks"},
+        }
+        for i in range(count)
+    ]
+
+
+async def run(args):
+    database = build_database("after", args)
+    server.app.dependency_overrides[server.get_db] = lambda: database
+    server.app.dependency_overrides[server.get_catalog] = lambda: snapshot
+    lines = make_lines(args.lines)
+    results = {}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single, batch = [], []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for line in lines:
+                product = snapshot.catalog.get(line["product_id"])
+                response = await client.post("/api/quotes", json={
+                    "user_email": "bench@example.com",
+                    "business_name": "Bench Fireworks",
+                    "product_name": product["name"],
+                    "customization_data": line["customization_data"],
+                    "quantity": line["quantity"],
+                })
+                response.raise_for_status()
+            single.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            response = await client.post("/api/quotes/batch", json={
+                "user_email": "bench@example.com",
+                "business_name": "Bench Fireworks",
+                "lines": lines,
+            })
+            response.raise_for_status()
+            batch.append(time.perf_counter() - started)
+
+    server.app.dependency_overrides.clear()
+    database.close()
+    results["lines"] = args.lines
+    results["single_posts_ms"] = round(min(single) * 1000, 2)
+    results["batch_post_ms"] = round(min(batch) * 1000, 2)
+    results["speedup"] = round(min(single) / min(batch), 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs is reported")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated round-trip for the stand-in")
+    parser.add_argument("--mongo-url", default=None, help="benchmark a real mongod instead of the stand-in")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Search query latency over a large synthetic quote index.
+
+    cd backend
+    python -m benchmarks.search --quotes 1000000
+
+Builds the quote index the way the startup load does (one ``add`` per
+document, oldest first), then times each query shape: exact words, search
+as you type, typos, a multi-field staff query and one customer's own quotes.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+import server  # noqa: E402
+from benchmarks.load import percentile  # noqa: E402
+from search import InvertedIndex  # noqa: E402
+
+SURNAMES = [
+    "smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis", "rodriguez",
+    "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson", "thomas", "taylor", "moore",
+    "jackson", "martin", "lee", "perez", "thompson", "white", "harris", "sanchez", "clark", "ramirez",
+    "lewis", "robinson", "walker", "young", "allen", "king", "wright", "scott", "torres", "nguyen",
+]
+SUFFIXES = ["Fireworks", "Pyrotechnics", "Fireworks Outlet", "Sparklers", "Tent Sales", "Fireworks Supply"]
+PLACES = [
+    "Route 9", "Lakeside", "County Line", "Interstate", "Main Street", "Riverside", "Harbor",
+    "Junction", "Crossroads", "Northgate", "Pinecrest", "Mill Creek",
+]
+MESSAGES = [
+    "Please deliver before July fourth", "Need these for the New Year rush",
+    "Can you match last season's colors", "Rush order for the grand opening",
+    "Call before delivery, gate code at the office", "Bigger logo on the wind side please",
+    "Same artwork as last year", "Quote for two tent locations", "Reflective lettering if possible",
+    "", "", "",
+]
+
+QUERIES = {
+    "exact word": "banner",
+    "two words": "mesh banner",
+    "prefix": "pyrotech",
+    "short prefix": "fe",
+    "typo": "banenr",
+    "typo + prefix": "smiht firew",
+    "staff query": "mesh banner smith fireworks",
+    "rare words": "reflective lettering",
+    "no match": "trebuchet",
+}
+
+
+def business_name(rng):
+    name = "%s %s" % (rng.choice(SURNAMES).title(), rng.choice(SUFFIXES))
+    return name if rng.random() < 0.6 else "%s %s" % (rng.choice(PLACES), name)
+
+
+def build(count, accounts, seed):
+    rng = random.Random(seed)
+    products = [p["name"] for p in server.PRODUCTS]
+    owners = ["customer%d@example.com" % i for i in range(accounts)]
+    names = [business_name(rng) for _ in range(accounts)]
+    index = InvertedIndex(uuid_keys=True)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    for _ in range(count):
+        account = rng.randrange(accounts)
+        index.add(str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                  (names[account], rng.choice(products), rng.choice(MESSAGES)),
+                  owner=owners[account])
+    index.terms()
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return index, owners, {
+        "seconds": round(elapsed, 2),
+        "docs_per_second": round(count / elapsed),
+        "max_rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+        **index.stats(),
+    }
+
+
+def time_query(index, query, owner, limit, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        keys, total = index.search(query, owner=owner, limit=limit)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "total": total,
+        "returned": len(keys),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    index, owners, build_stats = build(args.quotes, args.accounts, args.seed)
+    report = {"quotes": args.quotes, "build": build_stats, "admin": {}, "one_account": {}}
+    for name, query in QUERIES.items():
+        report["admin"][name] = time_query(index, query, None, args.limit, args.repeat)
+        report["one_account"][name] = time_query(index, query, owners[0], args.limit, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
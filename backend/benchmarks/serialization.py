@@ -0,0 +1,149 @@
+"""Serialization cost per endpoint: FastAPI's default path vs orjson.
+
+    cd backend
+    python -m benchmarks.serialization --page 500
+
+``fastapi_default`` is jsonable_encoder plus stdlib json (what a route
+returning a dict cost before), ``encoder_orjson`` is jsonable_encoder plus
+FastJSONResponse (a dict returned under the new default response class) and
+``direct`` is a FastJSONResponse returned by the route itself.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-uploads-"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import server  # noqa: E402
+from catalog import CatalogSnapshot  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+
+snapshot = CatalogSnapshot.build(0, server.PRODUCTS)
+
+
+def make_quotes(count, rng):
+    now = datetime.utcnow()
+    quotes = []
+    for index in range(count):
+        product = rng.choice(snapshot.catalog.products)
+        quantity = rng.choice([1, 5, 12, 30, 75, 250])
+        quotes.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_email": "bench@example.com",
+            "business_name": "Bench Fireworks",
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "size": rng.choice(product["sizes"]),
+            "customization_data": {"product_id": product["id"], "logo_position": {"x": 50, "y": 40}},
+            "quantity": quantity,
+            "message": "Please call before delivery",
+            "account_type": "wholesale",
+            "price_list": "wholesale",
+            "unit_price": product["wholesale_price"],
+            "estimated_total": round(product["wholesale_price"] * quantity, 2),
+            "status": "pending",
+            "created_at": now - timedelta(minutes=index),
+        })
+    return {"quotes": quotes, "next_cursor": "eyJhIjoxfQ"}
+
+
+def make_customizations(count, rng):
+    now = datetime.utcnow()
+    return {"customizations": [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_email": "bench@example.com",
+            "product_id": rng.choice(snapshot.catalog.products)["id"],
+            "business_name": "Bench Fireworks",
+            "phone_number": "555-0100",
+            "logo_url": "/uploads/%064x.png" % rng.getrandbits(256),
+            "logo_position": {"x": rng.randint(0, 100), "y": rng.randint(0, 100)},
+            "created_at": now - timedelta(minutes=index),
+            "updated_at": now - timedelta(minutes=index),
+        }
+        for index in range(count)
+    ], "next_cursor": None}
+
+
+def make_estimate(count, rng):
+    cart = []
+    for _ in range(count):
+        product = rng.choice(snapshot.catalog.products)
+        cart.append({"product_id": product["id"], "size": rng.choice(product["sizes"]),
+                     "quantity": rng.choice([1, 5, 12, 30, 75, 250])})
+    return snapshot.pricing.estimate(cart, "wholesale")
+
+
+def make_stats(days, rng):
+    start = datetime(2025, 1, 1)
+    row = lambda **labels: {**labels, "quotes": rng.randint(1, 500), "quantity": rng.randint(1, 9000),
+                            "estimated_total": round(rng.uniform(10, 90000), 2)}
+    return {
+        "from": start.strftime("%Y-%m-%d"),
+        "until": (start + timedelta(days=days - 1)).strftime("%Y-%m-%d"),
+        "totals": row(),
+        "by_day": [row(day=(start + timedelta(days=d)).strftime("%Y-%m-%d")) for d in range(days)],
+        "by_product": [row(product_id=p["id"], product_name=p["name"], category=p["category"])
+                       for p in snapshot.catalog.products],
+        "by_category": [row(category=c) for c in sorted({p["category"] for p in snapshot.catalog.products})],
+        "by_account_type": [row(account_type=a) for a in ("guest", "retail", "wholesale")],
+    }
+
+
+def make_profile(rng):
+    return {"id": str(uuid.UUID(int=rng.getrandbits(128))), "email": "bench@example.com",
+            "business_name": "Bench Fireworks", "account_type": "wholesale", "wholesale_approved": True}
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", type=int, default=500, help="documents per list page")
+    parser.add_argument("--lines", type=int, default=10000, help="lines in the pricing estimate")
+    parser.add_argument("--repeat", type=int, default=20, help="best of N runs is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payloads = {
+        "GET /api/auth/me": make_profile(rng),
+        "GET /api/quotes": make_quotes(args.page, rng),
+        "GET /api/customizations": make_customizations(args.page, rng),
+        "POST /api/pricing/estimate": make_estimate(args.lines, rng),
+        "GET /api/admin/stats": make_stats(366, rng),
+    }
+
+    report = {}
+    for endpoint, content in payloads.items():
+        default_s, default_body = best_of(args.repeat, lambda: JSONResponse(jsonable_encoder(content)).body)
+        encoder_s, _ = best_of(args.repeat, lambda: FastJSONResponse(jsonable_encoder(content)).body)
+        direct_s, direct_body = best_of(args.repeat, lambda: FastJSONResponse(content).body)
+        assert json.loads(default_body) == json.loads(direct_body), endpoint
+        report[endpoint] = {
+            "bytes": len(direct_body),
+            "fastapi_default_ms": round(default_s * 1000, 3),
+            "encoder_orjson_ms": round(encoder_s * 1000, 3),
+            "direct_ms": round(direct_s * 1000, 3),
+            "speedup": round(default_s / direct_s, 1),
+        }
+    print(json.dumps({"page": args.page, "lines": args.lines, "endpoints": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
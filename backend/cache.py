@@ -0,0 +1,300 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded in-process cache: entries expire after ``ttl`` seconds and the
+    least recently used entry is evicted once ``maxsize`` is reached."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Errors that mean "L2 is unavailable", as opposed to bugs in the caller
+try:
+    from redis.exceptions import RedisError as _RedisError
+    L2_ERRORS = (_RedisError, OSError, asyncio.TimeoutError)
+except ImportError:
+    L2_ERRORS = (OSError, asyncio.TimeoutError)
+
+
+class CacheNamespace:
+    """One named keyspace of a ``SharedCache``: an in-process ``TTLCache``
+    in front of keys shared by every worker through Redis.
+
+    Values must be JSON serializable. ``None`` is never cached.
+    """
+
+    def __init__(self, shared: "SharedCache", name: str, maxsize: int, ttl: float):
+        self.shared = shared
+        self.name = name
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+        self.generation = 0
+        self._generation_checked = 0.0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.l2_hits = 0
+        self.loads = 0
+
+    async def _l2_key(self, key: Hashable) -> str:
+        # Clearing a namespace bumps its generation; workers that missed the
+        # broadcast pick the new one up within generation_refresh seconds
+        now = time.monotonic()
+        if now - self._generation_checked > self.shared.generation_refresh:
+            value = await self.shared.l2_call("get", self.shared.generation_key(self.name))
+            if value is not _MISSING:
+                self.generation = int(value or 0)
+                self._generation_checked = now
+        return "%s:%s:%d:%s" % (self.shared.prefix, self.name, self.generation, key)
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.shared.l2_available:
+            raw = await self.shared.l2_call("get", await self._l2_key(key))
+            if raw not in (_MISSING, None):
+                value = json.loads(raw)
+                self.local.set(key, value)
+                self.l2_hits += 1
+                return value
+        return default
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.local.set(key, value, ttl)
+        if self.shared.l2_available:
+            await self.shared.l2_call("set", await self._l2_key(key), json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: Hashable):
+        self.local.delete(key)
+        if self.shared.l2_available:
+            await self.shared.l2_call("delete", await self._l2_key(key))
+            await self.shared.broadcast(self.name, key=key)
+
+    async def clear(self):
+        self.local.clear()
+        if self.shared.l2_available:
+            generation = await self.shared.l2_call("incr", self.shared.generation_key(self.name))
+            if generation is not _MISSING:
+                self.generation = int(generation)
+                self._generation_checked = time.monotonic()
+                await self.shared.broadcast(self.name, generation=self.generation)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl: Optional[float] = None) -> Any:
+        """Cached value for ``key``, calling ``loader`` at most once per
+        worker at a time and, while Redis is up, roughly once across workers."""
+        value = await self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(key, loader, ttl))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _load(self, key, loader, ttl):
+        lock_key = None
+        if self.shared.l2_available:
+            lock_key = "%s:lock" % await self._l2_key(key)
+            acquired = await self.shared.l2_call("set", lock_key, "1", nx=True, px=self.shared.lock_ms)
+            if acquired in (None, False):
+                # Another worker is loading it: wait briefly for its result
+                deadline = time.monotonic() + self.shared.lock_ms / 1000
+                while time.monotonic() < deadline and self.shared.l2_available:
+                    await asyncio.sleep(0.02)
+                    value = await self.get(key, _MISSING)
+                    if value is not _MISSING:
+                        return value
+                    # Released without a cacheable value (e.g. not found)
+                    if await self.shared.l2_call("get", lock_key) is None:
+                        break
+                lock_key = None
+        try:
+            self.loads += 1
+            value = await loader()
+            await self.set(key, value, ttl)
+            return value
+        finally:
+            if lock_key and self.shared.l2_available:
+                await self.shared.l2_call("delete", lock_key)
+
+    def invalidate_local(self, key: Hashable = None, generation: Optional[int] = None):
+        if generation is not None:
+            self.local.clear()
+            self.generation = max(self.generation, generation)
+        else:
+            self.local.delete(key)
+
+    def stats(self) -> dict:
+        return {**self.local.stats(), "l2_hits": self.l2_hits, "loads": self.loads}
+
+
+class SharedCache:
+    """Two-level cache: per-worker ``TTLCache`` (L1) over Redis (L2).
+
+    Writes and invalidations go to both levels and are broadcast over
+    pub/sub so other workers drop their L1 copies. With no Redis, or while
+    it is unreachable, every namespace keeps working from L1 alone; L2 is
+    retried every ``retry_interval`` seconds.
+    """
+
+    def __init__(self, redis=None, prefix: str = "fw", retry_interval: float = 5.0,
+                 lock_ms: int = 2000, generation_refresh: float = 5.0):
+        self.redis = redis
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self.lock_ms = lock_ms
+        self.generation_refresh = generation_refresh
+        self.namespaces: Dict[str, CacheNamespace] = {}
+        # Callbacks for broadcasts about things other than cached keys
+        self.listeners: Dict[str, Callable[[dict], None]] = {}
+        self.channel = "%s:invalidate" % prefix
+        self.l2_errors = 0
+        self._l2_down_until = 0.0
+        self._listener: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "SharedCache":
+        url = os.getenv("REDIS_URL")
+        if not url:
+            return cls()
+        import redis.asyncio
+        timeout = float(os.getenv("REDIS_TIMEOUT", "0.25"))
+        client = redis.asyncio.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, prefix=os.getenv("CACHE_PREFIX", "fw"))
+
+    def namespace(self, name: str, maxsize: int, ttl: float) -> CacheNamespace:
+        if name not in self.namespaces:
+            self.namespaces[name] = CacheNamespace(self, name, maxsize, ttl)
+        return self.namespaces[name]
+
+    def generation_key(self, name: str) -> str:
+        return "%s:%s:generation" % (self.prefix, name)
+
+    @property
+    def l2_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._l2_down_until
+
+    async def l2_call(self, method: str, *args, **kwargs):
+        """Run one Redis command; on failure mark L2 down and return _MISSING."""
+        try:
+            return await getattr(self.redis, method)(*args, **kwargs)
+        except L2_ERRORS as exc:
+            self.l2_errors += 1
+            if time.monotonic() >= self._l2_down_until:
+                logger.warning("Shared cache unavailable, using local cache only for %.0fs: %s",
+                               self.retry_interval, exc)
+            self._l2_down_until = time.monotonic() + self.retry_interval
+            return _MISSING
+
+    async def broadcast(self, namespace: str, key: Hashable = None, generation: Optional[int] = None):
+        if not self.l2_available:
+            return
+        message = {"ns": namespace, "key": key, "generation": generation}
+        await self.l2_call("publish", self.channel, json.dumps(message))
+
+    async def start(self):
+        if self.redis is not None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        self._dispatch(json.loads(message["data"]))
+                    except Exception:
+                        # One bad message (or listener) must not stop invalidations
+                        logger.exception("Ignoring cache broadcast %r", message.get("data"))
+            except L2_ERRORS:
+                # Missed invalidations are bounded by the L1 TTL
+                await asyncio.sleep(self.retry_interval)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, data: dict):
+        namespace = self.namespaces.get(data["ns"])
+        if namespace:
+            namespace.invalidate_local(data.get("key"), data.get("generation"))
+        listener = self.listeners.get(data["ns"])
+        if listener:
+            listener(data)
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "l2": "disabled" if self.redis is None else ("up" if self.l2_available else "down"),
+            "l2_errors": self.l2_errors,
+            "namespaces": {name: ns.stats() for name, ns in self.namespaces.items()},
+        }
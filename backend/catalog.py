@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+from compression import brotli, negotiate
+from metrics import CATALOG_VERSION
+from pricing import PricingEngine
+
+logger = logging.getLogger(__name__)
+
+# The catalog can change without a deploy; ETags make revalidation cheap
+CATALOG_CACHE_CONTROL = os.getenv("CATALOG_CACHE_CONTROL", "public, max-age=300")
+
+
+class EncodedBody:
+    """A JSON body encoded once, with its gzip (and brotli) forms and strong
+    ETags."""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # Each representation gets its own strong validator
+        self.etag = '"%s"' % digest
+        self.encoded: Dict[str, Tuple[bytes, str]] = {
+            "gzip": (gzip.compress(self.body, compresslevel=9, mtime=0), '"%s-gzip"' % digest),
+        }
+        if brotli is not None:
+            self.encoded["br"] = (brotli.compress(self.body, quality=11), '"%s-br"' % digest)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return self.etag in tags or any(etag in tags for _, etag in self.encoded.values())
+
+
+class Catalog:
+    """Immutable product catalog with lookup indexes and pre-encoded bodies.
+
+    Built once at startup; requests only do dictionary lookups and never
+    serialize or scan the product list.
+    """
+
+    def __init__(self, products: List[dict]):
+        self.products = [dict(p) for p in products]
+        self.by_id: Dict[str, dict] = {p["id"]: p for p in self.products}
+        self.by_name: Dict[str, dict] = {p["name"]: p for p in self.products}
+        self.by_category: Dict[str, List[dict]] = {}
+        for product in self.products:
+            self.by_category.setdefault(product["category"], []).append(product)
+
+        self._product_bodies = {p["id"]: EncodedBody(p) for p in self.products}
+        self._list_bodies: Dict[Tuple[Optional[str], Optional[bool]], EncodedBody] = {}
+        for category in [None, *self.by_category]:
+            for customizable in (None, True, False):
+                selected = self.by_category[category] if category else self.products
+                if customizable is not None:
+                    selected = [p for p in selected if p["customizable"] == customizable]
+                self._list_bodies[(category, customizable)] = EncodedBody({"products": selected})
+        self._empty_list_body = EncodedBody({"products": []})
+
+    def get(self, product_id: str) -> Optional[dict]:
+        return self.by_id.get(product_id)
+
+    def product_body(self, product_id: str) -> Optional[EncodedBody]:
+        return self._product_bodies.get(product_id)
+
+    def list_body(self, category: Optional[str] = None, customizable: Optional[bool] = None) -> EncodedBody:
+        return self._list_bodies.get((category, customizable), self._empty_list_body)
+
+
+class CatalogConflict(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """One published catalog version with everything derived from it.
+
+    Never mutated: a newer version is a new snapshot, so a request that took
+    a snapshot sees one consistent catalog and price matrix throughout.
+    """
+
+    version: int
+    catalog: Catalog
+    pricing: PricingEngine
+
+    @classmethod
+    def build(cls, version: int, products: List[dict]) -> "CatalogSnapshot":
+        return cls(version, Catalog(products), PricingEngine(products))
+
+
+class LiveCatalog:
+    """This worker's current ``CatalogSnapshot``, kept up to date with the
+    ``catalog_versions`` collection.
+
+    Requests only read ``snapshot``. A newer version is loaded and built off
+    to the side, then swapped in with one assignment. Workers learn about it
+    from a broadcast on the shared cache channel when Redis is up, and by
+    polling the latest version number every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, repository, seed_products: List[dict], cache=None, poll_interval: float = 5.0):
+        self.repository = repository
+        self.seed_products = seed_products
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.snapshot = CatalogSnapshot.build(0, seed_products)
+        self.reloads = 0
+        self._lock = asyncio.Lock()
+        self._poller: Optional[asyncio.Task] = None
+        self._notified: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if await self.repository.latest_version() == 0:
+            try:
+                await self.repository.publish(self.seed_products, 1)
+                logger.info("Seeded the product catalog as version 1")
+            except DuplicateKeyError:
+                pass  # another worker seeded it first
+        await self.refresh()
+        if self.cache is not None:
+            self.cache.listeners["catalog"] = self._on_broadcast
+        self._poller = asyncio.create_task(self._poll())
+
+    async def refresh(self) -> bool:
+        async with self._lock:
+            latest = await self.repository.latest_version()
+            if latest <= self.snapshot.version:
+                return False
+            doc = await self.repository.get(latest)
+            # Pricing matrices and encoded bodies are built before the swap
+            snapshot = CatalogSnapshot.build(doc["_id"], doc["products"])
+            self.snapshot = snapshot
+            self.reloads += 1
+            CATALOG_VERSION.set(snapshot.version)
+            logger.info("Catalog version %d loaded (%d products)", snapshot.version, len(doc["products"]))
+            return True
+
+    async def update(self, change: Callable[[List[dict]], List[dict]], attempts: int = 5) -> CatalogSnapshot:
+        """Publish ``change(products)`` of the latest version as the next one.
+
+        Read-modify-write: if another publisher wins the race for the next
+        version number the change is re-applied on top of theirs.
+        """
+        for _ in range(attempts):
+            latest = await self.repository.latest_version()
+            current = await self.repository.get(latest) if latest else None
+            products = change([dict(p) for p in (current["products"] if current else self.seed_products)])
+            try:
+                await self.repository.publish(products, latest + 1)
+            except DuplicateKeyError:
+                continue
+            await self.refresh()
+            if self.cache is not None:
+                await self.cache.broadcast("catalog", generation=latest + 1)
+            return self.snapshot
+        raise CatalogConflict("Catalog is being changed concurrently, please retry")
+
+    def _on_broadcast(self, message: dict):
+        if (message.get("generation") or 0) > self.snapshot.version and not (
+            self._notified and not self._notified.done()
+        ):
+            self._notified = asyncio.create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception:
+            # Mongo errors, or a published catalog this code can't load
+            logger.exception("Could not reload the catalog; still serving version %d", self.snapshot.version)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._refresh_quietly()
+
+    async def close(self):
+        if self.cache is not None:
+            self.cache.listeners.pop("catalog", None)
+        for task in (self._poller, self._notified):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"version": self.snapshot.version, "products": len(self.snapshot.catalog.products),
+                "reloads": self.reloads}
+
+
+def encoded_response(request: Request, encoded: EncodedBody) -> Response:
+    headers = {"Cache-Control": CATALOG_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    coding = negotiate(request.headers.get("accept-encoding", ""))
+    body, headers["ETag"] = encoded.encoded[coding] if coding in encoded.encoded else (encoded.body, encoded.etag)
+
+    if encoded.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if coding in encoded.encoded:
+        headers["Content-Encoding"] = coding
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,138 @@
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript",
+    "image/svg+xml", "text/",
+)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Best supported coding the client accepts, preferring brotli."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class _Encoder:
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        # Streamed chunks are flushed so each one reaches the client promptly
+        if self.coding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli for compressible responses of ``minimum_size``
+    bytes or more.
+
+    Responses that already carry a Content-Encoding, like the catalog's
+    pre-encoded bodies, pass through untouched, as do range responses.
+    Streaming responses are compressed chunk by chunk without buffering.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @classmethod
+    def from_env(cls, app) -> "CompressionMiddleware":
+        return cls(
+            app,
+            minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+            gzip_level=int(os.getenv("COMPRESS_GZIP_LEVEL", "6")),
+            brotli_quality=int(os.getenv("COMPRESS_BROTLI_QUALITY", "4")),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] < 200 or message["status"] in (204, 304)
+                    or not media_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(coding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = coding
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The encoded bytes differ, so a strong validator would lie
+                    headers["ETag"] = "W/" + etag
+                del headers["content-length"]
+                compressed = encoder.chunk(body, final=not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(compressed))
+                await send(start)
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+                return
+            await send({"type": "http.response.body", "body": encoder.chunk(body, final=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
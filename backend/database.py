@@ -0,0 +1,589 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from collections import Counter
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Tuple, AsyncIterator
+
+from cache import CacheNamespace, SharedCache
+from indexes import PAGE_SORT, ensure_indexes
+from pagination import DEFAULT_PAGE_SIZE, encode_cursor, keyset_filter
+
+DUPLICATE_KEY = 11000
+
+# Documents per getMore while streaming; bounds server memory per request
+STREAM_BATCH_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+# Repositories wrap one collection each so routes never talk to the driver
+# directly. Every method is a coroutine backed by motor, so a slow query only
+# suspends the request that issued it instead of the whole event loop.
+class UserRepository:
+    """Users, with a cache of their public profiles.
+
+    Every write goes through this class and invalidates the cached profile
+    in every worker when the shared cache is up; otherwise staleness from
+    other workers is bounded by the cache TTL. The password hash is only
+    read by ``get_credentials``.
+    """
+
+    PROFILE_PROJECTION = {"_id": 0, "id": 1, "email": 1, "business_name": 1,
+                          "account_type": 1, "wholesale_approved": 1}
+    CREDENTIALS_PROJECTION = {**PROFILE_PROJECTION, "password": 1}
+
+    def __init__(self, collection, profiles: Optional[CacheNamespace] = None):
+        self.collection = collection
+        self.profiles = profiles or SharedCache().namespace("profiles", USER_CACHE_SIZE, USER_CACHE_TTL)
+
+    @staticmethod
+    def public_profile(user: dict) -> dict:
+        return {
+            "id": user["id"],
+            "email": user["email"],
+            "business_name": user["business_name"],
+            "account_type": user["account_type"],
+            "wholesale_approved": user["wholesale_approved"]
+        }
+
+    async def exists(self, email: str) -> bool:
+        return await self.collection.find_one({"email": email}, {"_id": 1}) is not None
+
+    async def get_credentials(self, email: str) -> Optional[dict]:
+        return await self.collection.find_one({"email": email}, self.CREDENTIALS_PROJECTION)
+
+    async def get_profile(self, email: str) -> Optional[dict]:
+        async def load():
+            return await self.collection.find_one({"email": email}, self.PROFILE_PROJECTION)
+        return await self.profiles.get_or_load(email, load)
+
+    async def cache_profile(self, user: dict) -> dict:
+        profile = self.public_profile(user)
+        await self.profiles.set(user["email"], profile)
+        return profile
+
+    async def create(self, user_doc: dict) -> dict:
+        await self.collection.insert_one(user_doc)
+        await self.cache_profile(user_doc)
+        return user_doc
+
+    async def update(self, email: str, fields: dict) -> Optional[dict]:
+        # A get_profile racing the write may have cached the old document;
+        # drop it again afterwards (which also tells the other workers) and
+        # cache the updated one
+        await self.profiles.delete(email)
+        user = await self.collection.find_one_and_update(
+            {"email": email},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}},
+            projection=self.PROFILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        await self.profiles.delete(email)
+        return await self.cache_profile(user) if user else None
+
+
+class UserScopedRepository:
+    """Documents owned by a user, listed newest first by (created_at, id).
+
+    Subclasses name the fields they return in ``PROJECTION``; anything else
+    stored on a document stays in the database.
+    """
+
+    SORT = PAGE_SORT
+    PROJECTION = {"_id": 0}
+    # What the search index reads; subclasses add their text fields
+    SEARCH_FIELDS = {"_id": 0, "id": 1, "user_email": 1, "created_at": 1}
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.writer = None
+
+    async def create(self, doc: dict) -> dict:
+        if self.writer:
+            # Returns once journaled; visible to reads after the next flush
+            await self.writer.enqueue(self.collection.name, doc)
+        else:
+            await self.collection.insert_one(doc)
+        return doc
+
+    async def get(self, doc_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": doc_id}, self.PROJECTION)
+
+    async def get_many(self, doc_ids: List[str], user_email: Optional[str] = None) -> List[dict]:
+        """Documents by id in the order given, skipping missing ones and,
+        with ``user_email``, ones owned by someone else."""
+        query = {"id": {"$in": doc_ids}}
+        if user_email is not None:
+            query["user_email"] = user_email
+        docs = await self.collection.find(query, self.PROJECTION).to_list(length=len(doc_ids))
+        by_id = {doc["id"]: doc for doc in docs}
+        return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+
+    def stream_created_since(self, since: Optional[datetime]) -> AsyncIterator[dict]:
+        query = {"created_at": {"$gte": since}} if since else {}
+        return self.collection.find(query, self.SEARCH_FIELDS).sort(
+            [("created_at", ASCENDING)]
+        ).batch_size(1000)
+
+    async def created_at_of_newest(self, count: int) -> Optional[datetime]:
+        """``created_at`` of the ``count``-th newest document, or None if
+        there are fewer than ``count``."""
+        docs = await self.collection.find({}, {"_id": 0, "created_at": 1}).sort(
+            [("created_at", DESCENDING)]
+        ).skip(count - 1).limit(1).to_list(length=1)
+        return docs[0]["created_at"] if docs else None
+
+    async def list_for_user(
+        self,
+        user_email: str,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        # Fetch one extra document to learn whether another page exists
+        cursor = self.collection.find(
+            keyset_filter({"user_email": user_email}, after), self.PROJECTION
+        ).sort(self.SORT).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+
+    async def stream_for_user(
+        self,
+        user_email: str,
+        after: Optional[Tuple[datetime, str]] = None
+    ) -> AsyncIterator[dict]:
+        cursor = self.collection.find(
+            keyset_filter({"user_email": user_email}, after), self.PROJECTION
+        ).sort(self.SORT).batch_size(STREAM_BATCH_SIZE)
+        async for doc in cursor:
+            yield doc
+
+
+class CustomizationRepository(UserScopedRepository):
+    PROJECTION = {
+        "_id": 0, "id": 1, "user_email": 1, "product_id": 1, "business_name": 1, "phone_number": 1,
+        "logo_url": 1, "logo_position": 1, "created_at": 1, "updated_at": 1,
+    }
+    SEARCH_FIELDS = {**UserScopedRepository.SEARCH_FIELDS, "business_name": 1, "product_id": 1}
+
+    def logo_urls(self) -> AsyncIterator[dict]:
+        return self.collection.find({"logo_url": {"$ne": None}}, {"_id": 0, "logo_url": 1})
+
+
+class QuoteRepository(UserScopedRepository):
+    PROJECTION = {
+        "_id": 0, "id": 1, "parent_quote_id": 1, "line": 1, "user_email": 1, "business_name": 1,
+        "product_id": 1, "product_name": 1, "size": 1, "customization_data": 1, "quantity": 1,
+        "message": 1, "account_type": 1, "price_list": 1, "unit_price": 1, "estimated_total": 1,
+        "status": 1, "logo_status": 1, "created_at": 1,
+    }
+    SEARCH_FIELDS = {**UserScopedRepository.SEARCH_FIELDS, "business_name": 1, "product_name": 1,
+                     "message": 1}
+
+    def __init__(self, collection, rollups: "QuoteRollupRepository"):
+        super().__init__(collection)
+        self.rollups = rollups
+
+    def logo_urls(self) -> AsyncIterator[dict]:
+        return self.collection.find({"customization_data.logo_url": {"$ne": None}},
+                                    {"_id": 0, "customization_data.logo_url": 1})
+
+    async def create(self, doc: dict) -> dict:
+        await super().create(doc)
+        # Buffered writes are rolled up by the writer once they reach Mongo
+        if not self.writer:
+            await self._roll_up([doc])
+        return doc
+
+    async def create_many(self, docs: List[dict]) -> List[dict]:
+        # One round-trip; ordered so a failure leaves a clean prefix written
+        await self.collection.insert_many(docs, ordered=True)
+        await self._roll_up(docs)
+        return docs
+
+    async def _roll_up(self, docs: List[dict]):
+        # The quotes are saved; failing the request now would invite a
+        # duplicate resubmission, and a rebuild repairs the rollups
+        try:
+            await self.rollups.record(docs)
+        except PyMongoError:
+            logger.exception("Could not update quote rollups")
+
+    async def lines_for_request(self, parent_quote_id: str) -> List[dict]:
+        return await self.collection.find({"parent_quote_id": parent_quote_id}, self.PROJECTION).sort(
+            [("line", ASCENDING)]
+        ).to_list(length=None)
+
+    async def set_status(self, quote_id: str, status: str) -> Optional[dict]:
+        """Update a quote's status; returns the quote as it was before."""
+        return await self.collection.find_one_and_update(
+            {"id": quote_id}, {"$set": {"status": status, "status_changed_at": datetime.utcnow()}},
+            projection=self.PROJECTION,
+        )
+
+    async def set_logo_status(self, quote_id: str, logo_status: str):
+        await self.collection.update_one({"id": quote_id}, {"$set": {"logo_status": logo_status}})
+
+    def stream_since(self, since: Optional[datetime]) -> AsyncIterator[dict]:
+        query = {"created_at": {"$gte": since}} if since else {}
+        projection = {"_id": 0, "created_at": 1, "product_id": 1, "product_name": 1,
+                      "account_type": 1, "quantity": 1, "estimated_total": 1}
+        return self.collection.find(query, projection).batch_size(1000)
+
+
+def rollup_key(quote: dict) -> Tuple[str, str, str]:
+    return (
+        quote["created_at"].strftime("%Y-%m-%d"),
+        quote.get("product_id") or quote.get("product_name") or "unknown",
+        quote.get("account_type") or "unknown",
+    )
+
+
+class QuoteRollupRepository:
+    """Quote counts, quantities and estimated value per day, product and
+    account type.
+
+    Kept current with ``$inc`` upserts as quotes are written, so reading a
+    date range touches at most days x products x account types documents
+    however many quotes exist. ``rebuild`` recomputes from ``quotes`` after
+    a backfill or if the increments ever drift.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _accumulate(quotes) -> Dict[Tuple[str, str, str], dict]:
+        totals: Dict[Tuple[str, str, str], dict] = {}
+        for quote in quotes:
+            entry = totals.setdefault(rollup_key(quote), {
+                "product_name": quote.get("product_name"),
+                "quotes": 0, "quantity": 0, "estimated_total": 0.0,
+            })
+            entry["quotes"] += 1
+            entry["quantity"] += quote.get("quantity") or 0
+            entry["estimated_total"] += quote.get("estimated_total") or 0.0
+        return totals
+
+    async def record(self, quotes: List[dict]):
+        totals = self._accumulate(quotes)
+        if not totals:
+            return
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": "|".join(key)},
+                {
+                    "$setOnInsert": {"day": key[0], "product_id": key[1], "account_type": key[2],
+                                     "product_name": entry["product_name"]},
+                    "$inc": {"quotes": entry["quotes"], "quantity": entry["quantity"],
+                             "estimated_total": entry["estimated_total"]},
+                },
+                upsert=True,
+            )
+            for key, entry in totals.items()
+        ], ordered=False)
+
+    async def in_range(self, first_day: str, last_day: str) -> List[dict]:
+        return await self.collection.find(
+            {"day": {"$gte": first_day, "$lte": last_day}},
+            {"_id": 0, "day": 1, "product_id": 1, "product_name": 1, "account_type": 1,
+             "quotes": 1, "quantity": 1, "estimated_total": 1}
+        ).to_list(length=None)
+
+    async def rebuild(self, quotes: "QuoteRepository", since: Optional[datetime] = None) -> dict:
+        first_day = since.strftime("%Y-%m-%d") if since else None
+        # Whole days only, so a rebuilt day is never half old and half new
+        since = datetime.strptime(first_day, "%Y-%m-%d") if first_day else None
+        totals = {}
+        scanned = 0
+        batch = []
+        async for quote in quotes.stream_since(since):
+            scanned += 1
+            batch.append(quote)
+            if len(batch) >= 5000:
+                self._merge(totals, self._accumulate(batch))
+                batch = []
+        self._merge(totals, self._accumulate(batch))
+
+        keep = ["|".join(key) for key in totals]
+        if totals:
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": "|".join(key)},
+                    {"$set": {"day": key[0], "product_id": key[1], "account_type": key[2], **entry}},
+                    upsert=True,
+                )
+                for key, entry in totals.items()
+            ], ordered=False)
+        stale = {"_id": {"$nin": keep}}
+        if first_day:
+            stale["day"] = {"$gte": first_day}
+        removed = await self.collection.delete_many(stale)
+        return {"quotes_scanned": scanned, "rollups": len(totals), "removed": removed.deleted_count}
+
+    @staticmethod
+    def _merge(totals: dict, more: dict):
+        for key, entry in more.items():
+            if key not in totals:
+                totals[key] = entry
+                continue
+            for field in ("quotes", "quantity", "estimated_total"):
+                totals[key][field] += entry[field]
+
+
+class UploadRepository:
+    """One record per distinct upload, keyed by SHA-256 of its bytes.
+
+    ``refcount`` is the number of customizations and quotes using the blob
+    as their logo. Saving a customization increments it; the GC pass
+    recounts it from the customizations and quotes themselves.
+    """
+
+    RECORD_PROJECTION = {"file_id": 1, "size": 1}
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def touch(self, sha256: str) -> Optional[dict]:
+        return await self.collection.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"upload_count": 1}, "$set": {"last_uploaded_at": datetime.utcnow()}},
+            projection=self.RECORD_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def record(self, sha256: str, file_id: str, size: int) -> dict:
+        now = datetime.utcnow()
+        update = {
+            "$setOnInsert": {"file_id": file_id, "size": size, "refcount": 0, "created_at": now},
+            "$inc": {"upload_count": 1},
+            "$set": {"last_uploaded_at": now},
+        }
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": sha256}, update, upsert=True,
+                projection=self.RECORD_PROJECTION, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with an identical upload; theirs is ours
+            return await self.collection.find_one_and_update(
+                {"_id": sha256}, update,
+                projection=self.RECORD_PROJECTION, return_document=ReturnDocument.AFTER
+            )
+
+    async def add_reference(self, sha256: str):
+        await self.collection.update_one({"_id": sha256}, {"$inc": {"refcount": 1}})
+
+    async def recount(self, references: Counter, dry_run: bool = False) -> int:
+        changed = 0
+        async for record in self.collection.find({}, {"refcount": 1}):
+            actual = references.get(record["_id"], 0)
+            if record.get("refcount") != actual:
+                changed += 1
+                if not dry_run:
+                    await self.collection.update_one({"_id": record["_id"]}, {"$set": {"refcount": actual}})
+        return changed
+
+    async def unreferenced(self, uploaded_before: datetime) -> List[dict]:
+        return await self.collection.find(
+            {"refcount": 0, "last_uploaded_at": {"$lt": uploaded_before}}, {"file_id": 1}
+        ).to_list(length=None)
+
+    async def delete_unreferenced(self, sha256: str, uploaded_before: datetime) -> bool:
+        result = await self.collection.delete_one(
+            {"_id": sha256, "refcount": 0, "last_uploaded_at": {"$lt": uploaded_before}}
+        )
+        return result.deleted_count == 1
+
+
+class CatalogRepository:
+    """Every published product catalog, one immutable document per version.
+
+    A whole catalog is a single document, so a reader can never see half of
+    an update. Versions are consecutive ``_id`` integers; two publishers
+    racing for the same version collide on ``_id`` and one of them retries.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def latest_version(self) -> int:
+        doc = await self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return doc["_id"] if doc else 0
+
+    async def get(self, version: int) -> Optional[dict]:
+        return await self.collection.find_one({"_id": version}, {"_id": 1, "products": 1, "published_at": 1})
+
+    async def publish(self, products: List[dict], version: int) -> int:
+        """Store ``products`` as ``version``; DuplicateKeyError if it exists."""
+        await self.collection.insert_one({"_id": version, "products": products, "published_at": datetime.utcnow()})
+        return version
+
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = "queued", "running", "done", "failed"
+
+
+class JobRepository:
+    """Durable background jobs, one document per job.
+
+    A job is claimed by atomically flipping it from queued to running with
+    a lease that the worker keeps renewing. A worker that dies stops
+    renewing, and ``requeue_expired`` hands the job to someone else. Every
+    state change after the claim is conditional on still holding the lease,
+    so a job that was taken over can't be completed twice. Jobs with a
+    fixed ``_id`` are enqueued at most once.
+    """
+
+    LIST_PROJECTION = {"_id": 1, "queue": 1, "payload": 1, "status": 1, "attempts": 1, "last_error": 1,
+                       "run_at": 1, "created_at": 1, "failed_at": 1}
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.writer = None
+
+    @staticmethod
+    def new_job(queue: str, payload: dict, job_id: Optional[str] = None, delay: float = 0.0) -> dict:
+        now = datetime.utcnow()
+        return {
+            "_id": job_id or str(uuid.uuid4()),
+            "queue": queue,
+            "payload": payload,
+            "status": JOB_QUEUED,
+            "attempts": 0,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+            "leased_by": None,
+            "lease_until": None,
+            "last_error": None,
+        }
+
+    async def enqueue_many(self, jobs: List[dict]):
+        if self.writer:
+            # Journaled with the quotes that caused them; replays are idempotent
+            for job in jobs:
+                await self.writer.enqueue(self.collection.name, job)
+            return
+        try:
+            await self.collection.insert_many(jobs, ordered=False)
+        except BulkWriteError as exc:
+            # Jobs with a fixed id that were already enqueued
+            if any(e.get("code") != DUPLICATE_KEY for e in exc.details.get("writeErrors", [])):
+                raise
+
+    async def claim(self, queue: str, worker: str, lease: float) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"queue": queue, "status": JOB_QUEUED, "run_at": {"$lte": now}},
+            {"$set": {"status": JOB_RUNNING, "leased_by": worker, "lease_until": now + timedelta(seconds=lease),
+                      "started_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _update_leased(self, job_id: str, worker: str, fields: dict) -> bool:
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": JOB_RUNNING, "leased_by": worker}, {"$set": fields}
+        )
+        return result.matched_count == 1
+
+    async def renew(self, job_id: str, worker: str, lease: float) -> bool:
+        return await self._update_leased(job_id, worker, {"lease_until": datetime.utcnow() + timedelta(seconds=lease)})
+
+    async def complete(self, job_id: str, worker: str) -> bool:
+        return await self._update_leased(job_id, worker, {
+            "status": JOB_DONE, "finished_at": datetime.utcnow(), "leased_by": None, "lease_until": None,
+        })
+
+    async def retry(self, job_id: str, worker: str, error: str, delay: float) -> bool:
+        return await self._update_leased(job_id, worker, {
+            "status": JOB_QUEUED, "run_at": datetime.utcnow() + timedelta(seconds=delay),
+            "last_error": error, "leased_by": None, "lease_until": None,
+        })
+
+    async def fail(self, job_id: str, worker: str, error: str) -> bool:
+        return await self._update_leased(job_id, worker, {
+            "status": JOB_FAILED, "failed_at": datetime.utcnow(), "last_error": error,
+            "leased_by": None, "lease_until": None,
+        })
+
+    async def release(self, job_id: str, worker: str) -> bool:
+        """Give a job back untouched, e.g. on shutdown; the attempt doesn't count."""
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": JOB_RUNNING, "leased_by": worker},
+            {"$set": {"status": JOB_QUEUED, "leased_by": None, "lease_until": None}, "$inc": {"attempts": -1}},
+        )
+        return result.matched_count == 1
+
+    async def requeue_expired(self) -> int:
+        result = await self.collection.update_many(
+            {"status": JOB_RUNNING, "lease_until": {"$lt": datetime.utcnow()}},
+            {"$set": {"status": JOB_QUEUED, "leased_by": None, "lease_until": None, "last_error": "lease expired"}},
+        )
+        return result.modified_count
+
+    async def requeue_failed(self, job_id: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": JOB_FAILED},
+            {"$set": {"status": JOB_QUEUED, "attempts": 0, "run_at": datetime.utcnow()}},
+        )
+        return result.matched_count == 1
+
+    async def queue_stats(self, queue: str) -> dict:
+        now = datetime.utcnow()
+        counts = {}
+        for status in (JOB_QUEUED, JOB_RUNNING, JOB_FAILED):
+            counts[status] = await self.collection.count_documents({"queue": queue, "status": status})
+        oldest = await self.collection.find_one(
+            {"queue": queue, "status": JOB_QUEUED, "run_at": {"$lte": now}}, {"run_at": 1}, sort=[("run_at", ASCENDING)]
+        )
+        # How long the longest-waiting due job has been waiting
+        counts["oldest_wait_s"] = round((now - oldest["run_at"]).total_seconds(), 3) if oldest else 0.0
+        return counts
+
+    async def list_failed(self, queue: Optional[str] = None, limit: int = 50) -> List[dict]:
+        query = {"status": JOB_FAILED}
+        if queue:
+            query["queue"] = queue
+        return await self.collection.find(query, self.LIST_PROJECTION).sort(
+            [("failed_at", -1)]
+        ).limit(limit).to_list(length=limit)
+
+
+class Database:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.db = client[name]
+        self.users = UserRepository(self.db.users)
+        self.customizations = CustomizationRepository(self.db.customizations)
+        self.quote_rollups = QuoteRollupRepository(self.db.quote_rollups)
+        self.quotes = QuoteRepository(self.db.quotes, self.quote_rollups)
+        self.uploads = UploadRepository(self.db.uploads)
+        self.catalog = CatalogRepository(self.db.catalog_versions)
+        self.jobs = JobRepository(self.db.jobs)
+
+    @classmethod
+    def connect(cls, url: str, name: str, event_listeners=()) -> "Database":
+        return cls(AsyncIOMotorClient(url, event_listeners=list(event_listeners)), name)
+
+    async def ensure_indexes(self):
+        await ensure_indexes(self.db)
+
+    def use_cache(self, cache: SharedCache):
+        self.users.profiles = cache.namespace("profiles", USER_CACHE_SIZE, USER_CACHE_TTL)
+
+    def enable_write_behind(self, writer):
+        self.customizations.writer = writer
+        self.quotes.writer = writer
+        self.jobs.writer = writer
+        writer.after_insert["quotes"] = self.quote_rollups.record
+
+    def close(self):
+        self.client.close()
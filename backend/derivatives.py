@@ -0,0 +1,199 @@
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Widths we render. Requests snap up to the nearest one so ?w= cannot be
+# used to fill the cache with arbitrary sizes.
+RENDITION_WIDTHS = (128, 256, 512, 1024)
+# Rendered in the background as soon as a new logo is uploaded
+EAGER_RENDITIONS = ((128, "webp"), (128, "png"), (512, "webp"), (512, "png"))
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+MEDIA_TYPES = {"webp": "image/webp", "png": "image/png"}
+
+DERIVATIVE_CACHE_BYTES = int(os.getenv("DERIVATIVE_CACHE_BYTES", str(512 * 1024 * 1024)))
+# Other workers' renders only show up in a sweep, so sweep at least this often
+SWEEP_INTERVAL = float(os.getenv("DERIVATIVE_SWEEP_INTERVAL", "60"))
+SWEEP_LOCK = ".sweep.lock"
+
+
+def snap_width(width: int) -> int:
+    for candidate in RENDITION_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return RENDITION_WIDTHS[-1]
+
+
+def render_rendition(source: str, target: str, width: int, fmt: str) -> int:
+    """Resize ``source`` to ``width`` and write it to ``target``.
+
+    Runs in a worker process. Every mode is normalized to RGBA (palette and
+    greyscale transparency become a real alpha channel) and fully
+    transparent borders are trimmed so logos sit where they are placed.
+    """
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image = image.convert("RGBA")
+        bbox = image.getchannel("A").getbbox()
+        if bbox:
+            image = image.crop(bbox)
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        partial = target + ".%d.part" % os.getpid()
+        if fmt == "webp":
+            image.save(partial, "WEBP", quality=82, method=4)
+        else:
+            image.save(partial, "PNG", optimize=True)
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+def sweep_directory(root: Path, max_bytes: int, keep: Optional[Path] = None) -> Optional[Tuple[int, int, int]]:
+    """Delete the oldest-mtime files directly in ``root`` until they fit
+    ``max_bytes``, sparing ``keep``. Returns the files and bytes left and
+    the number deleted, or None when another process holds the sweep lock.
+    """
+    with open(root / SWEEP_LOCK, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        files = []
+        with os.scandir(root) as scan:
+            for entry in scan:
+                if entry.name == SWEEP_LOCK or entry.name.endswith(".part"):
+                    continue
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        kept = len(files)
+        evicted = 0
+        for _, size, path in files:
+            if total <= max_bytes or kept <= 1:
+                break
+            if keep is not None and path == str(keep):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            kept -= 1
+            evicted += 1
+        return kept, total, evicted
+
+
+class DerivativeCache:
+    """On-disk cache of logo renditions, evicted least-recently-used by size.
+
+    The directory is shared by every prefork worker, so it is the only
+    index: a hit is a file that is still there (its mtime is bumped as the
+    access time), and the size budget is enforced by sweeping the directory
+    oldest-mtime first under a file lock. Each worker estimates the total
+    from its last sweep plus its own renders and sweeps when that goes over
+    the budget or ``SWEEP_INTERVAL`` has passed.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = DERIVATIVE_CACHE_BYTES, workers: Optional[int] = None,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.sweep_interval = sweep_interval
+        self.executor = None
+        self.entries = 0
+        self.total_bytes = 0
+        self.evicted = 0
+        self.hits = 0
+        self.misses = 0
+        self._swept_at = 0.0
+        self._inflight: Dict[Path, asyncio.Future] = {}
+        self._tasks = set()
+
+    def start(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def path_for(self, file_id: str, width: int, fmt: str) -> Path:
+        # The whole id, extension included: legacy x.png and x.jpg differ
+        return self.root / f"{file_id.replace('.', '_')}-w{width}.{fmt}"
+
+    async def get(self, source: Path, file_id: str, width: int, fmt: str) -> Path:
+        target = self.path_for(file_id, width, fmt)
+        try:
+            # Marks it recently used, and fails if another worker evicted it
+            await asyncio.to_thread(os.utime, target)
+        except FileNotFoundError:
+            pass
+        else:
+            self.hits += 1
+            return target
+
+        # Concurrent requests for the same rendition share one render
+        pending = self._inflight.get(target)
+        if pending is None:
+            self.misses += 1
+            pending = asyncio.ensure_future(self._render(source, target, width, fmt))
+            self._inflight[target] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(target, None))
+        await asyncio.shield(pending)
+        return target
+
+    async def _render(self, source: Path, target: Path, width: int, fmt: str):
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(self.executor, render_rendition, str(source), str(target), width, fmt)
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes or time.monotonic() - self._swept_at > self.sweep_interval:
+            await asyncio.to_thread(self.sweep, target)
+
+    def sweep(self, keep: Optional[Path] = None):
+        """Delete the least recently used renditions until the directory fits
+        the budget. Skipped when another worker is already sweeping."""
+        self._swept_at = time.monotonic()
+        swept = sweep_directory(self.root, self.max_bytes, keep)
+        if swept is not None:
+            self.entries, self.total_bytes, evicted = swept
+            self.evicted += evicted
+
+    def warm(self, source: Path, file_id: str):
+        """Queue the eager renditions of a freshly uploaded logo."""
+        if source.suffix.lower() not in RASTER_EXTENSIONS:
+            return
+        for width, fmt in EAGER_RENDITIONS:
+            task = asyncio.ensure_future(self.get(source, file_id, width, fmt))
+            self._tasks.add(task)
+            task.add_done_callback(self._warm_done)
+
+    def _warm_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning("Derivative generation failed: %s", task.exception())
+
+    def stats(self) -> dict:
+        # entries and bytes are as of this worker's last sweep
+        return {
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
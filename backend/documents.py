@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+from render import logo_position
+
+# Bump when the layout below changes so stale documents are not reused
+DOCUMENT_VERSION = 1
+
+BRAND = "FireworksAds Pro"
+BRAND_COLOR = "#c2410c"
+LOGO_BOX = 100
+
+
+class DocumentError(Exception):
+    """Generating a quote document failed in the worker process."""
+
+
+def document_data(number: str, quotes: List[dict], products: Dict[str, dict]) -> dict:
+    """Everything that appears in the document, as plain JSON values.
+
+    This is both what the worker process receives and what the cache key
+    hashes, so any visible change (status included) makes a new document.
+    """
+    first = quotes[0]
+    lines = []
+    for quote in quotes:
+        product = products.get(quote.get("product_id")) or {}
+        customization = quote.get("customization_data") or {}
+        lines.append({
+            "id": quote["id"],
+            "product_name": quote.get("product_name") or product.get("name"),
+            "description": product.get("description"),
+            "category": product.get("category"),
+            "size": quote.get("size") or customization.get("size"),
+            "quantity": quote.get("quantity"),
+            "unit_price": quote.get("unit_price"),
+            "estimated_total": quote.get("estimated_total"),
+            "status": quote.get("status"),
+            "message": quote.get("message"),
+            "printed_name": customization.get("business_name"),
+            "printed_phone": customization.get("phone_number"),
+            "logo_position": logo_position(customization.get("logo_position")),
+        })
+    priced = [line["estimated_total"] for line in lines if line["estimated_total"] is not None]
+    return {
+        "version": DOCUMENT_VERSION,
+        "number": number,
+        "created_at": first["created_at"].strftime("%B %d, %Y") if isinstance(first.get("created_at"), datetime) else None,
+        "business_name": first.get("business_name"),
+        "user_email": first.get("user_email"),
+        "account_type": first.get("account_type"),
+        "price_list": first.get("price_list"),
+        "logo_url": (first.get("customization_data") or {}).get("logo_url"),
+        "lines": lines,
+        "estimated_total": round(sum(priced), 2) if priced else None,
+    }
+
+
+def document_key(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _money(value) -> str:
+    return "$%s" % format(value, ",.2f") if value is not None else "-"
+
+
+def build_quote_pdf(target: str, data: dict, logo_path: Optional[str]) -> str:
+    """Lay out the quote document. Runs in a worker process."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    body, small = styles["BodyText"], styles["Italic"]
+    brand = colors.HexColor(BRAND_COLOR)
+
+    def text(value) -> str:
+        return str(value) if value not in (None, "") else "-"
+
+    def markup(value) -> str:
+        # Paragraphs parse their text as markup; table cells don't
+        return escape(text(value))
+
+    title = Paragraph('<font size="20" color="%s"><b>%s</b></font><br/><br/>Quote %s' % (
+        BRAND_COLOR, BRAND, markup(data["number"])), body)
+    logo = ""
+    if logo_path:
+        try:
+            logo = Image(logo_path, kind="proportional", width=LOGO_BOX, height=LOGO_BOX)
+        except OSError:
+            logo = ""
+    header = Table([[title, logo]], colWidths=[5.2 * inch, 1.8 * inch])
+    header.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("ALIGN", (1, 0), (1, 0), "RIGHT")]))
+
+    customer = Table([
+        ["Prepared for", text(data["business_name"])],
+        ["Contact", text(data["user_email"])],
+        ["Requested", text(data["created_at"])],
+        ["Account", text(data["account_type"])],
+    ], colWidths=[1.3 * inch, 5.7 * inch])
+    customer.setStyle(TableStyle([("TEXTCOLOR", (0, 0), (0, -1), colors.grey), ("FONTSIZE", (0, 0), (-1, -1), 10)]))
+
+    rows = [["Product", "Size", "Qty", "Unit price", "Estimate", "Status"]]
+    for line in data["lines"]:
+        rows.append([
+            Paragraph("<b>%s</b><br/>%s" % (markup(line["product_name"]), markup(line["category"])), body),
+            text(line["size"]), text(line["quantity"]),
+            _money(line["unit_price"]), _money(line["estimated_total"]), text(line["status"]),
+        ])
+    rows.append(["", "", "", "Total", _money(data["estimated_total"]), ""])
+    items = Table(rows, colWidths=[2.6 * inch, 0.9 * inch, 0.5 * inch, 1.0 * inch, 1.0 * inch, 1.0 * inch],
+                  repeatRows=1)
+    items.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), brand),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTNAME", (3, -1), (4, -1), "Helvetica-Bold"),
+        ("LINEBELOW", (0, 1), (-1, -2), 0.25, colors.lightgrey),
+        ("LINEABOVE", (3, -1), (4, -1), 1, brand),
+        ("ALIGN", (2, 0), (4, -1), "RIGHT"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ]))
+
+    story = [header, Spacer(1, 0.25 * inch), customer, Spacer(1, 0.3 * inch), items]
+    for line in data["lines"]:
+        details = [("Description", line["description"]), ("Printed name", line["printed_name"]),
+                   ("Printed phone", line["printed_phone"]), ("Message", line["message"])]
+        position = line["logo_position"]
+        if position:
+            details.append(("Logo position", "%g%% across, %g%% down" % (position["x"], position["y"])))
+        details = [(label, value) for label, value in details if value]
+        if details:
+            story.append(Spacer(1, 0.2 * inch))
+            story.append(Paragraph("<b>%s</b>" % markup(line["product_name"]), body))
+            story.extend(Paragraph("%s: %s" % (label, markup(value)), body) for label, value in details)
+    story.append(Spacer(1, 0.4 * inch))
+    price_list = markup(data["price_list"] or "regular")
+    story.append(Paragraph(
+        "Prices are estimates from the %s price list; our team confirms final pricing." % price_list, small))
+
+    partial = target + ".%d.part" % os.getpid()
+    SimpleDocTemplate(partial, pagesize=letter, title="%s quote %s" % (BRAND, data["number"]),
+                      author=BRAND, leftMargin=0.75 * inch, rightMargin=0.75 * inch).build(story)
+    os.replace(partial, target)
+    return target
+
+
+class QuoteDocuments:
+    """Quote PDFs generated in a process pool and cached on disk.
+
+    Each quote number gets a directory holding ``<document_key>.pdf``; a
+    new key replaces the quote's older documents, and ``invalidate`` drops them
+    when the quote changes. Concurrent requests for a document that is still
+    being generated wait on the same job.
+    """
+
+    def __init__(self, cache_dir: Path, workers: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.executor = None
+        self.generated = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def start(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _directory(self, number: str) -> Path:
+        # Quote ids are uuids; anything else must not escape the cache
+        return self.cache_dir / hashlib.sha256(number.encode("utf-8")).hexdigest()[:32]
+
+    async def get(self, data: dict, logo_path: Optional[Path]) -> Path:
+        key = document_key(data)
+        directory = self._directory(data["number"])
+        target = directory / f"{key}.pdf"
+        if await asyncio.to_thread(target.exists):
+            return target
+
+        pending = self._inflight.get(key)
+        built = False
+        try:
+            if pending is None:
+                await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+                built = True
+                loop = asyncio.get_running_loop()
+                pending = loop.run_in_executor(
+                    self.executor, build_quote_pdf, str(target), data, str(logo_path) if logo_path else None,
+                )
+                self.generated += 1
+                self._inflight[key] = pending
+                pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+            await asyncio.shield(pending)
+        except Exception as exc:
+            # Layout errors from odd quote data, or a broken pool
+            raise DocumentError("quote %s: %s: %s" % (data["number"], type(exc).__name__, exc)) from exc
+        if built:
+            await asyncio.to_thread(self._remove_stale, directory, target)
+        return target
+
+    @staticmethod
+    def _remove_stale(directory: Path, current: Path):
+        # Only once the replacement exists, so a request that just picked an
+        # older version is rarely left without its file; one already being
+        # streamed keeps reading through its open handle
+        for stale in directory.glob("*.pdf"):
+            if stale != current:
+                stale.unlink(missing_ok=True)
+
+    async def invalidate(self, *numbers: str):
+        for number in numbers:
+            await asyncio.to_thread(shutil.rmtree, self._directory(number), True)
+
+    def stats(self) -> dict:
+        return {"generated": self.generated, "generating": len(self._inflight)}
@@ -0,0 +1,123 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Server error codes for "an index with this name exists with other options/keys"
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: List[Tuple[str, int]]
+    name: str
+    unique: bool = False
+    # TTL index: Mongo deletes documents this many seconds after the indexed date
+    expire_after: Optional[int] = None
+
+    @property
+    def options(self) -> dict:
+        options = {"name": self.name, "unique": self.unique}
+        if self.expire_after is not None:
+            options["expireAfterSeconds"] = self.expire_after
+        return options
+
+
+# Completed jobs are kept this long for inspection; failed ones until retried
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Every index the application relies on. Startup reconciles the database
+# against this list, so adding or changing an entry here is the whole
+# migration.
+INDEXES = [
+    IndexSpec("users", [("email", ASCENDING)], name="email_unique", unique=True),
+    IndexSpec("users", [("id", ASCENDING)], name="id_unique", unique=True),
+    IndexSpec("customizations", [("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_email_created_at"),
+    IndexSpec("customizations", [("id", ASCENDING)], name="id_unique", unique=True),
+    IndexSpec("customizations", [("created_at", ASCENDING)], name="created_at"),
+    IndexSpec("quotes", [("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_email_created_at"),
+    IndexSpec("quotes", [("id", ASCENDING)], name="id_unique", unique=True),
+    IndexSpec("quotes", [("created_at", ASCENDING)], name="created_at"),
+    IndexSpec("quotes", [("parent_quote_id", ASCENDING), ("line", ASCENDING)], name="parent_quote_id_line"),
+    IndexSpec("uploads", [("refcount", ASCENDING), ("last_uploaded_at", ASCENDING)], name="refcount_last_uploaded_at"),
+    IndexSpec("quote_rollups", [("day", ASCENDING)], name="day"),
+    IndexSpec("jobs", [("queue", ASCENDING), ("status", ASCENDING), ("run_at", ASCENDING)], name="queue_status_run_at"),
+    IndexSpec("jobs", [("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+    IndexSpec("jobs", [("status", ASCENDING), ("failed_at", DESCENDING)], name="status_failed_at"),
+    IndexSpec("jobs", [("finished_at", ASCENDING)], name="finished_at_ttl", expire_after=JOB_RETENTION_SECONDS),
+]
+
+
+@dataclass(frozen=True)
+class RouteQuery:
+    route: str
+    collection: str
+    filter: dict
+    sort: Optional[List[Tuple[str, int]]] = field(default=None)
+
+
+PAGE_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+# The query shape behind each route, used by tools/check_query_plans.py to
+# prove every one of them is served by an index.
+ROUTE_QUERIES = [
+    RouteQuery("POST /api/auth/register", "users", {"email": "probe@example.com"}),
+    RouteQuery("POST /api/auth/login", "users", {"email": "probe@example.com"}),
+    RouteQuery("GET /api/auth/me", "users", {"email": "probe@example.com"}),
+    RouteQuery("GET /api/customizations", "customizations", {"user_email": "probe@example.com"}, PAGE_SORT),
+    RouteQuery("GET /api/quotes", "quotes", {"user_email": "probe@example.com"}, PAGE_SORT),
+    RouteQuery("GET /api/customizations/{id}/render", "customizations", {"id": "probe"}),
+    RouteQuery("GET /api/admin/stats", "quote_rollups", {"day": {"$gte": "2024-01-01", "$lte": "2024-01-31"}}),
+    RouteQuery("GET /api/quotes/{id}/pdf", "quotes", {"id": "probe"}),
+    RouteQuery("GET /api/quotes/{id}/pdf", "quotes", {"parent_quote_id": "probe"}, [("line", ASCENDING)]),
+    RouteQuery("GET /api/search", "quotes", {"id": {"$in": ["probe"]}}),
+    RouteQuery("search index refresh", "quotes", {"created_at": {"$gte": datetime(2024, 1, 1)}}, [("created_at", ASCENDING)]),
+    RouteQuery("search index refresh", "customizations", {"created_at": {"$gte": datetime(2024, 1, 1)}}, [("created_at", ASCENDING)]),
+    RouteQuery("search index cutoff", "quotes", {}, [("created_at", DESCENDING)]),
+    RouteQuery("search index cutoff", "customizations", {}, [("created_at", DESCENDING)]),
+    RouteQuery("job claim", "jobs", {"queue": "probe", "status": "queued", "run_at": {"$lte": datetime(2024, 1, 1)}}, [("run_at", ASCENDING)]),
+    RouteQuery("job lease sweep", "jobs", {"status": "running", "lease_until": {"$lt": datetime(2024, 1, 1)}}),
+    RouteQuery("GET /api/admin/jobs", "jobs", {"status": "failed"}, [("failed_at", DESCENDING)]),
+    RouteQuery("catalog version poll", "catalog_versions", {}, [("_id", DESCENDING)]),
+]
+
+
+async def ensure_indexes(db, specs: List[IndexSpec] = INDEXES):
+    """Create every index in ``specs``; safe to run on every startup.
+
+    An existing index with the same name but different keys or options is
+    dropped and rebuilt so the registry stays the source of truth.
+    """
+    for spec in specs:
+        collection = db[spec.collection]
+        try:
+            await collection.create_index(spec.keys, **spec.options)
+        except OperationFailure as exc:
+            if exc.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+                # e.g. duplicate emails blocking a unique index: keep serving
+                logger.error("Could not build index %s.%s: %s", spec.collection, spec.name, exc)
+                continue
+            logger.warning("Rebuilding index %s.%s with new definition", spec.collection, spec.name)
+            await collection.drop_index(spec.name)
+            await collection.create_index(spec.keys, **spec.options)
+
+
+def plan_stages(plan) -> List[str]:
+    """Every ``stage`` name in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
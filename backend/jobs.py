@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+from database import JobRepository
+from metrics import JOB_QUEUE_DEPTH, JOB_QUEUE_OLDEST_WAIT, JOB_SECONDS, JOB_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying can't help; the job fails at once."""
+
+
+@dataclass(frozen=True)
+class QueueConfig:
+    name: str
+    # Jobs from this queue one runner process works on at the same time
+    concurrency: int = 4
+    max_attempts: int = 5
+    # Seconds a claim is valid without renewal; renewed every lease / 3
+    lease: float = 60.0
+    timeout: float = 300.0
+    backoff_base: float = 5.0
+    backoff_max: float = 900.0
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential with jitter so a burst of failures doesn't retry in step
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+
+QUEUES: Dict[str, QueueConfig] = {
+    config.name: config for config in (
+        QueueConfig("notifications", concurrency=4, max_attempts=8),
+        QueueConfig("logos", concurrency=2, max_attempts=3, timeout=60.0),
+    )
+}
+
+
+def queues_from_env(queues: Dict[str, QueueConfig] = QUEUES) -> Dict[str, QueueConfig]:
+    """``JOB_CONCURRENCY_<QUEUE>`` and ``JOB_MAX_ATTEMPTS_<QUEUE>`` override the defaults."""
+    configured = {}
+    for name, config in queues.items():
+        env = name.upper()
+        configured[name] = replace(
+            config,
+            concurrency=int(os.getenv("JOB_CONCURRENCY_%s" % env, config.concurrency)),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS_%s" % env, config.max_attempts)),
+        )
+    return configured
+
+
+def jobs_for_new_quotes(quote_docs: List[dict]) -> List[dict]:
+    """Follow-up work for quotes that were just saved.
+
+    Job ids derive from the quote ids, so enqueueing twice is harmless.
+    """
+    first = quote_docs[0]
+    request_id = first.get("parent_quote_id") or first["id"]
+    jobs = [JobRepository.new_job(
+        "notifications",
+        {"kind": "new_quote", "request_id": request_id, "quote_ids": [q["id"] for q in quote_docs]},
+        job_id="notify-quote:%s" % request_id,
+    )]
+    for quote in quote_docs:
+        if (quote.get("customization_data") or {}).get("logo_url"):
+            jobs.append(JobRepository.new_job(
+                "logos", {"quote_id": quote["id"]}, job_id="validate-logo:%s" % quote["id"]
+            ))
+    return jobs
+
+
+class JobRunner:
+    """Works the queues that have a handler until closed.
+
+    Each queue gets ``concurrency`` consumer tasks that claim one job at a
+    time, so a slow queue can't starve the others. Failed jobs go back on
+    the queue with exponential backoff until ``max_attempts``, then stay
+    failed for an admin to look at. A sweeper requeues jobs whose lease ran
+    out (their worker died) and refreshes the queue depth gauges.
+    """
+
+    def __init__(self, repository: JobRepository, handlers: Dict[str, Handler],
+                 queues: Optional[Dict[str, QueueConfig]] = None, poll_interval: float = 1.0,
+                 worker_id: Optional[str] = None):
+        self.repository = repository
+        self.handlers = handlers
+        queues = queues or QUEUES
+        self.queues = {name: queues[name] for name in handlers}
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or "%s:%d" % (socket.gethostname(), os.getpid())
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._closing = False
+
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        for config in self.queues.values():
+            for _ in range(config.concurrency):
+                self._tasks.append(asyncio.create_task(self._consume(config)))
+        self._tasks.append(asyncio.create_task(self._sweep()))
+        logger.info("Job runner %s working %s", self.worker_id,
+                    ", ".join("%s x%d" % (c.name, c.concurrency) for c in self.queues.values()))
+
+    async def _consume(self, config: QueueConfig):
+        while not self._closing:
+            try:
+                job = await self.repository.claim(config.name, self.worker_id, config.lease)
+            except PyMongoError:
+                logger.exception("Could not claim a %s job", config.name)
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+                continue
+            run = asyncio.create_task(self._run(config, job))
+            self._running[job["_id"]] = run
+            try:
+                await asyncio.shield(run)
+            except Exception:
+                # Recording the outcome failed (Mongo went away); the lease
+                # runs out and another claim picks the job up again
+                logger.exception("Could not finish %s job %s", config.name, job["_id"])
+            finally:
+                self._running.pop(job["_id"], None)
+
+    async def _run(self, config: QueueConfig, job: dict):
+        JOB_WAIT_SECONDS.labels(config.name).observe(
+            max(0.0, (job["started_at"] - job["run_at"]).total_seconds())
+        )
+        if job["attempts"] > config.max_attempts:
+            # Its workers kept dying mid-job; don't let it take down another
+            await self.repository.fail(job["_id"], self.worker_id, "lease expired %d times" % config.max_attempts)
+            self.failed += 1
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(config, job["_id"]))
+        started = time.monotonic()
+        outcome = "done"
+        try:
+            await asyncio.wait_for(self.handlers[config.name](job["payload"]), config.timeout)
+        except asyncio.CancelledError:
+            outcome = "released"
+            await asyncio.shield(self.repository.release(job["_id"], self.worker_id))
+            raise
+        except Exception as exc:
+            error = "%s: %s" % (type(exc).__name__, exc) if str(exc) else type(exc).__name__
+            if isinstance(exc, PermanentJobError) or job["attempts"] >= config.max_attempts:
+                outcome = "failed"
+                logger.error("Job %s failed for good after %d attempts: %s", job["_id"], job["attempts"], error)
+                await self.repository.fail(job["_id"], self.worker_id, error)
+                self.failed += 1
+            else:
+                outcome = "retried"
+                delay = config.backoff(job["attempts"])
+                logger.warning("Job %s failed (attempt %d), retrying in %.0fs: %s",
+                               job["_id"], job["attempts"], delay, error)
+                await self.repository.retry(job["_id"], self.worker_id, error, delay)
+                self.retried += 1
+        else:
+            if not await self.repository.complete(job["_id"], self.worker_id):
+                logger.warning("Job %s finished after its lease was taken over", job["_id"])
+            self.completed += 1
+        finally:
+            heartbeat.cancel()
+            JOB_SECONDS.labels(config.name, outcome).observe(time.monotonic() - started)
+
+    async def _heartbeat(self, config: QueueConfig, job_id: str):
+        while True:
+            await asyncio.sleep(config.lease / 3)
+            try:
+                if not await self.repository.renew(job_id, self.worker_id, config.lease):
+                    logger.warning("Lost the lease on job %s", job_id)
+                    return
+            except PyMongoError:
+                logger.exception("Could not renew the lease on job %s", job_id)
+
+    async def _sweep(self):
+        interval = min(c.lease for c in self.queues.values()) / 2
+        while True:
+            try:
+                requeued = await self.repository.requeue_expired()
+                if requeued:
+                    logger.warning("Requeued %d jobs with expired leases", requeued)
+                await self.stats()
+            except PyMongoError:
+                logger.exception("Job sweep failed")
+            await asyncio.sleep(interval)
+
+    async def stats(self) -> dict:
+        queues = {}
+        for name in self.queues:
+            queues[name] = stats = await self.repository.queue_stats(name)
+            for status in ("queued", "running", "failed"):
+                JOB_QUEUE_DEPTH.labels(name, status).set(stats[status])
+            JOB_QUEUE_OLDEST_WAIT.labels(name).set(stats["oldest_wait_s"])
+        return {
+            "worker": self.worker_id,
+            "in_progress": len(self._running),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queues": queues,
+        }
+
+    async def close(self, grace: float = 30.0):
+        """Stop claiming, give running jobs ``grace`` seconds, then put the
+        rest back on their queues."""
+        self._closing = True
+        running = list(self._running.values())
+        if running:
+            _, pending = await asyncio.wait(running, timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
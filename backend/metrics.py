@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from typing import Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency as seen by the driver",
+    ["collection", "command"], buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error",
+    ["collection", "command"],
+)
+PASSWORD_SECONDS = Histogram(
+    "password_bcrypt_duration_seconds", "Time spent inside bcrypt, excluding queueing",
+    ["operation"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0),
+)
+UPLOAD_BYTES = Histogram(
+    "upload_size_bytes", "Size of accepted uploads",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 10e6, 25e6),
+)
+UPLOAD_SECONDS = Histogram(
+    "upload_receive_duration_seconds", "Time to stream, hash and fsync an upload",
+    buckets=LATENCY_BUCKETS,
+)
+RATE_LIMITED = Counter(
+    "http_rate_limited_total", "Requests rejected with 429 by route class and key",
+    ["route_class", "key"],
+)
+LOAD_SHED = Counter(
+    "http_load_shed_total", "Requests rejected with 503 while the event loop was lagging",
+)
+CATALOG_VERSION = Gauge(
+    "catalog_version", "Product catalog version served (lowest across live workers)",
+    multiprocess_mode="livemin",
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay of a periodic timer on the event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "Jobs per queue and status, as last counted by a job runner",
+    ["queue", "status"], multiprocess_mode="livemax",
+)
+JOB_QUEUE_OLDEST_WAIT = Gauge(
+    "job_queue_oldest_wait_seconds", "How long the oldest due job in a queue has been waiting",
+    ["queue"], multiprocess_mode="livemax",
+)
+JOB_WAIT_SECONDS = Histogram(
+    "job_wait_seconds", "Time from a job becoming due to a worker starting it",
+    ["queue"], buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0),
+)
+JOB_SECONDS = Histogram(
+    "job_duration_seconds", "Time spent running a job",
+    ["queue", "outcome"], buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0),
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(app, scope) -> str:
+    # Label by template, not raw path, so ids do not explode cardinality
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope["app"], scope)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver-level timings for every command, labelled by collection."""
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, int], Tuple[str, str]] = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            value = event.command.get("collection")
+        collection = value if isinstance(value, str) else ""
+        self._inflight[(event.request_id, event.operation_id)] = (collection, event.command_name)
+
+    def _finish(self, event, failed: bool):
+        labels = self._inflight.pop((event.request_id, event.operation_id), None)
+        if labels is None:
+            return
+        MONGO_COMMAND_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+        if failed:
+            MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+class LoopLagMonitor:
+    """Samples how late a periodic timer fires, a proxy for blocked loops."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(self.lag)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    # With several workers, PROMETHEUS_MULTIPROC_DIR makes every scrape
+    # aggregate all of them instead of whichever worker answered
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+import orjson
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# Opaque keyset cursors: the (created_at, id) of the last document on a page.
+# Pages are ordered newest first, so the next page is everything strictly
+# older than that pair.
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+
+
+def keyset_filter(base: dict, after: Optional[Tuple[datetime, str]]) -> dict:
+    if after is None:
+        return base
+    created_at, doc_id = after
+    return {
+        **base,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}},
+        ],
+    }
+
+
+def json_default(value):
+    # orjson handles datetimes itself; this covers ObjectId and friends
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def ndjson_line(doc: dict) -> bytes:
+    return orjson.dumps(doc, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from metrics import PASSWORD_SECONDS
+from prefork import pool_size
+
+
+class PasswordPoolSaturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Password worker pool is saturated")
+        self.retry_after = retry_after
+
+
+# Module-level so they can be pickled into a process pool. Each returns the
+# time spent inside bcrypt so hash cost is reported separately from queueing.
+def _hash_password(password: bytes):
+    started = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt())
+    return hashed, time.perf_counter() - started
+
+
+def _check_password(password: bytes, hashed: bytes):
+    started = time.perf_counter()
+    ok = bcrypt.checkpw(password, hashed)
+    return ok, time.perf_counter() - started
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop with a bounded number of waiting jobs.
+
+    When ``max_pending`` jobs are already queued or running, new work is
+    rejected immediately with ``PasswordPoolSaturated`` rather than piling up
+    behind a login burst.
+    """
+
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, retry_after: int = 1):
+        self.kind = kind
+        self.workers = workers or pool_size()
+        self.max_pending = max_pending or self.workers * 8
+        self.retry_after = retry_after
+        pool_class = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        self.executor = pool_class(max_workers=self.workers)
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        workers = os.getenv("PASSWORD_POOL_WORKERS")
+        max_pending = os.getenv("PASSWORD_QUEUE_LIMIT")
+        return cls(
+            kind=os.getenv("PASSWORD_POOL", "thread"),
+            workers=int(workers) if workers else None,
+            max_pending=int(max_pending) if max_pending else None,
+            retry_after=int(os.getenv("PASSWORD_RETRY_AFTER", "1")),
+        )
+
+    async def _run(self, operation: str, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolSaturated(self.retry_after)
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, hash_seconds = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        PASSWORD_SECONDS.labels(operation).observe(hash_seconds)
+        self.hash_seconds_total += hash_seconds
+        self.hash_seconds_max = max(self.hash_seconds_max, hash_seconds)
+        self.wait_seconds_total += time.perf_counter() - submitted - hash_seconds
+        return result
+
+    async def hash(self, password: str) -> bytes:
+        return await self._run("hash", _hash_password, password.encode("utf-8"))
+
+    async def verify(self, password: str, hashed: bytes) -> bool:
+        return await self._run("verify", _check_password, password.encode("utf-8"), hashed)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "pool": self.kind,
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "queue_limit": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "hash_ms_avg": round(self.hash_seconds_total / completed * 1000, 2),
+            "hash_ms_max": round(self.hash_seconds_max * 1000, 2),
+            "wait_ms_avg": round(self.wait_seconds_total / completed * 1000, 2),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,283 @@
+"""Prefork supervisor: N uvicorn workers accepting on one shared socket.
+
+    python prefork.py                      # WEB_CONCURRENCY workers, default one per CPU
+    kill -HUP <pid>                        # rolling reload, one worker at a time
+    kill -TERM <pid>                       # graceful shutdown
+
+The supervisor never imports the app, so a reload picks up new code. Each
+worker reports readiness over a pipe once its lifespan startup has finished;
+during a reload an old worker is only stopped after its replacement is ready.
+"""
+import argparse
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("prefork")
+
+CRASH_BACKOFF_MAX = 30.0
+
+
+def pool_size() -> int:
+    """Processes for each of a worker's CPU pools (renditions, mockups, PDFs).
+
+    The CPUs are split across the web workers rather than every worker
+    starting a full set; WEB_CONCURRENCY is exported by the supervisor.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "0") or 1)))
+
+
+class Worker:
+    def __init__(self, process: subprocess.Popen, ready_fd: int):
+        self.process = process
+        self.ready_fd = ready_fd
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def poll_ready(self, timeout: float = 0.0) -> bool:
+        if self.ready_at is None and self.ready_fd is not None:
+            readable, _, _ = select.select([self.ready_fd], [], [], timeout)
+            if readable:
+                if os.read(self.ready_fd, 1):
+                    self.ready_at = time.monotonic()
+                os.close(self.ready_fd)
+                self.ready_fd = None
+        return self.ready_at is not None
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+
+    def reap(self, timeout: float):
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Worker %d did not exit within %.0fs, killing it", self.pid, timeout)
+            self.process.kill()
+            self.process.wait()
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+
+class Supervisor:
+    def __init__(self, app: str, host: str, port: int, workers: int, max_requests: int = 0,
+                 max_requests_jitter: int = 0, graceful_timeout: float = 30.0,
+                 ready_timeout: float = 60.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+
+        self.workers: Dict[int, Worker] = {}
+        self.sock: Optional[socket.socket] = None
+        self.metrics_dir: Optional[str] = None
+        self._reload = False
+        self._stopping = False
+        self._crash_backoff = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Supervisor":
+        return cls(
+            app=os.getenv("APP_MODULE", "server:app"),
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=int(os.getenv("PORT", "8001")),
+            workers=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1,
+            max_requests=int(os.getenv("MAX_REQUESTS", "0")),
+            max_requests_jitter=int(os.getenv("MAX_REQUESTS_JITTER", "0")),
+            graceful_timeout=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+            ready_timeout=float(os.getenv("READY_TIMEOUT", "60")),
+        )
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def spawn(self) -> Worker:
+        ready_read, ready_write = os.pipe()
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            # Stagger recycling so workers do not all restart together
+            max_requests += int.from_bytes(os.urandom(2), "big") % (self.max_requests_jitter + 1)
+        env = dict(os.environ, WEB_CONCURRENCY=str(self.worker_count))
+        if self.metrics_dir:
+            env["PROMETHEUS_MULTIPROC_DIR"] = self.metrics_dir
+        command = [
+            sys.executable, os.path.abspath(__file__), "worker", self.app,
+            "--fd", str(self.sock.fileno()), "--ready-fd", str(ready_write),
+            "--max-requests", str(max_requests),
+        ]
+        process = subprocess.Popen(command, pass_fds=(self.sock.fileno(), ready_write), env=env)
+        os.close(ready_write)
+        worker = Worker(process, ready_read)
+        self.workers[worker.pid] = worker
+        return worker
+
+    def wait_ready(self, workers) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        pending = list(workers)
+        while pending and time.monotonic() < deadline and not self._stopping:
+            for worker in list(pending):
+                if worker.poll_ready(timeout=0.1):
+                    pending.remove(worker)
+                elif worker.process.poll() is not None:
+                    return False
+        return not pending
+
+    def start(self):
+        started = time.monotonic()
+        self.bind()
+        if self.worker_count > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            self.metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        workers = [self.spawn() for _ in range(self.worker_count)]
+        if not self.wait_ready(workers):
+            self.shutdown()
+            raise SystemExit("Workers did not become ready within %.0fs" % self.ready_timeout)
+        logger.info("%d workers ready on %s:%d in %.2fs",
+                    len(workers), self.host, self.port, time.monotonic() - started)
+
+    def rolling_reload(self):
+        started = time.monotonic()
+        old = list(self.workers.values())
+        logger.info("Rolling reload of %d workers", len(old))
+        for worker in old:
+            replacement = self.spawn()
+            if not self.wait_ready([replacement]):
+                logger.error("Replacement worker %d failed to start, aborting reload", replacement.pid)
+                self.retire(replacement)
+                return
+            self.retire(worker)
+        logger.info("Reload finished in %.2fs", time.monotonic() - started)
+
+    def retire(self, worker: Worker):
+        self.workers.pop(worker.pid, None)
+        worker.stop()
+        worker.reap(self.graceful_timeout)
+        self.mark_dead(worker.pid)
+
+    def mark_dead(self, pid: int):
+        if self.metrics_dir:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid, self.metrics_dir)
+
+    def replace_exited(self):
+        for pid, worker in list(self.workers.items()):
+            code = worker.process.poll()
+            if code is None:
+                continue
+            del self.workers[pid]
+            worker.reap(0)
+            self.mark_dead(pid)
+            lifetime = time.monotonic() - worker.started_at
+            if code == 0:
+                logger.info("Worker %d exited after %.0fs (request limit), replacing it", pid, lifetime)
+            else:
+                logger.warning("Worker %d died with exit code %s after %.0fs", pid, code, lifetime)
+                # A worker that cannot even start should not be respawned in a tight loop
+                if not worker.ready_at:
+                    self._crash_backoff = min(max(self._crash_backoff * 2, 1.0), CRASH_BACKOFF_MAX)
+                    time.sleep(self._crash_backoff)
+                else:
+                    self._crash_backoff = 0.0
+            self.spawn()
+
+    def handle_signals(self):
+        def stop(signum, frame):
+            self._stopping = True
+
+        def reload(signum, frame):
+            self._reload = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+
+    def run(self):
+        self.handle_signals()
+        self.start()
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self.rolling_reload()
+            self.replace_exited()
+            for worker in self.workers.values():
+                worker.poll_ready()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping %d workers", len(self.workers))
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            worker.reap(max(0.0, deadline - time.monotonic()))
+        self.workers.clear()
+        if self.sock:
+            self.sock.close()
+        if self.metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def run_worker(app: str, fd: int, ready_fd: int, max_requests: int):
+    import uvicorn
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if not self.should_exit:
+                os.write(ready_fd, b"1")
+                os.close(ready_fd)
+
+    # The supervisor handles reloads; a stray SIGHUP must not kill the worker
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # Client addresses (and so per-IP rate limits) come from X-Forwarded-For,
+    # trusted only from FORWARDED_ALLOW_IPS: nginx on localhost by default,
+    # "*" where a platform proxy is the only way in (railway.json, Procfile)
+    config = uvicorn.Config(app, limit_max_requests=max_requests or None,
+                            proxy_headers=True,
+                            forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                            timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    # socket(fileno=) detects the inherited socket's real address family
+    WorkerServer(config).run(sockets=[socket.socket(fileno=fd)])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    worker = commands.add_parser("worker", help="internal: run one worker on an inherited socket")
+    worker.add_argument("app")
+    worker.add_argument("--fd", type=int, required=True)
+    worker.add_argument("--ready-fd", type=int, required=True)
+    worker.add_argument("--max-requests", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.app, args.fd, args.ready_fd, args.max_requests)
+    else:
+        Supervisor.from_env().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Each size step up a product's size list adds this share of the list price
+SIZE_STEP = float(os.getenv("PRICING_SIZE_STEP", "0.25"))
+
+# (minimum quantity, discount) per tier, ascending
+QUANTITY_TIERS = (
+    (1, 0.00),
+    (10, 0.05),
+    (25, 0.10),
+    (50, 0.15),
+    (100, 0.20),
+)
+
+# Largest quantity a line can be priced for; keeps every total well inside int64
+MAX_QUANTITY = int(os.getenv("PRICING_MAX_QUANTITY", "100000"))
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+REGULAR = "regular"
+WHOLESALE = "wholesale"
+PRICE_LISTS = (REGULAR, WHOLESALE)
+
+
+class PricingError(ValueError):
+    """Raised with every unpriceable line, in the quote batch error format."""
+
+    def __init__(self, lines: List[dict]):
+        super().__init__("Some lines cannot be priced")
+        self.lines = lines
+
+
+class PricingEngine:
+    """Unit prices for every product x size x price list x quantity tier.
+
+    The matrix is built once from the catalog, in integer cents so totals
+    never pick up float rounding. Pricing a cart is a handful of numpy
+    gathers over index arrays, whatever its length.
+    """
+
+    def __init__(self, products: Sequence[dict], tiers=QUANTITY_TIERS, size_step: float = SIZE_STEP):
+        self.tiers = tiers
+        self.tier_minimums = np.array([minimum for minimum, _ in tiers], dtype=np.int64)
+        self.discounts = np.array([discount for _, discount in tiers])
+
+        self.product_rows: Dict[str, int] = {}
+        self.name_rows: Dict[str, int] = {}
+        self.size_columns: List[Dict[str, int]] = []
+        self.keys: Dict[Tuple[str, Optional[str]], Tuple[int, int]] = {}
+        max_sizes = max((len(p.get("sizes") or [None]) for p in products), default=1)
+        list_prices = np.zeros((len(products), len(PRICE_LISTS)))
+        for row, product in enumerate(products):
+            self.product_rows[product["id"]] = row
+            self.name_rows[product["name"]] = row
+            self.size_columns.append({size: col for col, size in enumerate(product.get("sizes") or [])})
+            list_prices[row] = (product["base_price"], product["wholesale_price"])
+            self.keys[(product["id"], None)] = (row, 0)
+            for size, col in self.size_columns[row].items():
+                self.keys[(product["id"], size)] = (row, col)
+
+        size_multipliers = 1 + size_step * np.arange(max_sizes)
+        # (product, size, price list, tier)
+        self.unit_cents = np.rint(
+            list_prices[:, None, :, None] * 100
+            * size_multipliers[None, :, None, None]
+            * (1 - self.discounts)[None, None, None, :]
+        ).astype(np.int64)
+
+    def resolve(self, product_id: Optional[str], size: Optional[str],
+                product_name: Optional[str] = None) -> Tuple[int, int]:
+        row = self.product_rows.get(product_id) if product_id else self.name_rows.get(product_name)
+        if row is None:
+            raise KeyError("product_id", "Product not found")
+        if size is None:
+            return row, 0
+        column = self.size_columns[row].get(size)
+        if column is None:
+            raise KeyError("size", "Size not offered for this product")
+        return row, column
+
+    def price(self, rows, columns, quantities, price_list: str = REGULAR) -> dict:
+        """Price resolved lines in one pass; amounts are returned in cents."""
+        rows = np.asarray(rows, dtype=np.intp)
+        columns = np.asarray(columns, dtype=np.intp)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        out_of_range = np.flatnonzero((quantities < 1) | (quantities > MAX_QUANTITY))
+        if len(out_of_range):
+            raise PricingError([
+                {"line": int(index), "errors": [{"field": "quantity",
+                                                 "detail": "Quantity must be between 1 and %d" % MAX_QUANTITY}]}
+                for index in out_of_range
+            ])
+        tiers = np.searchsorted(self.tier_minimums, quantities, side="right") - 1
+        unit = self.unit_cents[rows, columns, PRICE_LISTS.index(price_list), tiers]
+        # Bound the int64 math below with exact Python integers
+        if int(unit.max(initial=0)) * int(quantities.sum()) > INT64_MAX:
+            raise PricingError([{"line": None, "errors": [{"field": "quantity", "detail": "Cart total is too large"}]}])
+        totals = unit * quantities
+        return {"unit": unit, "totals": totals, "tiers": tiers, "subtotal": int(totals.sum())}
+
+    def estimate(self, lines: Sequence[dict], price_list: str = REGULAR) -> dict:
+        rows, columns, errors = [], [], []
+        keys = self.keys
+        for index, line in enumerate(lines):
+            resolved = keys.get((line.get("product_id"), line.get("size")))
+            if resolved:
+                rows.append(resolved[0])
+                columns.append(resolved[1])
+                continue
+            try:
+                row, column = self.resolve(line.get("product_id"), line.get("size"), line.get("product_name"))
+            except KeyError as exc:
+                field, detail = exc.args
+                errors.append({"line": index, "errors": [{"field": field, "detail": detail}]})
+                continue
+            rows.append(row)
+            columns.append(column)
+        if errors:
+            raise PricingError(errors)
+        priced = self.price(rows, columns, [line["quantity"] for line in lines], price_list)
+        return {
+            "price_list": price_list,
+            "currency": "USD",
+            "lines": [
+                {"unit_price": unit, "line_total": total, "tier_min_quantity": tier_min, "discount": discount}
+                for unit, total, tier_min, discount in zip(
+                    (priced["unit"] / 100).tolist(),
+                    (priced["totals"] / 100).tolist(),
+                    self.tier_minimums[priced["tiers"]].tolist(),
+                    self.discounts[priced["tiers"]].tolist(),
+                )
+            ],
+            "subtotal": priced["subtotal"] / 100,
+        }
+
+
+def price_list_for(profile: Optional[dict]) -> str:
+    if profile and profile.get("account_type") == WHOLESALE and profile.get("wholesale_approved"):
+        return WHOLESALE
+    return REGULAR
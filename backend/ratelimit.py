@@ -0,0 +1,250 @@
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from cache import TTLCache
+from metrics import LOAD_SHED, RATE_LIMITED
+
+# Login and register bodies are tiny; anything bigger is not read for the account
+MAX_ACCOUNT_BODY = 16 * 1024
+
+# Monitoring must keep answering while the service sheds load
+SHED_EXEMPT_PATHS = {"/api/health", "/api/metrics"}
+
+
+class TokenBuckets:
+    """One token bucket per key, ``burst`` tokens refilled at ``rate`` per second.
+
+    Buckets live in a bounded ``TTLCache`` and expire once they would be full
+    again, so an idle key costs nothing and a full table evicts the least
+    recently seen key, which is equivalent to granting it a fresh bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = TTLCache(maxsize, burst / rate)
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """Spend ``cost`` tokens; returns 0 when allowed, else seconds to wait."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self.buckets.set(key, (tokens, now), ttl=(self.burst - tokens) / self.rate)
+            return (cost - tokens) / self.rate
+        tokens -= cost
+        self.buckets.set(key, (tokens, now), ttl=(self.burst - tokens) / self.rate)
+        return 0.0
+
+    def stats(self) -> dict:
+        return {"rate_per_s": round(self.rate, 4), "burst": self.burst, "keys": len(self.buckets)}
+
+
+@dataclass
+class RouteClass:
+    name: str
+    # "body": the JSON body's email field, "token": the bearer token's subject
+    account_from: str
+    by_ip: Optional[TokenBuckets]
+    by_account: Optional[TokenBuckets]
+
+
+# (method, path) -> (route class, account source, per-IP limit, per-account limit)
+# Limits are "count/seconds": a burst of count, refilled evenly over seconds
+DEFAULT_LIMITS = {
+    ("POST", "/api/auth/login"): ("login", "body", "20/60", "10/300"),
+    ("POST", "/api/auth/register"): ("register", "body", "10/600", "3/600"),
+    ("POST", "/api/upload"): ("upload", "token", "60/60", "60/60"),
+}
+
+
+def parse_limit(spec: str, maxsize: int) -> Optional[TokenBuckets]:
+    if not spec or spec.strip() == "0":
+        return None
+    count, _, seconds = spec.partition("/")
+    return TokenBuckets(int(count) / float(seconds or 1), int(count), maxsize)
+
+
+class RateLimiter:
+    """Per-IP and per-account budgets for the expensive routes, plus load
+    shedding for everything else once the event loop falls behind.
+
+    State is per worker: with N prefork workers a client spread over several
+    connections can get up to N times the budget, which still bounds it.
+    """
+
+    def __init__(self, classes: Dict[Tuple[str, str], RouteClass],
+                 account_for: Optional[Callable[[str], Optional[str]]] = None,
+                 loop_lag=None, lag_threshold: float = 0.25, shed_in_flight: int = 64,
+                 max_in_flight: int = 0, retry_after: int = 1):
+        self.classes = classes
+        self.account_for = account_for
+        self.loop_lag = loop_lag
+        self.lag_threshold = lag_threshold
+        self.shed_in_flight = shed_in_flight
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.limited: Dict[str, int] = {}
+        self.shed = 0
+
+    @classmethod
+    def from_env(cls, account_for=None, loop_lag=None) -> "RateLimiter":
+        maxsize = int(os.getenv("RATE_LIMIT_KEYS", "50000"))
+        classes = {}
+        for route, (name, account_from, ip_limit, account_limit) in DEFAULT_LIMITS.items():
+            prefix = "RATE_LIMIT_%s_" % name.upper()
+            classes[route] = RouteClass(
+                name, account_from,
+                parse_limit(os.getenv(prefix + "IP", ip_limit), maxsize),
+                parse_limit(os.getenv(prefix + "ACCOUNT", account_limit), maxsize),
+            )
+        return cls(
+            classes, account_for, loop_lag,
+            lag_threshold=float(os.getenv("LOAD_SHED_LAG_MS", "250")) / 1000,
+            shed_in_flight=int(os.getenv("LOAD_SHED_CONCURRENCY", "64")),
+            max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "0")),
+            retry_after=int(os.getenv("LOAD_SHED_RETRY_AFTER", "1")),
+        )
+
+    @property
+    def lagging(self) -> bool:
+        return self.loop_lag is not None and self.loop_lag.lag > self.lag_threshold
+
+    def admit(self) -> bool:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return False
+        if self.in_flight >= self.shed_in_flight and self.lagging:
+            return False
+        return True
+
+    def check(self, route_class: RouteClass, ip: str, account: Optional[str]) -> float:
+        """Seconds the caller must wait, or 0 when the request may proceed.
+        The IP budget is spent first, so refused account attempts still count
+        against the address that made them."""
+        limits = [("ip", route_class.by_ip, ip)]
+        if account:
+            limits.append(("account", route_class.by_account, account))
+        for kind, buckets, key in limits:
+            if buckets is None:
+                continue
+            wait = buckets.take(key)
+            if wait:
+                label = "%s:%s" % (route_class.name, kind)
+                self.limited[label] = self.limited.get(label, 0) + 1
+                RATE_LIMITED.labels(route_class.name, kind).inc()
+                return wait
+        return 0.0
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "lagging": self.lagging,
+            "shed": self.shed,
+            "limited": dict(self.limited),
+            "routes": {
+                rc.name: {
+                    "ip": rc.by_ip.stats() if rc.by_ip else None,
+                    "account": rc.by_account.stats() if rc.by_account else None,
+                }
+                for rc in self.classes.values()
+            },
+        }
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _buffer_body(receive) -> List[dict]:
+    messages, size = [], 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages
+        size += len(message.get("body", b""))
+        if not message.get("more_body") or size > MAX_ACCOUNT_BODY:
+            return messages
+
+
+def _replay(messages: List[dict], receive):
+    pending = list(messages)
+
+    async def replay():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+    return replay
+
+
+def _body_email(messages: List[dict]) -> Optional[str]:
+    if messages[-1].get("more_body") or messages[-1]["type"] != "http.request":
+        return None
+    try:
+        data = json.loads(b"".join(m.get("body", b"") for m in messages))
+    except ValueError:
+        return None
+    email = data.get("email") if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying ``app.state.rate_limiter``, if present."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limiter = getattr(scope["app"].state, "rate_limiter", None) if "app" in scope else None
+        if scope["type"] != "http" or limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] not in SHED_EXEMPT_PATHS and not limiter.admit():
+            limiter.shed += 1
+            LOAD_SHED.inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Service is busy, please retry shortly"},
+                headers={"Retry-After": str(limiter.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        route_class = limiter.classes.get((scope["method"], scope["path"]))
+        if route_class is not None:
+            account = None
+            if route_class.account_from == "body":
+                buffered = await _buffer_body(receive)
+                account = _body_email(buffered)
+                receive = _replay(buffered, receive)
+            elif limiter.account_for:
+                authorization = _header(scope, b"authorization") or ""
+                if authorization[:7].lower() == "bearer ":
+                    account = limiter.account_for(authorization[7:].strip())
+            client = scope.get("client")
+            wait = limiter.check(route_class, client[0] if client else "unknown", account)
+            if wait:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests, please retry later"},
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+                await response(scope, receive, send)
+                return
+
+        limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
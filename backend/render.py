@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional
+
+from derivatives import SWEEP_INTERVAL, sweep_directory
+
+logger = logging.getLogger(__name__)
+
+# Bump when the compositing below changes so stale mockups are not reused
+RENDER_VERSION = 1
+
+# Output geometry mirrors the customizer preview, where the product image is
+# cover-cropped into a 400 px tall frame with an 80 px logo box and text
+# pinned 20 px from the corners.
+MOCKUP_SIZE = (1000, 400)
+LOGO_BOX = 80
+TEXT_MARGIN = 20
+PRODUCT_FETCH_TIMEOUT = 15
+
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+
+def logo_position(value) -> Optional[Dict[str, float]]:
+    """A stored logo position as x/y percentages clamped to 0-100.
+
+    Customizations keep whatever the client sent, so anything that isn't a
+    pair of numbers is treated as no position at all.
+    """
+    if not isinstance(value, dict):
+        return None
+    try:
+        x, y = float(value.get("x", 50)), float(value.get("y", 50))
+    except (TypeError, ValueError):
+        return None
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return None
+    return {"x": min(max(x, 0.0), 100.0), "y": min(max(y, 0.0), 100.0)}
+
+
+def render_key(customization: dict, product: dict) -> str:
+    fields = {
+        "version": RENDER_VERSION,
+        "product_id": product["id"],
+        "image_url": product["image_url"],
+        "business_name": customization.get("business_name"),
+        "phone_number": customization.get("phone_number"),
+        "logo_url": customization.get("logo_url"),
+        "logo_position": logo_position(customization.get("logo_position")),
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _product_image(cache_dir: Path, image_url: str) -> Path:
+    path = cache_dir / "products" / hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with urllib.request.urlopen(image_url, timeout=PRODUCT_FETCH_TIMEOUT) as response:
+            data = response.read()
+        partial = path.with_suffix(".%d.part" % os.getpid())
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    return path
+
+
+def _font(size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _draw_label(draw, text: str, font, anchor_xy, corner: str):
+    pad_x, pad_y = 16, 8
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    width, height = right - left + 2 * pad_x, bottom - top + 2 * pad_y
+    x, y = anchor_xy
+    if corner == "bottom-right":
+        x, y = x - width, y - height
+    draw.rounded_rectangle((x, y, x + width, y + height), radius=4, fill=(0, 0, 0, 204))
+    draw.text((x + pad_x - left, y + pad_y - top), text, font=font, fill=(255, 255, 255, 255))
+
+
+def composite_mockup(cache_dir: str, target: str, image_url: str, logo_path: Optional[str],
+                     position: Optional[dict], business_name: str, phone_number: str) -> str:
+    """Composite logo and text onto the product image. Runs in a worker process."""
+    from PIL import Image, ImageDraw, ImageOps
+
+    cache = Path(cache_dir)
+    try:
+        with Image.open(_product_image(cache, image_url)) as product:
+            canvas = ImageOps.fit(product.convert("RGB"), MOCKUP_SIZE, Image.LANCZOS).convert("RGBA")
+    except (OSError, Image.DecompressionBombError) as exc:
+        # The catalog's image, not the customer's logo: a plain OSError
+        raise OSError("product image %s: %s" % (image_url, exc)) from None
+
+    if logo_path:
+        position = position or {"x": 50, "y": 50}
+        cx = int(MOCKUP_SIZE[0] * position["x"] / 100)
+        cy = int(MOCKUP_SIZE[1] * position["y"] / 100)
+        half = LOGO_BOX // 2
+        box = Image.new("RGBA", (LOGO_BOX, LOGO_BOX), (255, 255, 255, 230))
+        with Image.open(logo_path) as logo:
+            logo = logo.convert("RGBA")
+            logo.thumbnail((LOGO_BOX - 8, LOGO_BOX - 8), Image.LANCZOS)
+            box.alpha_composite(logo, ((LOGO_BOX - logo.width) // 2, (LOGO_BOX - logo.height) // 2))
+        canvas.alpha_composite(box, (cx - half, cy - half))
+
+    overlay = Image.new("RGBA", MOCKUP_SIZE, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    if business_name:
+        _draw_label(draw, business_name, _font(22), (TEXT_MARGIN, TEXT_MARGIN), "top-left")
+    if phone_number:
+        _draw_label(draw, phone_number, _font(18), (MOCKUP_SIZE[0] - TEXT_MARGIN, MOCKUP_SIZE[1] - TEXT_MARGIN), "bottom-right")
+    canvas.alpha_composite(overlay)
+
+    partial = target + ".%d.part" % os.getpid()
+    canvas.convert("RGB").save(partial, "PNG", optimize=True)
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+class MockupRenderer:
+    """Renders customization mockups once per distinct design.
+
+    Finished renders are cached on disk by ``render_key``; concurrent requests
+    for a design that is still rendering wait on the same job. The cache is
+    kept under ``max_bytes`` the same way as ``DerivativeCache``; product
+    images, one per catalog image, live in a subdirectory outside the budget.
+    A pool broken by a crashed worker process is replaced for later renders.
+    """
+
+    def __init__(self, cache_dir: Path, workers: Optional[int] = None, max_bytes: int = RENDER_CACHE_BYTES,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.executor = None
+        self.renders = 0
+        self.entries = 0
+        self.total_bytes = 0
+        self.evicted = 0
+        self.restarts = 0
+        self._swept_at = 0.0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def start(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, customization: dict, product: dict, logo_path: Optional[Path]) -> Path:
+        key = render_key(customization, product)
+        target = self.cache_dir / f"{key}.png"
+        try:
+            # Marks it recently used, and fails if another worker evicted it
+            await asyncio.to_thread(os.utime, target)
+        except FileNotFoundError:
+            pass
+        else:
+            return target
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(target, customization, product, logo_path))
+            self.renders += 1
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        await asyncio.shield(pending)
+        return target
+
+    async def _render(self, target: Path, customization: dict, product: dict, logo_path: Optional[Path]):
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            size = await loop.run_in_executor(
+                executor, composite_mockup,
+                str(self.cache_dir), str(target), product["image_url"],
+                str(logo_path) if logo_path else None, logo_position(customization.get("logo_position")),
+                customization.get("business_name") or "", customization.get("phone_number") or "",
+            )
+        except BrokenProcessPool:
+            if self.executor is executor:
+                logger.error("Render pool broke, starting a new one")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                self.restarts += 1
+            raise
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes or time.monotonic() - self._swept_at > self.sweep_interval:
+            await asyncio.to_thread(self.sweep, target)
+
+    def sweep(self, keep: Optional[Path] = None):
+        self._swept_at = time.monotonic()
+        swept = sweep_directory(self.cache_dir, self.max_bytes, keep)
+        if swept is not None:
+            self.entries, self.total_bytes, evicted = swept
+            self.evicted += evicted
+
+    def stats(self) -> dict:
+        # entries and bytes are as of this worker's last sweep
+        return {
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "renders": self.renders,
+            "evicted": self.evicted,
+            "pool_restarts": self.restarts,
+        }
@@ -0,0 +1,88 @@
+import re
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import anyio
+import orjson
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from pagination import json_default
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON encoded by orjson, which handles datetimes natively.
+
+    It is the app's default response class. Routes with large bodies return
+    one directly, which also skips FastAPI's ``jsonable_encoder`` walk over
+    the whole payload; they must then only return plain dicts, lists,
+    scalars and datetimes.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single byte range, or None to send the
+    whole file. Raises ValueError if the range can't be satisfied.
+
+    Multiple ranges and malformed headers are ignored, as RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(0, size - int(last)), size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+async def _read_range(path: Path, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as handle:
+        await handle.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            chunk = await handle.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, path: Path, media_type: str, headers: dict) -> Response:
+    """FileResponse that honours a single-range ``Range`` request.
+
+    ``headers`` should carry the file's ETag: an ``If-Range`` that doesn't
+    match it gets the whole file.
+    """
+    size = path.stat().st_size
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != headers.get("ETag"):
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": "bytes */%d" % size})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    start, end = byte_range
+    return StreamingResponse(_read_range(path, start, end), status_code=206, media_type=media_type, headers={
+        **headers,
+        "Content-Range": "bytes %d-%d/%d" % (start, end, size),
+        "Content-Length": str(end - start + 1),
+    })
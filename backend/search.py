@@ -0,0 +1,409 @@
+import asyncio
+import bisect
+import logging
+import re
+import time
+import unicodedata
+import uuid
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+# Terms shorter than this are only matched exactly or by prefix
+MIN_TYPO_LENGTH = 4
+MIN_PREFIX_LENGTH = 2
+# A short prefix can match thousands of terms; keep the most common ones
+MAX_PREFIX_SCAN = 5000
+MAX_PREFIX_EXPANSIONS = 64
+MAX_QUERY_TOKENS = 8
+# A capped index is rebuilt from the newest documents once it holds this
+# much more than its cap
+REBUILD_SLACK = 1.25
+
+EXACT, PREFIX, TYPO = 3, 2, 1
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return TOKEN_RE.findall(text.lower())
+
+
+def _deletions(term: str) -> List[str]:
+    return [term[:i] + term[i + 1:] for i in range(len(term))]
+
+
+def one_edit_apart(a: str, b: str) -> bool:
+    """True if one insertion, deletion, substitution or adjacent swap turns
+    ``a`` into ``b``."""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return (len(diff) == 2 and diff[1] == diff[0] + 1
+                and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class InvertedIndex:
+    """Append-only inverted index over short text fields.
+
+    Documents get consecutive integer ids in the order they are added, so
+    every posting list is already sorted and a higher id means a newer
+    document. Posting lists are ``array('I')`` (4 bytes per entry) and are
+    read as zero-copy numpy views for unions and intersections.
+
+    Typo tolerance uses single-deletion variants (SymSpell with distance 1):
+    each term is filed under itself and every string one deletion away, so
+    candidates for a query token are a few dictionary lookups.
+    """
+
+    def __init__(self, uuid_keys: bool = False):
+        self.postings: Dict[str, array] = {}
+        self.deletes: Dict[str, List[str]] = {}
+        self.uuid_keys = uuid_keys
+        # uuid keys are stored as 16 raw bytes each; anything else in a list
+        self._keys = bytearray() if uuid_keys else []
+        self._odd_keys: Dict[int, str] = {}
+        self.by_owner: Dict[str, array] = {}
+        self._sorted_terms: List[str] = []
+        self._new_terms: List[str] = []
+        self.size = 0
+
+    def add(self, key: str, texts: Iterable[Optional[str]], owner: Optional[str] = None) -> int:
+        doc = self.size
+        if self.uuid_keys:
+            try:
+                self._keys += uuid.UUID(key).bytes
+            except (ValueError, TypeError, AttributeError):
+                self._keys += bytes(16)
+                self._odd_keys[doc] = key
+        else:
+            self._keys.append(key)
+        if owner is not None:
+            self.by_owner.setdefault(owner, array("I")).append(doc)
+
+        terms = set()
+        for text in texts:
+            terms.update(tokenize(text))
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = array("I")
+                self._new_terms.append(term)
+                if len(term) >= MIN_TYPO_LENGTH - 1:
+                    for variant in (term, *_deletions(term)):
+                        self.deletes.setdefault(variant, []).append(term)
+            postings.append(doc)
+        self.size += 1
+        return doc
+
+    def key(self, doc: int) -> str:
+        if not self.uuid_keys:
+            return self._keys[doc]
+        if doc in self._odd_keys:
+            return self._odd_keys[doc]
+        return str(uuid.UUID(bytes=bytes(self._keys[doc * 16:doc * 16 + 16])))
+
+    def terms(self) -> List[str]:
+        if self._new_terms:
+            # A handful of new terms are inserted; a bulk load is re-sorted once
+            if len(self._new_terms) < 1000:
+                for term in self._new_terms:
+                    bisect.insort(self._sorted_terms, term)
+            else:
+                self._sorted_terms = sorted(self.postings)
+            self._new_terms = []
+        return self._sorted_terms
+
+    def candidates(self, token: str, prefix: bool) -> Dict[str, int]:
+        """Indexed terms that ``token`` may stand for, with their match kind."""
+        found = {}
+        if token in self.postings:
+            found[token] = EXACT
+        if prefix and len(token) >= MIN_PREFIX_LENGTH:
+            terms = self.terms()
+            start = bisect.bisect_left(terms, token)
+            matches = []
+            for term in terms[start:start + MAX_PREFIX_SCAN]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    matches.append(term)
+            if len(matches) > MAX_PREFIX_EXPANSIONS:
+                matches.sort(key=lambda t: len(self.postings[t]), reverse=True)
+                matches = matches[:MAX_PREFIX_EXPANSIONS]
+            for term in matches:
+                found[term] = PREFIX
+        if len(token) >= MIN_TYPO_LENGTH:
+            for variant in (token, *_deletions(token)):
+                for term in self.deletes.get(variant, ()):
+                    if term not in found and one_edit_apart(token, term):
+                        found[term] = TYPO
+        return found
+
+    def _docs(self, terms: List[str]) -> np.ndarray:
+        views = [np.frombuffer(self.postings[t], dtype=np.uint32) for t in terms]
+        if len(views) == 1:
+            return views[0].copy()
+        return np.unique(np.concatenate(views))
+
+    def _contains(self, terms: List[str], docs: np.ndarray) -> np.ndarray:
+        """Mask of ``docs`` (sorted) that appear under any of ``terms``."""
+        if len(docs) * 8 > sum(len(self.postings[t]) for t in terms):
+            return np.isin(docs, self._docs(terms), assume_unique=True)
+        # Few candidates against long posting lists: binary search each one
+        hit = np.zeros(len(docs), dtype=bool)
+        for term in terms:
+            postings = np.frombuffer(self.postings[term], dtype=np.uint32)
+            at = np.minimum(np.searchsorted(postings, docs), len(postings) - 1)
+            hit |= postings[at] == docs
+        return hit
+
+    def search(self, query: str, owner: Optional[str] = None, limit: int = 20) -> Tuple[List[str], int]:
+        """Keys of the best ``limit`` documents matching every query token,
+        and how many matched in total.
+
+        The last token also matches as a prefix (search as you type); tokens
+        of MIN_TYPO_LENGTH or more also match terms one edit away. Exact
+        matches outrank prefix matches, which outrank typo matches; ties go
+        to the newest document.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens or self.size == 0:
+            return [], 0
+        if owner is not None and owner not in self.by_owner:
+            return [], 0
+
+        per_token = []
+        for index, token in enumerate(tokens):
+            found = self.candidates(token, prefix=index == len(tokens) - 1)
+            if not found:
+                return [], 0
+            per_token.append(found)
+        # Start from the smallest set so the rest are cheap membership tests
+        per_token.sort(key=lambda found: sum(len(self.postings[t]) for t in found))
+        if owner is not None:
+            matched = np.frombuffer(self.by_owner[owner], dtype=np.uint32).copy()
+            remaining = per_token
+        else:
+            matched = self._docs(list(per_token[0]))
+            remaining = per_token[1:]
+        for found in remaining:
+            if not len(matched):
+                return [], 0
+            matched = matched[self._contains(list(found), matched)]
+        if not len(matched):
+            return [], 0
+
+        score = np.zeros(len(matched), dtype=np.int64)
+        for found in per_token:
+            kinds = set(found.values())
+            if len(kinds) == 1:
+                # Every match scores the same for this token
+                continue
+            best = np.zeros(len(matched), dtype=np.int64)
+            for kind in sorted(kinds):
+                best[self._contains([t for t, k in found.items() if k == kind], matched)] = kind
+            score += best
+        if not score.any():
+            # Newest first
+            top = np.arange(len(matched) - 1, max(len(matched) - limit, 0) - 1, -1)
+        else:
+            # Best score first, newest first within a score
+            rank = score * (self.size + 1) + matched.astype(np.int64)
+            if len(rank) > limit:
+                top = np.argpartition(-rank, limit)[:limit]
+                top = top[np.argsort(-rank[top])]
+            else:
+                top = np.argsort(-rank)
+        return [self.key(int(matched[i])) for i in top], len(matched)
+
+    def stats(self) -> dict:
+        postings = sum(len(p) for p in self.postings.values())
+        return {
+            "documents": self.size,
+            "terms": len(self.postings),
+            "postings": postings,
+            "approx_bytes": postings * 4 + self.size * 4
+                            + (len(self._keys) if self.uuid_keys else 0),
+        }
+
+
+class _Tail:
+    """Which documents of a collection are indexed, by creation time.
+
+    New documents are read with ``created_at >= watermark - overlap`` so a
+    write that lands late (another worker, the write-behind buffer) is still
+    picked up; ids seen inside the overlap window are skipped.
+    """
+
+    def __init__(self, overlap: timedelta):
+        self.overlap = overlap
+        self.watermark: Optional[datetime] = None
+        self.recent: Dict[str, datetime] = {}
+
+    def since(self) -> Optional[datetime]:
+        return self.watermark - self.overlap if self.watermark else None
+
+    def seen(self, doc: dict) -> bool:
+        if doc["id"] in self.recent:
+            return True
+        created_at = doc["created_at"]
+        if self.watermark is None or created_at > self.watermark:
+            self.watermark = created_at
+        if created_at >= self.watermark - self.overlap:
+            self.recent[doc["id"]] = created_at
+        return False
+
+    def prune(self):
+        if self.watermark:
+            cutoff = self.watermark - self.overlap
+            self.recent = {k: v for k, v in self.recent.items() if v >= cutoff}
+
+
+class SearchService:
+    """Search over products, quotes and customizations for one worker.
+
+    Products are re-indexed from the current catalog snapshot whenever its
+    version changes. Quotes and customizations are loaded from Mongo in the
+    background at startup, then followed by polling for newly created
+    documents every ``refresh_interval`` seconds.
+
+    Every prefork worker holds its own copy, so memory and the startup scan
+    are multiplied by the worker count (about 83 MB and 19 s per million
+    quotes each; ``python -m benchmarks.search``). ``max_documents`` caps
+    each collection's index to its newest documents; older ones are not
+    found by search. Past the cap the index is rebuilt in the background
+    and swapped in.
+    """
+
+    def __init__(self, db, catalog, refresh_interval: float = 2.0, overlap: float = 60.0,
+                 batch_size: int = 500, max_documents: int = 0):
+        self.db = db
+        self.catalog = catalog
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.max_documents = max_documents
+        self.indexed_since: Dict[str, Optional[datetime]] = {"quotes": None, "customizations": None}
+        self.quotes = InvertedIndex(uuid_keys=True)
+        self.customizations = InvertedIndex(uuid_keys=True)
+        self._products = InvertedIndex()
+        self._products_version = None
+        self._tails = {"quotes": _Tail(timedelta(seconds=overlap)),
+                       "customizations": _Tail(timedelta(seconds=overlap))}
+        self.ready = False
+        self.loaded_in: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def products(self) -> InvertedIndex:
+        snapshot = self.catalog.snapshot
+        if snapshot.version != self._products_version:
+            index = InvertedIndex()
+            for product in snapshot.catalog.products:
+                index.add(product["id"], (product["name"], product.get("description"), product["category"]))
+            self._products, self._products_version = index, snapshot.version
+        return self._products
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        started = time.monotonic()
+        while not self.ready:
+            try:
+                await self.catch_up()
+                self.ready = True
+            except PyMongoError:
+                logger.exception("Search index load failed, retrying")
+                await asyncio.sleep(self.refresh_interval)
+        self.loaded_in = time.monotonic() - started
+        logger.info("Search index loaded in %.1fs: %d quotes, %d customizations",
+                    self.loaded_in, self.quotes.size, self.customizations.size)
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.catch_up()
+            except PyMongoError:
+                logger.exception("Search index refresh failed")
+
+    async def catch_up(self):
+        await self._follow("quotes", self.db.quotes, self._quote_texts)
+        await self._follow("customizations", self.db.customizations, self._customization_texts)
+
+    async def _follow(self, name, repository, texts):
+        index, tail = getattr(self, name), self._tails[name]
+        if tail.watermark is None:
+            self.indexed_since[name] = await self._cutoff(repository)
+            await self._load(repository, index, tail, texts, self.indexed_since[name])
+        else:
+            # The overlap must not reach back past the cap's cutoff
+            since, cutoff = tail.since(), self.indexed_since[name]
+            await self._load(repository, index, tail, texts, max(since, cutoff) if cutoff else since)
+        if self.max_documents and index.size > self.max_documents * REBUILD_SLACK:
+            # The index is append-only: drop the oldest documents by building
+            # a fresh one from the newest while the current one keeps serving
+            fresh, fresh_tail = InvertedIndex(uuid_keys=True), _Tail(tail.overlap)
+            since = await self._cutoff(repository)
+            await self._load(repository, fresh, fresh_tail, texts, since)
+            setattr(self, name, fresh)
+            self._tails[name], self.indexed_since[name] = fresh_tail, since
+            logger.info("Rebuilt the %s search index: %d documents since %s", name, fresh.size, since)
+
+    async def _cutoff(self, repository) -> Optional[datetime]:
+        if not self.max_documents:
+            return None
+        return await repository.created_at_of_newest(self.max_documents)
+
+    async def _load(self, repository, index, tail, texts, since):
+        added = 0
+        async for doc in repository.stream_created_since(since):
+            if tail.seen(doc):
+                continue
+            index.add(doc["id"], texts(doc), owner=doc.get("user_email"))
+            added += 1
+            # Yield now and then so a large initial load never stalls requests
+            if added % self.batch_size == 0:
+                await asyncio.sleep(0)
+        tail.prune()
+
+    @staticmethod
+    def _quote_texts(doc):
+        return doc.get("business_name"), doc.get("product_name"), doc.get("message")
+
+    def _customization_texts(self, doc):
+        product = self.catalog.snapshot.catalog.get(doc.get("product_id"))
+        return doc.get("business_name"), product["name"] if product else None
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "loaded_in_s": round(self.loaded_in, 2) if self.loaded_in is not None else None,
+            "max_documents": self.max_documents or None,
+            "products": self.products.stats(),
+            "quotes": {**self.quotes.stats(), "indexed_since": self.indexed_since["quotes"]},
+            "customizations": {**self.customizations.stats(),
+                               "indexed_since": self.indexed_since["customizations"]},
+        }
@@ -1,45 +1,195 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr
-from pymongo import MongoClient
-from bson import ObjectId
-import bcrypt
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+from PIL import Image, UnidentifiedImageError
 import jwt
 import os
 import uuid
-import shutil
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional, List
-import json
+from typing import Optional, List, Literal
+from contextlib import asynccontextmanager
+from concurrent.futures.process import BrokenProcessPool
+import logging
 
-app = FastAPI(title="Fireworks Advertising API")
+from database import Database
+from cache import TTLCache, SharedCache
+from passwords import PasswordHasher, PasswordPoolSaturated
+from catalog import Catalog, CatalogConflict, CatalogSnapshot, LiveCatalog, encoded_response
+from uploads import receive_upload
+from storage import BlobStore, store_upload, file_url_for, file_id_from_url, parse_file_id
+from derivatives import DerivativeCache, MEDIA_TYPES, RASTER_EXTENSIONS, snap_width
+from render import MockupRenderer, render_key
+from documents import DocumentError, QuoteDocuments, document_data, document_key
+from write_behind import WriteBehindBuffer, WriteBufferFull
+from metrics import (
+    MetricsMiddleware, MongoCommandMetrics, LoopLagMonitor, UPLOAD_BYTES, UPLOAD_SECONDS, render_metrics,
+)
+from ratelimit import RateLimiter, RateLimitMiddleware
+from compression import CompressionMiddleware
+from search import SearchService
+from jobs import QUEUES, jobs_for_new_quotes
+from pricing import MAX_QUANTITY, PricingError, price_list_for
+from responses import FastJSONResponse, ranged_file_response
+from prefork import pool_size
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, ndjson_line
+
+logger = logging.getLogger(__name__)
+
+# MongoDB connection
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "fireworks_advertising")
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "5"))
+SEARCH_REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "2"))
+# Newest quotes (and customizations) each worker indexes for search; 0 = all.
+# Roughly 83 MB and 19 s of startup scan per million, per worker.
+SEARCH_MAX_DOCUMENTS = int(os.getenv("SEARCH_MAX_DOCUMENTS", "500000"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The load benchmark installs an in-memory stand-in before startup
+    if getattr(app.state, "db", None) is None:
+        app.state.db = Database.connect(MONGO_URL, DB_NAME, event_listeners=[MongoCommandMetrics()])
+    await app.state.db.ensure_indexes()
+    app.state.cache = SharedCache.from_env()
+    await app.state.cache.start()
+    app.state.db.use_cache(app.state.cache)
+    app.state.catalog = LiveCatalog(app.state.db.catalog, PRODUCTS, app.state.cache, CATALOG_POLL_INTERVAL)
+    await app.state.catalog.start()
+    app.state.search = SearchService(app.state.db, app.state.catalog, SEARCH_REFRESH_INTERVAL,
+                                     max_documents=SEARCH_MAX_DOCUMENTS)
+    app.state.search.start()
+    app.state.passwords = PasswordHasher.from_env()
+    app.state.derivatives = DerivativeCache(DERIVATIVE_CACHE_DIR, workers=pool_size())
+    app.state.derivatives.start()
+    app.state.renderer = MockupRenderer(RENDER_CACHE_DIR, workers=pool_size())
+    app.state.renderer.start()
+    app.state.documents = QuoteDocuments(DOCUMENT_CACHE_DIR, workers=pool_size())
+    app.state.documents.start()
+    app.state.loop_lag = LoopLagMonitor()
+    app.state.loop_lag.start()
+    app.state.rate_limiter = RateLimiter.from_env(account_for=token_email, loop_lag=app.state.loop_lag)
+    app.state.write_behind = None
+    if WRITE_BEHIND:
+        app.state.write_behind = WriteBehindBuffer.from_env(app.state.db.db, WRITE_BEHIND_DIR)
+        await app.state.write_behind.start()
+        app.state.db.enable_write_behind(app.state.write_behind)
+    try:
+        yield
+    finally:
+        if app.state.write_behind:
+            await app.state.write_behind.close()
+        await app.state.loop_lag.stop()
+        app.state.renderer.shutdown()
+        app.state.documents.shutdown()
+        app.state.derivatives.shutdown()
+        app.state.passwords.shutdown()
+        await app.state.search.close()
+        await app.state.catalog.close()
+        await app.state.cache.close()
+        app.state.db.close()
+
+def get_db(request: Request) -> Database:
+    return request.app.state.db
+
+def get_passwords(request: Request) -> PasswordHasher:
+    return request.app.state.passwords
+
+def get_derivatives(request: Request) -> DerivativeCache:
+    return request.app.state.derivatives
+
+def get_renderer(request: Request) -> MockupRenderer:
+    return request.app.state.renderer
+
+def get_documents(request: Request) -> QuoteDocuments:
+    return request.app.state.documents
+
+def get_search(request: Request) -> SearchService:
+    return request.app.state.search
+
+def get_catalog(request: Request) -> CatalogSnapshot:
+    # One snapshot per request, even if a newer version is swapped in meanwhile
+    return request.app.state.catalog.snapshot
+
+app = FastAPI(title="Fireworks Advertising API", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# bcrypt pool is full: shed the request instead of queueing behind the burst
+@app.exception_handler(PasswordPoolSaturated)
+async def password_pool_saturated_handler(request: Request, exc: PasswordPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(WriteBufferFull)
+async def write_buffer_full_handler(request: Request, exc: WriteBufferFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(CatalogConflict)
+async def catalog_conflict_handler(request: Request, exc: CatalogConflict):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
 
-# CORS middleware
+# Per-IP/per-account budgets on login, register and upload; sheds load
+# while the event loop is lagging
+app.add_middleware(RateLimitMiddleware)
+
+# CORS middleware; wraps the limiter so its 429/503 are readable cross-origin
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
-# MongoDB connection
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URL)
-db = client.fireworks_advertising
+# gzip/brotli for JSON and NDJSON; pre-encoded catalog bodies pass through
+app.add_middleware(CompressionMiddleware.from_env)
+
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # JWT configuration
 JWT_SECRET = "fireworks_secret_key_2025"
 JWT_ALGORITHM = "HS256"
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Tokens whose signature and expiry were already checked, so repeat requests
+# skip the decode
+verified_tokens = TTLCache(
+    int(os.getenv("TOKEN_CACHE_SIZE", "10000")), float(os.getenv("TOKEN_CACHE_TTL", "300"))
+)
+
+# Staff accounts allowed to see every customer's designs and quotes
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 # File upload configuration
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "/app/uploads"))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+blobs = BlobStore(UPLOAD_DIR)
+DERIVATIVE_CACHE_DIR = Path(os.getenv("DERIVATIVE_CACHE_DIR", str(UPLOAD_DIR / ".derivatives")))
+RENDER_CACHE_DIR = Path(os.getenv("RENDER_CACHE_DIR", str(UPLOAD_DIR / ".renders")))
+DOCUMENT_CACHE_DIR = Path(os.getenv("DOCUMENT_CACHE_DIR", str(UPLOAD_DIR / ".documents")))
+WRITE_BEHIND_DIR = UPLOAD_DIR / ".journal"
+# Blob URLs are content addressed, so their bytes can never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 # Pydantic models
+MAX_STATS_DAYS = 366
+MAX_ESTIMATE_LINES = int(os.getenv("MAX_ESTIMATE_LINES", "10000"))
+MAX_QUOTE_BATCH_LINES = int(os.getenv("MAX_QUOTE_BATCH_LINES", "500"))
+
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
@@ -51,6 +201,13 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+class ProfileUpdate(BaseModel):
+    business_name: Optional[str] = None
+    phone: Optional[str] = None
+
+class WholesaleApproval(BaseModel):
+    approved: bool
+
 class CustomizationData(BaseModel):
     product_id: str
     business_name: str
@@ -63,10 +220,46 @@ class QuoteRequest(BaseModel):
     business_name: str
     product_name: str
     customization_data: dict
-    quantity: int
+    quantity: int = Field(gt=0, le=MAX_QUANTITY)
+    message: Optional[str] = None
+
+class QuoteStatusUpdate(BaseModel):
+    status: Literal["pending", "contacted", "quoted", "accepted", "declined"]
+
+class QuoteLine(BaseModel):
+    product_id: str
+    size: Optional[str] = None
+    quantity: int = Field(gt=0, le=MAX_QUANTITY)
+    customization_data: dict = {}
     message: Optional[str] = None
 
-# Products data
+class ProductData(BaseModel):
+    name: str = Field(min_length=1)
+    category: str = Field(min_length=1)
+    description: str = ""
+    base_price: float = Field(gt=0)
+    wholesale_price: float = Field(gt=0)
+    image_url: str
+    customizable: bool = False
+    sizes: List[str] = Field(min_length=1)
+
+class PriceLine(BaseModel):
+    product_id: str
+    size: Optional[str] = None
+    quantity: int = Field(gt=0, le=MAX_QUANTITY)
+
+class PricingEstimateRequest(BaseModel):
+    lines: List[PriceLine] = Field(min_length=1, max_length=MAX_ESTIMATE_LINES)
+
+class QuoteBatchRequest(BaseModel):
+    user_email: str
+    business_name: str
+    # Validated line by line in the route so every bad line is reported
+    lines: List[dict] = Field(min_length=1, max_length=MAX_QUOTE_BATCH_LINES)
+    message: Optional[str] = None
+
+# Seed for an empty catalog_versions collection; after that the catalog is
+# edited through /api/admin/products or tools/publish_catalog.py
 PRODUCTS = [
     {
         "id": "feather-flag-1",
@@ -144,30 +337,94 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        email = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
+def token_email(token: str) -> Optional[str]:
+    email = verified_tokens.get(token)
+    if email is not None:
         return email
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.PyJWTError:
+        return None
+    email = payload.get("sub")
+    if email is not None:
+        # Never trust a cached signature past the token's own expiry
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        verified_tokens.set(token, email, ttl=expires_in)
+    return email
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    email = token_email(credentials.credentials)
+    if email is None:
         raise HTTPException(status_code=401, detail="Invalid token")
+    return email
+
+async def optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    # Anonymous callers are fine; a bad token is still an error
+    return await verify_token(credentials) if credentials else None
+
+async def require_admin(current_user_email: str = Depends(verify_token)):
+    if not is_admin(current_user_email):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user_email
+
+def is_admin(email: str) -> bool:
+    return email.lower() in ADMIN_EMAILS
+
+def page_after(after: Optional[str] = None):
+    if after is None:
+        return None
+    try:
+        return decode_cursor(after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+    return stream or "application/x-ndjson" in request.headers.get("accept", "")
+
+async def ndjson_stream(docs):
+    async for doc in docs:
+        yield ndjson_line(doc)
 
 # API Routes
 @app.get("/api/health")
-async def health_check():
-    return {"status": "healthy", "service": "Fireworks Advertising API"}
+async def health_check(
+    request: Request,
+    db: Database = Depends(get_db),
+    passwords: PasswordHasher = Depends(get_passwords),
+    derivatives: DerivativeCache = Depends(get_derivatives)
+):
+    return {
+        "status": "healthy",
+        "service": "Fireworks Advertising API",
+        "password_pool": passwords.stats(),
+        "user_cache": db.users.profiles.stats(),
+        "shared_cache": request.app.state.cache.stats() if getattr(request.app.state, "cache", None) else None,
+        "token_cache": verified_tokens.stats(),
+        "catalog": request.app.state.catalog.stats() if getattr(request.app.state, "catalog", None) else None,
+        "search": request.app.state.search.stats() if getattr(request.app.state, "search", None) else None,
+        "rate_limiter": request.app.state.rate_limiter.stats() if getattr(request.app.state, "rate_limiter", None) else None,
+        "derivative_cache": derivatives.stats(),
+        "render_cache": request.app.state.renderer.stats() if getattr(request.app.state, "renderer", None) else None,
+        "write_behind": request.app.state.write_behind.stats() if getattr(request.app.state, "write_behind", None) else None
+    }
+
+@app.get("/api/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.post("/api/auth/register")
-async def register_user(user: UserRegister):
+async def register_user(
+    user: UserRegister,
+    db: Database = Depends(get_db),
+    passwords: PasswordHasher = Depends(get_passwords)
+):
     # Check if user already exists
-    existing_user = db.users.find_one({"email": user.email})
-    if existing_user:
+    if await db.users.exists(user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = await passwords.hash(user.password)
     
     # Create user document
     user_doc = {
@@ -182,7 +439,7 @@ async def register_user(user: UserRegister):
         "updated_at": datetime.utcnow()
     }
     
-    result = db.users.insert_one(user_doc)
+    await db.users.create(user_doc)
     
     # Create access token
     access_token = create_access_token(data={"sub": user.email})
@@ -190,24 +447,22 @@ async def register_user(user: UserRegister):
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": {
-            "id": user_doc["id"],
-            "email": user.email,
-            "business_name": user.business_name,
-            "account_type": user.account_type,
-            "wholesale_approved": user_doc["wholesale_approved"]
-        }
+        "user": db.users.public_profile(user_doc)
     }
 
 @app.post("/api/auth/login")
-async def login_user(user: UserLogin):
+async def login_user(
+    user: UserLogin,
+    db: Database = Depends(get_db),
+    passwords: PasswordHasher = Depends(get_passwords)
+):
     # Find user
-    db_user = db.users.find_one({"email": user.email})
+    db_user = await db.users.get_credentials(user.email)
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Check password
-    if not bcrypt.checkpw(user.password.encode('utf-8'), db_user["password"]):
+    if not await passwords.verify(user.password, db_user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Create access token
@@ -216,71 +471,198 @@ async def login_user(user: UserLogin):
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": {
-            "id": db_user["id"],
-            "email": db_user["email"],
-            "business_name": db_user["business_name"],
-            "account_type": db_user["account_type"],
-            "wholesale_approved": db_user["wholesale_approved"]
-        }
+        "user": await db.users.cache_profile(db_user)
     }
 
 @app.get("/api/auth/me")
-async def get_current_user(current_user_email: str = Depends(verify_token)):
-    user = db.users.find_one({"email": current_user_email})
+async def get_current_user(
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db)
+):
+    user = await db.users.get_profile(current_user_email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {
-        "id": user["id"],
-        "email": user["email"],
-        "business_name": user["business_name"],
-        "account_type": user["account_type"],
-        "wholesale_approved": user["wholesale_approved"]
-    }
+    return user
+
+@app.put("/api/auth/me")
+async def update_current_user(
+    update: ProfileUpdate,
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db)
+):
+    fields = update.model_dump(exclude_none=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    
+    user = await db.users.update(current_user_email, fields)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return user
+
+@app.post("/api/admin/users/{email}/wholesale-approval")
+async def set_wholesale_approval(
+    email: str,
+    approval: WholesaleApproval,
+    admin_email: str = Depends(require_admin),
+    db: Database = Depends(get_db)
+):
+    user = await db.users.update(email, {"wholesale_approved": approval.approved})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return user
 
 @app.get("/api/products")
-async def get_products():
-    return {"products": PRODUCTS}
+async def get_products(
+    request: Request,
+    category: Optional[str] = None,
+    customizable: Optional[bool] = None,
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    return encoded_response(request, snapshot.catalog.list_body(category, customizable))
 
 @app.get("/api/products/{product_id}")
-async def get_product(product_id: str):
-    product = next((p for p in PRODUCTS if p["id"] == product_id), None)
-    if not product:
+async def get_product(product_id: str, request: Request, snapshot: CatalogSnapshot = Depends(get_catalog)):
+    encoded = snapshot.catalog.product_body(product_id)
+    if not encoded:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return encoded_response(request, encoded)
+
+SEARCH_TYPES = ("products", "quotes", "customizations")
+
+@app.get("/api/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=200),
+    doc_type: Optional[List[str]] = Query(None, alias="type"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user_email: Optional[str] = Depends(optional_user),
+    search: SearchService = Depends(get_search),
+    snapshot: CatalogSnapshot = Depends(get_catalog),
+    db: Database = Depends(get_db)
+):
+    types = doc_type or list(SEARCH_TYPES)
+    unknown = [t for t in types if t not in SEARCH_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail="Unknown search type: %s" % ", ".join(unknown))
+    # Everyone searches products; signed-in users their own quotes and
+    # customizations; admins everyone's
+    owner = None if current_user_email and is_admin(current_user_email) else current_user_email
+
+    result = {"query": q, "complete": search.ready}
+    if "products" in types:
+        ids, total = search.products.search(q, limit=limit)
+        result["products"] = {"total": total, "results": [snapshot.catalog.get(i) for i in ids]}
+    for name in ("quotes", "customizations"):
+        if name not in types or current_user_email is None:
+            continue
+        ids, total = getattr(search, name).search(q, owner=owner, limit=limit)
+        docs = await getattr(db, name).get_many(ids, owner) if ids else []
+        result[name] = {"total": total, "results": docs}
+    return FastJSONResponse(result)
+
+@app.get("/api/admin/catalog")
+async def get_catalog_version(
+    admin_email: str = Depends(require_admin),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    return {"version": snapshot.version, "products": snapshot.catalog.products}
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    # Validate file type
-    allowed_extensions = {".jpg", ".jpeg", ".png", ".pdf", ".ai"}
-    file_extension = Path(file.filename).suffix.lower()
+@app.put("/api/admin/products/{product_id}")
+async def put_product(product_id: str, product: ProductData, request: Request, admin_email: str = Depends(require_admin)):
+    # Publishes a new catalog version; every worker swaps to it within seconds
+    fields = {"id": product_id, **product.model_dump()}
     
-    if file_extension not in allowed_extensions:
-        raise HTTPException(status_code=400, detail="File type not allowed. Please upload JPG, PNG, PDF, or AI files.")
+    def change(products):
+        replaced = [fields if p["id"] == product_id else p for p in products]
+        return replaced if any(p["id"] == product_id for p in products) else [*products, fields]
     
-    # Generate unique filename
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
+    snapshot = await request.app.state.catalog.update(change)
+    return {"version": snapshot.version, "product": snapshot.catalog.get(product_id)}
+
+@app.delete("/api/admin/products/{product_id}")
+async def delete_product(product_id: str, request: Request, admin_email: str = Depends(require_admin)):
+    if not get_catalog(request).catalog.get(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    snapshot = await request.app.state.catalog.update(
+        lambda products: [p for p in products if p["id"] != product_id]
+    )
+    return {"version": snapshot.version}
+
+# The multipart body is parsed by uploads.receive_upload as it streams in,
+# so the form is documented here rather than through an UploadFile parameter.
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+@app.post("/api/upload", openapi_extra=UPLOAD_FORM_SCHEMA)
+async def upload_file(
+    request: Request,
+    db: Database = Depends(get_db),
+    derivatives: DerivativeCache = Depends(get_derivatives)
+):
+    started = time.perf_counter()
+    stored = await receive_upload(request, UPLOAD_DIR)
+    UPLOAD_SECONDS.observe(time.perf_counter() - started)
+    UPLOAD_BYTES.observe(stored.size)
     
-    # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Identical bytes are stored once; re-uploads get the existing URL
+    record, created = await store_upload(db, blobs, stored)
+    if created:
+        derivatives.warm(blobs.path_for(record["file_id"]), record["file_id"])
     
     # Return file URL (in production, this would be a proper URL)
-    file_url = f"/uploads/{unique_filename}"
+    file_url = file_url_for(record["file_id"])
     
     return {
-        "filename": unique_filename,
-        "original_filename": file.filename,
+        "filename": record["file_id"],
+        "original_filename": stored.original_filename,
         "file_url": file_url,
-        "file_size": file_path.stat().st_size
+        "file_size": record["size"],
+        "sha256": stored.sha256,
+        "deduplicated": not created
     }
 
+@app.get("/uploads/{file_id}")
+async def get_upload(
+    file_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096),
+    derivatives: DerivativeCache = Depends(get_derivatives)
+):
+    source = blobs.resolve(file_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="File not found")
+    # Content-addressed blobs never change; legacy uuid-named files might
+    cache_control = IMMUTABLE_CACHE_CONTROL if parse_file_id(file_id) else "public, max-age=86400"
+    
+    if w and source.suffix.lower() in RASTER_EXTENSIONS:
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "png"
+        try:
+            rendition = await derivatives.get(source, file_id, snap_width(w), fmt)
+        except Exception:
+            logger.exception("Could not render %s at w=%s, serving original", file_id, w)
+        else:
+            return FileResponse(
+                rendition,
+                media_type=MEDIA_TYPES[fmt],
+                headers={"Cache-Control": cache_control, "Vary": "Accept"}
+            )
+    return FileResponse(source, headers={"Cache-Control": cache_control})
+
 @app.post("/api/customizations")
 async def save_customization(
     customization: CustomizationData,
-    current_user_email: str = Depends(verify_token)
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db)
 ):
     customization_doc = {
         "id": str(uuid.uuid4()),
@@ -294,7 +676,11 @@ async def save_customization(
         "updated_at": datetime.utcnow()
     }
     
-    result = db.customizations.insert_one(customization_doc)
+    await db.customizations.create(customization_doc)
+    
+    logo_file_id = file_id_from_url(customization.logo_url)
+    if logo_file_id:
+        await db.uploads.add_reference(parse_file_id(logo_file_id)[0])
     
     return {
         "id": customization_doc["id"],
@@ -302,45 +688,364 @@ async def save_customization(
     }
 
 @app.get("/api/customizations")
-async def get_user_customizations(current_user_email: str = Depends(verify_token)):
-    customizations = list(db.customizations.find({"user_email": current_user_email}))
+async def get_user_customizations(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after=Depends(page_after),
+    stream: bool = False,
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db)
+):
+    if wants_ndjson(request, stream):
+        docs = db.customizations.stream_for_user(current_user_email, after)
+        return StreamingResponse(ndjson_stream(docs), media_type="application/x-ndjson")
     
-    # Convert ObjectId to string and remove _id
-    for customization in customizations:
-        customization.pop("_id", None)
+    customizations, next_cursor = await db.customizations.list_for_user(current_user_email, limit, after)
+    return FastJSONResponse({"customizations": customizations, "next_cursor": next_cursor})
+
+@app.get("/api/customizations/{customization_id}/render")
+async def render_customization(
+    customization_id: str,
+    request: Request,
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db),
+    renderer: MockupRenderer = Depends(get_renderer),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    customization = await db.customizations.get(customization_id)
+    if not customization or (
+        customization["user_email"] != current_user_email and not is_admin(current_user_email)
+    ):
+        raise HTTPException(status_code=404, detail="Customization not found")
+    product = snapshot.catalog.get(customization["product_id"])
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    # Identical designs share a render, so the design hash is a strong ETag
+    etag = '"%s"' % render_key(customization, product)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
     
-    return {"customizations": customizations}
+    logo_path = blobs.resolve_url(customization.get("logo_url"))
+    if logo_path and logo_path.suffix.lower() not in RASTER_EXTENSIONS:
+        logo_path = None
+    
+    try:
+        mockup = await renderer.render(customization, product, logo_path)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        # Product image failures arrive as plain OSError; these are the logo's
+        logger.warning("Customization %s has an unusable logo: %s", customization_id, exc)
+        raise HTTPException(status_code=422, detail="Logo image could not be processed")
+    except BrokenProcessPool:
+        logger.exception("Rendering customization %s failed", customization_id)
+        raise HTTPException(status_code=503, detail="Renderer restarting, please retry shortly",
+                            headers={"Retry-After": "1"})
+    except OSError:
+        logger.exception("Rendering customization %s failed", customization_id)
+        raise HTTPException(status_code=502, detail="Product image unavailable")
+    return FileResponse(mockup, media_type="image/png", headers=headers)
 
 @app.post("/api/quotes")
-async def request_quote(quote: QuoteRequest):
+async def request_quote(
+    quote: QuoteRequest,
+    db: Database = Depends(get_db),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    profile = await db.users.get_profile(quote.user_email)
+    catalog = snapshot.catalog
+    product = catalog.get(customization_text(quote.customization_data, "product_id")) or catalog.by_name.get(quote.product_name)
     quote_doc = {
         "id": str(uuid.uuid4()),
         "user_email": quote.user_email,
         "business_name": quote.business_name,
+        "product_id": product["id"] if product else None,
         "product_name": quote.product_name,
         "customization_data": quote.customization_data,
         "quantity": quote.quantity,
         "message": quote.message,
+        "account_type": account_type_for(profile),
         "status": "pending",
         "created_at": datetime.utcnow()
     }
     
-    result = db.quotes.insert_one(quote_doc)
+    # Staff see an estimate up front; unknown products stay unpriced
+    price_list = price_list_for(profile)
+    try:
+        estimate = snapshot.pricing.estimate([{
+            # The product already resolved above, not a possibly stale raw id
+            "product_id": quote_doc["product_id"],
+            "product_name": quote.product_name,
+            "size": customization_text(quote.customization_data, "size"),
+            "quantity": quote.quantity,
+        }], price_list)
+    except PricingError:
+        estimate = None
+    if estimate:
+        quote_doc.update({
+            "price_list": price_list,
+            "unit_price": estimate["lines"][0]["unit_price"],
+            "estimated_total": estimate["subtotal"],
+        })
+    
+    await db.quotes.create(quote_doc)
+    await enqueue_quote_jobs(db, [quote_doc])
     
     return {
         "id": quote_doc["id"],
         "message": "Quote request submitted successfully. We'll contact you within 24 hours."
     }
 
-@app.get("/api/quotes")
-async def get_user_quotes(current_user_email: str = Depends(verify_token)):
-    quotes = list(db.quotes.find({"user_email": current_user_email}))
+@app.post("/api/pricing/estimate")
+async def estimate_price(
+    estimate_request: PricingEstimateRequest,
+    current_user_email: Optional[str] = Depends(optional_user),
+    db: Database = Depends(get_db),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    profile = await db.users.get_profile(current_user_email) if current_user_email else None
+    try:
+        estimate = snapshot.pricing.estimate([line.model_dump() for line in estimate_request.lines], price_list_for(profile))
+    except PricingError as exc:
+        raise HTTPException(status_code=422, detail={"message": "Some lines cannot be priced", "lines": exc.lines})
+    return FastJSONResponse(estimate)
+
+def customization_text(customization_data: dict, field: str) -> Optional[str]:
+    # customization_data is free-form JSON; only strings can name products and sizes
+    value = customization_data.get(field)
+    return value if isinstance(value, str) else None
+
+async def enqueue_quote_jobs(db: Database, quote_docs: List[dict]):
+    # Notifying staff and checking logos happen in the job runner. The quotes
+    # are saved, so a failure here is logged rather than failing the request
+    try:
+        await db.jobs.enqueue_many(jobs_for_new_quotes(quote_docs))
+    except (PyMongoError, WriteBufferFull):
+        logger.exception("Could not enqueue follow-up jobs for quote %s", quote_docs[0]["id"])
+
+def account_type_for(profile: Optional[dict]) -> str:
+    # Quotes can be requested for addresses without an account
+    return profile["account_type"] if profile else "guest"
+
+def validate_quote_line(raw: dict, catalog: Catalog):
+    try:
+        line = QuoteLine.model_validate(raw)
+    except ValidationError as exc:
+        return None, [
+            {"field": ".".join(str(p) for p in err["loc"]), "detail": err["msg"]}
+            for err in exc.errors(include_url=False)
+        ]
+    product = catalog.get(line.product_id)
+    if not product:
+        return None, [{"field": "product_id", "detail": "Product not found"}]
+    if line.size is not None and line.size not in product["sizes"]:
+        return None, [{"field": "size", "detail": "Size not offered for this product"}]
+    return (line, product), []
+
+@app.post("/api/quotes/batch")
+async def request_quote_batch(
+    batch: QuoteBatchRequest,
+    db: Database = Depends(get_db),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    # Validate every line before writing anything
+    validated, errors = [], []
+    for index, raw in enumerate(batch.lines):
+        result, line_errors = validate_quote_line(raw, snapshot.catalog)
+        if line_errors:
+            errors.append({"line": index, "errors": line_errors})
+        else:
+            validated.append(result)
+    if errors:
+        raise HTTPException(status_code=422, detail={"message": "Some quote lines are invalid", "lines": errors})
+    
+    profile = await db.users.get_profile(batch.user_email)
+    price_list = price_list_for(profile)
+    estimate = snapshot.pricing.estimate(
+        [{"product_id": product["id"], "size": line.size, "quantity": line.quantity} for line, product in validated],
+        price_list
+    )
+    
+    parent_quote_id = str(uuid.uuid4())
+    created_at = datetime.utcnow()
+    quote_docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "parent_quote_id": parent_quote_id,
+            "line": index,
+            "user_email": batch.user_email,
+            "business_name": batch.business_name,
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "size": line.size,
+            "customization_data": line.customization_data,
+            "quantity": line.quantity,
+            "message": line.message or batch.message,
+            "account_type": account_type_for(profile),
+            "price_list": price_list,
+            "unit_price": priced["unit_price"],
+            "estimated_total": priced["line_total"],
+            "status": "pending",
+            "created_at": created_at
+        }
+        for index, ((line, product), priced) in enumerate(zip(validated, estimate["lines"]))
+    ]
+    
+    try:
+        await db.quotes.create_many(quote_docs)
+    except BulkWriteError as exc:
+        # Ordered insert: everything before the first failure was written
+        details = exc.details
+        raise HTTPException(status_code=409, detail={
+            "message": "Quote batch was only partially saved",
+            "parent_quote_id": parent_quote_id,
+            "inserted": details.get("nInserted", 0),
+            "lines": [{"line": err["index"], "errors": [{"detail": err["errmsg"]}]} for err in details.get("writeErrors", [])]
+        })
+    await enqueue_quote_jobs(db, quote_docs)
+    
+    return {
+        "id": parent_quote_id,
+        "line_ids": [doc["id"] for doc in quote_docs],
+        "estimated_total": estimate["subtotal"],
+        "message": "Quote request submitted successfully. We'll contact you within 24 hours."
+    }
+
+@app.get("/api/admin/stats")
+async def get_quote_stats(
+    days: int = Query(30, ge=1, le=MAX_STATS_DAYS),
+    until: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    admin_email: str = Depends(require_admin),
+    db: Database = Depends(get_db),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    # Reads rollups only: cost depends on the date range, not on how many quotes exist
+    last_day = datetime.strptime(until, "%Y-%m-%d") if until else datetime.utcnow()
+    first_day = last_day - timedelta(days=days - 1)
+    rollups = await db.quote_rollups.in_range(first_day.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d"))
+    
+    def bucket(groups, key, rollup, **labels):
+        entry = groups.setdefault(key, {**labels, "quotes": 0, "quantity": 0, "estimated_total": 0.0})
+        entry["quotes"] += rollup["quotes"]
+        entry["quantity"] += rollup["quantity"]
+        entry["estimated_total"] += rollup["estimated_total"]
     
-    # Convert ObjectId to string and remove _id
-    for quote in quotes:
-        quote.pop("_id", None)
+    totals, by_day, by_product, by_category, by_account_type = {}, {}, {}, {}, {}
+    for rollup in rollups:
+        product = snapshot.catalog.get(rollup["product_id"])
+        category = product["category"] if product else "Other"
+        bucket(totals, "all", rollup)
+        bucket(by_day, rollup["day"], rollup, day=rollup["day"])
+        bucket(by_product, rollup["product_id"], rollup, product_id=rollup["product_id"],
+               product_name=product["name"] if product else rollup.get("product_name"), category=category)
+        bucket(by_category, category, rollup, category=category)
+        bucket(by_account_type, rollup["account_type"], rollup, account_type=rollup["account_type"])
+    
+    def ranked(groups):
+        for entry in groups.values():
+            entry["estimated_total"] = round(entry["estimated_total"], 2)
+        return sorted(groups.values(), key=lambda e: e["quotes"], reverse=True)
+    
+    return FastJSONResponse({
+        "from": first_day.strftime("%Y-%m-%d"),
+        "until": last_day.strftime("%Y-%m-%d"),
+        "totals": ranked(totals)[0] if totals else {"quotes": 0, "quantity": 0, "estimated_total": 0.0},
+        "by_day": sorted(ranked(by_day), key=lambda e: e["day"]),
+        "by_product": ranked(by_product),
+        "by_category": ranked(by_category),
+        "by_account_type": ranked(by_account_type)
+    })
+
+@app.get("/api/admin/jobs")
+async def get_job_queues(
+    queue: Optional[str] = None,
+    admin_email: str = Depends(require_admin),
+    db: Database = Depends(get_db)
+):
+    if queue is not None and queue not in QUEUES:
+        raise HTTPException(status_code=404, detail="Unknown queue")
+    return FastJSONResponse({
+        "queues": {name: await db.jobs.queue_stats(name) for name in QUEUES if queue in (None, name)},
+        "failed": await db.jobs.list_failed(queue),
+    })
+
+@app.post("/api/admin/jobs/{job_id}/retry")
+async def retry_job(
+    job_id: str,
+    admin_email: str = Depends(require_admin),
+    db: Database = Depends(get_db)
+):
+    if not await db.jobs.requeue_failed(job_id):
+        raise HTTPException(status_code=404, detail="No failed job with that id")
+    return {"id": job_id, "status": "queued"}
+
+@app.put("/api/admin/quotes/{quote_id}/status")
+async def update_quote_status(
+    quote_id: str,
+    update: QuoteStatusUpdate,
+    admin_email: str = Depends(require_admin),
+    db: Database = Depends(get_db),
+    documents: QuoteDocuments = Depends(get_documents)
+):
+    before = await db.quotes.set_status(quote_id, update.status)
+    if before is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    if before["status"] != update.status:
+        # Its PDF, and the whole request's for a batch line, show the status
+        await documents.invalidate(*filter(None, (quote_id, before.get("parent_quote_id"))))
+    return {"id": quote_id, "status": update.status}
+
+@app.get("/api/quotes/{quote_id}/pdf")
+async def get_quote_pdf(
+    quote_id: str,
+    request: Request,
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db),
+    documents: QuoteDocuments = Depends(get_documents),
+    snapshot: CatalogSnapshot = Depends(get_catalog)
+):
+    # A batch request's id covers all of its lines
+    quote = await db.quotes.get(quote_id)
+    quotes = [quote] if quote else await db.quotes.lines_for_request(quote_id)
+    if not quotes or (quotes[0]["user_email"] != current_user_email and not is_admin(current_user_email)):
+        raise HTTPException(status_code=404, detail="Quote not found")
+    
+    products = {q["product_id"]: snapshot.catalog.get(q["product_id"]) for q in quotes if q.get("product_id")}
+    data = document_data(quote_id, quotes, {k: v for k, v in products.items() if v})
+    etag = '"%s"' % document_key(data)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": 'inline; filename="quote-%s.pdf"' % data["number"],
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    logo_path = blobs.resolve_url(data["logo_url"])
+    if logo_path and logo_path.suffix.lower() not in RASTER_EXTENSIONS:
+        logo_path = None
+    try:
+        pdf = await documents.get(data, logo_path)
+        return ranged_file_response(request, pdf, "application/pdf", headers)
+    except (OSError, DocumentError):
+        logger.exception("Generating the PDF for quote %s failed", quote_id)
+        raise HTTPException(status_code=503, detail="Quote document unavailable, try again")
+
+@app.get("/api/quotes")
+async def get_user_quotes(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after=Depends(page_after),
+    stream: bool = False,
+    current_user_email: str = Depends(verify_token),
+    db: Database = Depends(get_db)
+):
+    if wants_ndjson(request, stream):
+        docs = db.quotes.stream_for_user(current_user_email, after)
+        return StreamingResponse(ndjson_stream(docs), media_type="application/x-ndjson")
     
-    return {"quotes": quotes}
+    quotes, next_cursor = await db.quotes.list_for_user(current_user_email, limit, after)
+    return FastJSONResponse({"quotes": quotes, "next_cursor": next_cursor})
 
 if __name__ == "__main__":
     import uvicorn
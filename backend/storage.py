@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from uploads import StoredUpload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_URL_PREFIX = "/uploads/"
+FILE_ID_PATTERN = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)$")
+
+
+def file_id_for(sha256: str, extension: str) -> str:
+    return f"{sha256}{extension}"
+
+
+def file_url_for(file_id: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}{file_id}"
+
+
+def parse_file_id(file_id: str) -> Optional[Tuple[str, str]]:
+    match = FILE_ID_PATTERN.match(file_id)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def file_id_from_url(file_url: Optional[str]) -> Optional[str]:
+    if not file_url or not file_url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    file_id = file_url[len(UPLOAD_URL_PREFIX):]
+    return file_id if parse_file_id(file_id) else None
+
+
+class BlobStore:
+    """Uploads stored once per distinct content, addressed by SHA-256.
+
+    Blobs live at ``<root>/ab/cd/<sha256><ext>`` so no directory grows past a
+    few thousand entries.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path_for(self, file_id: str) -> Path:
+        return self.root / file_id[:2] / file_id[2:4] / file_id
+
+    def resolve(self, file_id: str) -> Optional[Path]:
+        """Path of an existing upload, including ones saved flat in ``root``
+        before content addressing."""
+        if parse_file_id(file_id):
+            path = self.path_for(file_id)
+        elif file_id and not file_id.startswith(".") and "/" not in file_id:
+            path = self.root / file_id
+        else:
+            return None
+        return path if path.is_file() else None
+
+    def resolve_url(self, file_url: Optional[str]) -> Optional[Path]:
+        if not file_url or not file_url.startswith(UPLOAD_URL_PREFIX):
+            return None
+        return self.resolve(file_url[len(UPLOAD_URL_PREFIX):])
+
+    async def commit(self, stored: StoredUpload, file_id: str) -> Path:
+        path = self.path_for(file_id)
+
+        def move():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(stored.path, path)
+        await asyncio.to_thread(move)
+        return path
+
+    async def discard(self, stored: StoredUpload):
+        await asyncio.to_thread(stored.path.unlink, True)
+
+    async def remove(self, file_id: str, unless_newer_than: float):
+        path = self.path_for(file_id)
+
+        def unlink():
+            # A re-upload may have recreated the blob after the record was
+            # deleted; its fresh mtime protects it
+            try:
+                if path.stat().st_mtime < unless_newer_than:
+                    path.unlink()
+                    return True
+            except FileNotFoundError:
+                pass
+            return False
+        return await asyncio.to_thread(unlink)
+
+
+async def store_upload(db, blobs: BlobStore, stored: StoredUpload) -> Tuple[dict, bool]:
+    """Persist ``stored`` unless identical bytes are already stored.
+
+    Returns the upload record and whether a new blob was written.
+    """
+    existing = await db.uploads.touch(stored.sha256)
+    if existing:
+        await blobs.discard(stored)
+        return existing, False
+
+    file_id = file_id_for(stored.sha256, stored.extension)
+    # Blob first, record second: a record never points at a missing file
+    await blobs.commit(stored, file_id)
+    record = await db.uploads.record(stored.sha256, file_id, stored.size)
+    return record, True
+
+
+async def collect_garbage(db, blobs: BlobStore, grace: timedelta = timedelta(hours=24), dry_run: bool = False) -> dict:
+    """Recount references from customizations and quotes and delete
+    unreferenced blobs.
+
+    Blobs uploaded within ``grace`` are kept even with no references, since
+    the customer may not have saved the customization yet.
+    """
+    references = Counter()
+
+    def count(logo_url):
+        # Quotes keep the customization data as the client sent it
+        file_id = file_id_from_url(logo_url) if isinstance(logo_url, str) else None
+        if file_id:
+            references[parse_file_id(file_id)[0]] += 1
+
+    async for customization in db.customizations.logo_urls():
+        count(customization.get("logo_url"))
+    async for quote in db.quotes.logo_urls():
+        count((quote.get("customization_data") or {}).get("logo_url"))
+
+    recounted = await db.uploads.recount(references, dry_run=dry_run)
+    cutoff = datetime.utcnow() - grace
+    removed = []
+    for record in await db.uploads.unreferenced(cutoff):
+        if dry_run:
+            removed.append(record["file_id"])
+            continue
+        if await db.uploads.delete_unreferenced(record["_id"], cutoff):
+            await blobs.remove(record["file_id"], unless_newer_than=time.time() - grace.total_seconds())
+            removed.append(record["file_id"])
+    if removed:
+        logger.info("Upload GC removed %d blobs", len(removed))
+    return {"recounted": recounted, "removed": removed, "dry_run": dry_run}
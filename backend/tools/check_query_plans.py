@@ -0,0 +1,54 @@
+"""Fail if any route query is answered by a collection scan.
+
+    cd backend
+    python -m tools.check_query_plans --ensure-indexes
+
+Runs explain() for every entry in indexes.ROUTE_QUERIES and exits non-zero
+when a winning plan contains COLLSCAN.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import ROUTE_QUERIES, ensure_indexes, plan_stages
+
+
+async def check(db, route_queries=ROUTE_QUERIES):
+    failures = []
+    for query in route_queries:
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        explained = await cursor.explain()
+        stages = plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {}))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print("%-28s %-16s %-8s %s" % (query.route, query.collection, status, " > ".join(stages)))
+        if status != "ok":
+            failures.append(query.route)
+    return failures
+
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    try:
+        if args.ensure_indexes:
+            await ensure_indexes(db)
+        failures = await check(db)
+    finally:
+        client.close()
+    if failures:
+        print("Collection scans in: %s" % ", ".join(failures), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that route queries use indexes")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "fireworks_advertising"))
+    parser.add_argument("--ensure-indexes", action="store_true", help="apply the index registry first")
+    sys.exit(asyncio.run(main(parser.parse_args())))
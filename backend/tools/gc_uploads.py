@@ -0,0 +1,38 @@
+"""Remove uploaded blobs no longer referenced by any customization or quote.
+
+    cd backend
+    python -m tools.gc_uploads --dry-run
+    python -m tools.gc_uploads --grace-hours 48
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+from database import Database
+from storage import BlobStore, collect_garbage
+
+
+async def main(args):
+    db = Database.connect(args.mongo_url, args.db_name)
+    try:
+        result = await collect_garbage(
+            db, BlobStore(Path(args.upload_dir)), grace=timedelta(hours=args.grace_hours), dry_run=args.dry_run
+        )
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect unreferenced uploads")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "fireworks_advertising"))
+    parser.add_argument("--upload-dir", default=os.getenv("UPLOAD_DIR", "/app/uploads"))
+    parser.add_argument("--grace-hours", type=float, default=24, help="keep unreferenced uploads younger than this")
+    parser.add_argument("--dry-run", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,77 @@
+"""Export the product catalog, or publish a file as its next version.
+
+    cd backend
+    python -m tools.publish_catalog export > products.json
+    python -m tools.publish_catalog publish products.json
+
+Running workers pick a published version up within CATALOG_POLL_INTERVAL
+seconds, or immediately when REDIS_URL is set and the broadcast gets through.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from cache import SharedCache
+from catalog import CatalogSnapshot, LiveCatalog
+from database import Database
+
+REQUIRED_FIELDS = ("id", "name", "category", "base_price", "wholesale_price", "image_url", "sizes")
+
+
+def validate(products) -> list:
+    errors = []
+    seen = set()
+    for index, product in enumerate(products):
+        missing = [f for f in REQUIRED_FIELDS if f not in product]
+        if missing:
+            errors.append("product %d: missing %s" % (index, ", ".join(missing)))
+        elif product["id"] in seen:
+            errors.append("product %d: duplicate id %s" % (index, product["id"]))
+        elif not product["sizes"]:
+            errors.append("product %s: needs at least one size" % product["id"])
+        seen.add(product.get("id"))
+    return errors
+
+
+async def main(args):
+    db = Database.connect(args.mongo_url, args.db_name)
+    cache = SharedCache.from_env()
+    live = LiveCatalog(db.catalog, [], cache)
+    try:
+        if args.command == "export":
+            latest = await db.catalog.latest_version()
+            doc = await db.catalog.get(latest) if latest else None
+            print(json.dumps({"version": latest, "products": doc["products"] if doc else []}, indent=2))
+            return 0
+
+        with open(args.file) as handle:
+            data = json.load(handle)
+        products = data["products"] if isinstance(data, dict) else data
+        errors = validate(products)
+        if not errors:
+            try:
+                CatalogSnapshot.build(0, products)
+            except (KeyError, TypeError, ValueError) as exc:
+                errors.append("cannot build pricing: %r" % exc)
+        if errors:
+            print("\n".join(errors), file=sys.stderr)
+            return 1
+        snapshot = await live.update(lambda _: products)
+        print(json.dumps({"version": snapshot.version, "products": len(products)}))
+        return 0
+    finally:
+        await cache.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or publish the product catalog")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "fireworks_advertising"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="print the latest version as JSON")
+    publish = commands.add_parser("publish", help="publish a JSON file as the next version")
+    publish.add_argument("file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,37 @@
+"""Recompute quote rollups from the quotes collection.
+
+    cd backend
+    python -m tools.rebuild_rollups                     # everything
+    python -m tools.rebuild_rollups --since 2025-06-01  # backfill from a day on
+
+Quotes written while the rebuild runs may be counted twice or not at all
+for the days being rebuilt; run it off-peak, or re-run it for those days.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+from database import Database
+
+
+async def main(args):
+    db = Database.connect(args.mongo_url, args.db_name)
+    try:
+        await db.ensure_indexes()
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+        result = await db.quote_rollups.rebuild(db.quotes, since)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild quote analytics rollups")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "fireworks_advertising"))
+    parser.add_argument("--since", help="only rebuild days from this date (YYYY-MM-DD) on")
+    sys.exit(asyncio.run(main(parser.parse_args())))
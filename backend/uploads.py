@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import multipart
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from fastapi import HTTPException, Request
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+# Bytes buffered before each off-loop disk write
+WRITE_CHUNK_SIZE = 1024 * 1024
+# Multipart framing around the file itself (boundaries, part headers)
+MULTIPART_OVERHEAD = 16 * 1024
+SNIFF_BYTES = 16
+
+# Accepted extensions and the leading bytes a genuine file of that type has.
+# Illustrator files are PDF-compatible or, for older versions, PostScript.
+FILE_SIGNATURES = {
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+    ".png": (b"\x89PNG\r\n\x1a\n",),
+    ".pdf": (b"%PDF-",),
+    ".ai": (b"%PDF-", b"%!PS-Adobe"),
+}
+
+NOT_ALLOWED = "File type not allowed. Please upload JPG, PNG, PDF, or AI files."
+
+
+@dataclass
+class StoredUpload:
+    original_filename: str
+    extension: str
+    # Fully written and fsynced temp file inside the upload directory, ready
+    # to be renamed into permanent storage
+    path: Path
+    size: int
+    sha256: str
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail="File too large. Maximum size is %g MB." % round(max_bytes / (1024 * 1024), 1))
+
+
+def sniff_matches(extension: str, head: bytes) -> bool:
+    return any(head.startswith(signature) for signature in FILE_SIGNATURES.get(extension, ()))
+
+
+class _FilePart:
+    """Receives one file part: sniffs, hashes and spills it to a temp file."""
+
+    def __init__(self, upload_dir: Path, original_filename: str, max_bytes: int):
+        self.upload_dir = upload_dir
+        self.original_filename = original_filename
+        self.extension = Path(original_filename).suffix.lower()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.head = b""
+        self.pending = bytearray()
+        self.file = None
+
+        if self.extension not in FILE_SIGNATURES:
+            raise HTTPException(status_code=400, detail=NOT_ALLOWED)
+
+    async def feed(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise too_large(self.max_bytes)
+        self.digest.update(data)
+        self.pending += data
+
+        if self.file is None:
+            if len(self.pending) < SNIFF_BYTES:
+                return
+            await self._open()
+        if len(self.pending) >= WRITE_CHUNK_SIZE:
+            await self._flush()
+
+    async def _open(self):
+        # Reject on the first bytes, before the rest of the body is read
+        self.head = bytes(self.pending[:SNIFF_BYTES])
+        if not sniff_matches(self.extension, self.head):
+            raise HTTPException(status_code=400, detail=NOT_ALLOWED)
+        self.file = await asyncio.to_thread(
+            tempfile.NamedTemporaryFile, dir=self.upload_dir, suffix=".part", delete=False
+        )
+
+    async def _flush(self):
+        chunk, self.pending = bytes(self.pending), bytearray()
+        await asyncio.to_thread(self.file.write, chunk)
+
+    async def finish(self) -> StoredUpload:
+        if self.file is None:
+            await self._open()
+        await self._flush()
+        await asyncio.to_thread(self._sync_and_close)
+        return StoredUpload(
+            self.original_filename, self.extension, Path(self.file.name), self.size, self.digest.hexdigest()
+        )
+
+    def _sync_and_close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    async def discard(self):
+        if self.file is not None:
+            await asyncio.to_thread(self.file.close)
+            await asyncio.to_thread(Path(self.file.name).unlink, True)
+
+
+async def receive_upload(
+    request: Request,
+    upload_dir: Path,
+    field_name: str = "file",
+    max_bytes: int = UPLOAD_MAX_BYTES
+) -> StoredUpload:
+    """Stream a multipart upload straight from the socket to a temp file.
+
+    The size cap and file-type sniffing are enforced as bytes arrive, and the
+    SHA-256 is computed in the same pass; disk writes run in a thread. The
+    caller moves ``StoredUpload.path`` into place (see storage.BlobStore).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise too_large(max_bytes)
+
+    # The parser's callbacks are synchronous; they queue events that are then
+    # handled asynchronously after each chunk is fed in.
+    events = []
+    headers = {}
+    header = {"field": b"", "value": b""}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.pop(b"content-disposition", b""))
+        headers.clear()
+        events.append(("begin", options))
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    part: Optional[_FilePart] = None
+    receiving = False
+    stored: Optional[StoredUpload] = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "begin":
+                    receiving = (
+                        stored is None
+                        and value.get(b"name", b"").decode("utf-8", "replace") == field_name
+                        and b"filename" in value
+                    )
+                    if receiving:
+                        part = _FilePart(upload_dir, value[b"filename"].decode("utf-8", "replace"), max_bytes)
+                elif kind == "data" and receiving:
+                    await part.feed(value)
+                elif kind == "end" and receiving:
+                    stored = await part.finish()
+                    part, receiving = None, False
+            events.clear()
+        parser.finalize()
+    except BaseException as exc:
+        if stored is not None:
+            await asyncio.to_thread(stored.path.unlink, True)
+        if isinstance(exc, MultipartParseError):
+            raise HTTPException(status_code=400, detail="There was an error parsing the body") from exc
+        raise
+    finally:
+        # Also covers a body that ends mid-part: the file never saw its end
+        if part is not None:
+            await part.discard()
+
+    if stored is None:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    return stored
@@ -0,0 +1,136 @@
+"""Background job runner: works the Mongo-backed job queues.
+
+    cd backend
+    python worker.py                                 # every queue
+    python worker.py --queues notifications          # just some of them
+    python worker.py --metrics-port 9102             # expose Prometheus metrics
+
+Run as many as needed; jobs are leased, so two runners never work the same
+job. Per-queue concurrency (JOB_CONCURRENCY_<QUEUE>) applies per runner.
+SIGTERM stops claiming, waits for running jobs and requeues the rest.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+from PIL import Image, UnidentifiedImageError
+from pymongo.errors import PyMongoError
+
+from database import Database
+from derivatives import RASTER_EXTENSIONS
+from jobs import Handler, JobRunner, PermanentJobError, queues_from_env
+from storage import BlobStore, UPLOAD_URL_PREFIX
+from uploads import SNIFF_BYTES, sniff_matches
+
+logger = logging.getLogger("worker")
+
+STAFF_NOTIFY_WEBHOOK = os.getenv("STAFF_NOTIFY_WEBHOOK")
+WEBHOOK_TIMEOUT = 10
+
+
+def build_handlers(db: Database, blobs: BlobStore, webhook: Optional[str] = STAFF_NOTIFY_WEBHOOK) -> Dict[str, Handler]:
+    async def notify(payload: dict):
+        quotes = await db.quotes.get_many(payload["quote_ids"])
+        if not quotes:
+            # Write-behind may not have flushed yet; the retry will see them
+            raise LookupError("quotes %s not found" % payload["request_id"])
+        first = quotes[0]
+        message = {
+            "text": "New quote request from %s (%s): %s" % (
+                first["business_name"], first["user_email"],
+                "; ".join("%s x%d" % (q["product_name"], q["quantity"]) for q in quotes),
+            ),
+            "request_id": payload["request_id"],
+            "estimated_total": round(sum(q.get("estimated_total") or 0 for q in quotes), 2),
+        }
+        if not webhook:
+            logger.info(message["text"])
+            return
+        response = await asyncio.to_thread(requests.post, webhook, json=message, timeout=WEBHOOK_TIMEOUT)
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentJobError("webhook refused the notification: HTTP %d" % response.status_code)
+        response.raise_for_status()
+
+    async def validate_logo(payload: dict):
+        quote = await db.quotes.get(payload["quote_id"])
+        if quote is None:
+            raise LookupError("quote %s not found" % payload["quote_id"])
+        logo_url = (quote.get("customization_data") or {}).get("logo_url")
+        if logo_url is not None and not isinstance(logo_url, str):
+            raise PermanentJobError("quote %s has a malformed logo_url" % quote["id"])
+        if not logo_url or not logo_url.startswith(UPLOAD_URL_PREFIX):
+            status = "external" if logo_url else "none"
+        else:
+            path = blobs.resolve_url(logo_url)
+            status = "missing" if path is None else await asyncio.to_thread(_image_status, path)
+        await db.quotes.set_logo_status(quote["id"], status)
+
+    return {"notifications": notify, "logos": validate_logo}
+
+
+def _image_status(path: Path) -> str:
+    extension = path.suffix.lower()
+    with open(path, "rb") as file:
+        head = file.read(SNIFF_BYTES)
+    if not sniff_matches(extension, head):
+        return "invalid"
+    if extension not in RASTER_EXTENSIONS:
+        # PDF and Illustrator artwork: the signature is all we can check
+        return "ok"
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        return "invalid"
+    return "ok"
+
+
+async def main(args) -> int:
+    db = Database.connect(args.mongo_url, args.db_name)
+    try:
+        await db.ensure_indexes()
+    except PyMongoError:
+        logger.exception("Could not reach MongoDB")
+        return 1
+    handlers = build_handlers(db, BlobStore(Path(args.upload_dir)))
+    if args.queues:
+        unknown = [name for name in args.queues if name not in handlers]
+        if unknown:
+            logger.error("Unknown queues: %s", ", ".join(unknown))
+            return 2
+        handlers = {name: handlers[name] for name in args.queues}
+    runner = JobRunner(db.jobs, handlers, queues_from_env(), poll_interval=args.poll_interval)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    await runner.start()
+    await stop.wait()
+    logger.info("Stopping job runner")
+    await runner.close(args.grace)
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.getenv("DB_NAME", "fireworks_advertising"))
+    parser.add_argument("--upload-dir", default=os.getenv("UPLOAD_DIR", "/app/uploads"))
+    parser.add_argument("--queues", type=lambda v: [q for q in v.split(",") if q],
+                        help="comma-separated queues to work (default: all)")
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("JOB_POLL_INTERVAL", "1")))
+    parser.add_argument("--grace", type=float, default=30.0, help="seconds running jobs get on shutdown")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if args.metrics_port:
+        from prometheus_client import start_http_server
+        start_http_server(args.metrics_port)
+    raise SystemExit(asyncio.run(main(args)))
@@ -0,0 +1,259 @@
+import asyncio
+import fcntl
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from bson import ObjectId, json_util
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBufferFull(Exception):
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Write-behind buffer is full")
+        self.retry_after = retry_after
+
+
+class WriteBehindBuffer:
+    """Acknowledge inserts once journaled, write them to Mongo in batches.
+
+    ``enqueue`` returns after the document is appended to a local journal and
+    fsynced. Appends from concurrent requests are group-committed with one
+    fsync. A background task flushes the buffer with unordered bulk inserts
+    whenever ``max_batch`` documents are waiting or ``flush_interval`` has
+    passed. Each flush rotates the journal into a segment that is deleted
+    once its documents are in Mongo, so after a crash the next start replays
+    exactly the unflushed documents. Documents get their ``_id`` up front,
+    which makes replays idempotent.
+    """
+
+    def __init__(self, db, journal_dir: Path, max_batch: int = 500,
+                 flush_interval: float = 0.05, max_pending: int = 20000):
+        self.db = db
+        self.journal_dir = journal_dir
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._incoming: List[Tuple[str, dict, asyncio.Future]] = []
+        self._incoming_ready = asyncio.Event()
+        self._pending: List[Tuple[str, dict]] = []
+        self._flush_wanted = asyncio.Event()
+        self._journal_lock = asyncio.Lock()
+        self._journal = None
+        self._segment = 0
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        # Per-collection hooks run with the documents a flush actually inserted
+        self.after_insert: Dict[str, Callable[[List[dict]], Awaitable[None]]] = {}
+
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    @classmethod
+    def from_env(cls, db, default_dir: Path) -> "WriteBehindBuffer":
+        return cls(
+            db,
+            Path(os.getenv("WRITE_BEHIND_DIR", str(default_dir))),
+            max_batch=int(os.getenv("WRITE_BEHIND_BATCH", "500")),
+            flush_interval=float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50")) / 1000,
+            max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000")),
+        )
+
+    @property
+    def depth(self) -> int:
+        return len(self._incoming) + len(self._pending)
+
+    def _journal_path(self, suffix: str) -> Path:
+        return self.journal_dir / f"journal-{os.getpid()}.{suffix}"
+
+    async def start(self):
+        await asyncio.to_thread(self.journal_dir.mkdir, parents=True, exist_ok=True)
+        await self._replay_orphans()
+        self._journal = await asyncio.to_thread(self._open_journal)
+        self._tasks = [
+            asyncio.create_task(self._journal_writer()),
+            asyncio.create_task(self._flusher()),
+        ]
+
+    def _open_journal(self):
+        journal = open(self._journal_path("log"), "a", encoding="utf-8")
+        # Held for the life of the process: a locked journal belongs to a
+        # live worker and must not be replayed by another one
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return journal
+
+    async def enqueue(self, collection: str, doc: dict):
+        if self._closing or self.depth >= self.max_pending:
+            raise WriteBufferFull()
+        doc.setdefault("_id", ObjectId())
+        future = asyncio.get_running_loop().create_future()
+        self._incoming.append((collection, doc, future))
+        self._incoming_ready.set()
+        await future
+
+    async def _journal_writer(self):
+        while not (self._closing and not self._incoming):
+            await self._incoming_ready.wait()
+            self._incoming_ready.clear()
+            group, self._incoming = self._incoming, []
+            if not group:
+                continue
+            lines = "".join(
+                json_util.dumps({"c": collection, "d": doc}) + "\n" for collection, doc, _ in group
+            )
+            try:
+                async with self._journal_lock:
+                    await asyncio.to_thread(self._append, lines)
+                    self._pending.extend((collection, doc) for collection, doc, _ in group)
+            except Exception as exc:
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for _, _, future in group:
+                if not future.done():
+                    future.set_result(None)
+            if len(self._pending) >= self.max_batch:
+                self._flush_wanted.set()
+
+    def _append(self, lines: str):
+        self._journal.write(lines)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    async def _flusher(self):
+        delay = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wanted.clear()
+            if self._pending:
+                try:
+                    # Mongo unreachable at shutdown: the segment is replayed next start
+                    await self._flush_once(retry=not self._closing)
+                    delay = self.flush_interval
+                except Exception:
+                    # Anything else (a document that can't be encoded, a
+                    # failed rotation) must not stop later flushes; whatever
+                    # was taken stays journaled for the next start
+                    self.failed_flushes += 1
+                    logger.exception("Write-behind flush failed, retrying in %.2fs", delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+            if self._closing and self._tasks[0].done() and not self._pending:
+                return
+
+    async def _flush_once(self, retry: bool = True):
+        # Swap the buffer and rotate the journal together: the segment holds
+        # exactly the documents taken here
+        async with self._journal_lock:
+            self._segment += 1
+            segment = self._journal_path(f"{self._segment}.segment")
+            await asyncio.to_thread(self._rotate, segment)
+            # Only once rotated: a failed rotation leaves the batch pending
+            batch, self._pending = self._pending, []
+
+        delay = self.flush_interval
+        while True:
+            try:
+                await self._write(batch)
+                break
+            except PyMongoError as exc:
+                self.failed_flushes += 1
+                if not retry:
+                    logger.error("Write-behind flush failed, %d documents left in %s: %s", len(batch), segment, exc)
+                    return
+                logger.warning("Write-behind flush failed, retrying in %.2fs: %s", delay, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+        await asyncio.to_thread(segment.unlink, True)
+        self.flushed += len(batch)
+        self.flushes += 1
+
+    def _rotate(self, segment: Path):
+        self._journal.flush()
+        os.replace(self._journal_path("log"), segment)
+        # Keep the lock on the segment's inode until the new journal is open
+        old = self._journal
+        self._journal = self._open_journal()
+        old.close()
+
+    async def _write(self, batch: List[Tuple[str, dict]]):
+        by_collection: Dict[str, List[dict]] = {}
+        for collection, doc in batch:
+            by_collection.setdefault(collection, []).append(doc)
+        for collection, docs in by_collection.items():
+            for start in range(0, len(docs), self.max_batch):
+                chunk = docs[start:start + self.max_batch]
+                try:
+                    await self.db[collection].bulk_write([InsertOne(d) for d in chunk], ordered=False)
+                except BulkWriteError as exc:
+                    # Already written by an earlier attempt or replay
+                    errors = exc.details.get("writeErrors", [])
+                    if any(e.get("code") != DUPLICATE_KEY for e in errors):
+                        raise
+                    duplicates = {e["index"] for e in errors}
+                    chunk = [d for i, d in enumerate(chunk) if i not in duplicates]
+                hook = self.after_insert.get(collection)
+                if hook and chunk:
+                    try:
+                        await hook(chunk)
+                    except PyMongoError:
+                        # The documents are safely stored; only derived data lags
+                        logger.exception("After-insert hook for %s failed", collection)
+
+    async def _replay_orphans(self):
+        """Flush journals left behind by workers that are no longer running."""
+        for path in sorted(self.journal_dir.glob("journal-*")):
+            handle = await asyncio.to_thread(open, path, "r", encoding="utf-8")
+            try:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                batch = []
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json_util.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write; never acknowledged
+                        logger.warning("Skipping unreadable write-behind journal line in %s", path)
+                        continue
+                    batch.append((entry["c"], entry["d"]))
+                if batch:
+                    logger.info("Replaying %d journaled writes from %s", len(batch), path)
+                    await self._write(batch)
+                await asyncio.to_thread(path.unlink, True)
+            finally:
+                handle.close()
+
+    async def close(self):
+        """Stop accepting writes and drain everything to Mongo."""
+        self._closing = True
+        self._incoming_ready.set()
+        await self._tasks[0]
+        self._flush_wanted.set()
+        await self._tasks[1]
+        await asyncio.to_thread(self._journal.close)
+        await asyncio.to_thread(self._journal_path("log").unlink, True)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_pending": self.max_pending,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
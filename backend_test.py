@@ -1,11 +1,12 @@
 import requests
+from PIL import Image
 import sys
 import uuid
 import os
 from datetime import datetime
 
 class FireworksAPITester:
-    def __init__(self, base_url="https://26d42d51-b47d-426a-97e7-2a5b46286634.preview.emergentagent.com"):
+    def __init__(self, base_url=os.getenv("BACKEND_URL", "http://localhost:8001")):
         self.base_url = base_url
         self.token = None
         self.user = None
@@ -177,10 +178,9 @@ class FireworksAPITester:
             print("❌ No token available, skipping test")
             return False
             
-        # Create a test image file
+        # Create a test image file; uploads are sniffed, so it must be a real PNG
         test_file_path = "/tmp/test_logo.png"
-        with open(test_file_path, "w") as f:
-            f.write("Test file content")
+        Image.new("RGBA", (64, 64), (194, 65, 12, 255)).save(test_file_path, "PNG")
             
         files = {'file': ('test_logo.png', open(test_file_path, 'rb'), 'image/png')}
         
@@ -5,37 +5,55 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# One uvicorn worker per CPU (WEB_CONCURRENCY overrides) on a shared socket;
+# the supervisor restarts crashed workers and reloads them one at a time on SIGHUP
+STARTED_AT=$(date +%s)
+HOST=0.0.0.0 PORT=8001 python3 prefork.py &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
+echo "Waiting for backend to become ready..."
+READY_TIMEOUT=${READY_TIMEOUT:-120}
+until wget -q -O /dev/null http://127.0.0.1:8001/api/health 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ $(( $(date +%s) - STARTED_AT )) -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 0.5
+done
+echo "Backend ready after $(( $(date +%s) - STARTED_AT ))s"
 
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+# Background jobs (staff notifications, logo checks) run beside the web workers
+python3 worker.py &
+WORKER_PID=$!
 
 # Start Nginx
 nginx -g 'daemon off;' &
 NGINX_PID=$!
 
 # Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+# (waiting lets in-flight requests finish and write-behind buffers drain)
+trap 'kill $BACKEND_PID $WORKER_PID $NGINX_PID; wait $BACKEND_PID $WORKER_PID; exit 0' SIGTERM SIGINT
+# Rolling reload of the backend workers without dropping requests
+trap 'kill -HUP $BACKEND_PID' SIGHUP
 
 # Check if processes are still running
-while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
+while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $WORKER_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
     sleep 1
 done
 
 # If we get here, one of the processes died
-if kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Nginx died, shutting down backend..."
-    kill $BACKEND_PID
+if ! kill -0 $BACKEND_PID 2>/dev/null; then
+    echo "Backend died, shutting down..."
+elif ! kill -0 $WORKER_PID 2>/dev/null; then
+    echo "Job runner died, shutting down..."
 else
-    echo "Backend died, shutting down nginx..."
-    kill $NGINX_PID
+    echo "Nginx died, shutting down..."
 fi
+kill $BACKEND_PID $WORKER_PID $NGINX_PID 2>/dev/null
 
 exit 1
@@ -0,0 +1,58 @@
+// Writes .gz and .br siblings next to every compressible file in the build,
+// at maximum compression since it runs once per build, and prints the sizes.
+// nginx serves the siblings directly (gzip_static and the br rewrite).
+//
+//   node scripts/precompress.js [build-dir]
+const fs = require("fs");
+const path = require("path");
+const zlib = require("zlib");
+
+const EXTENSIONS = new Set([".js", ".css", ".html", ".json", ".svg", ".map", ".txt", ".ico"]);
+// Below this the compressed file plus headers is rarely smaller
+const MIN_SIZE = 1024;
+
+function* walk(dir) {
+  for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+    const full = path.join(dir, entry.name);
+    if (entry.isDirectory()) {
+      yield* walk(full);
+    } else if (EXTENSIONS.has(path.extname(entry.name))) {
+      yield full;
+    }
+  }
+}
+
+function main() {
+  const root = path.resolve(process.argv[2] || "build");
+  const totals = { files: 0, raw: 0, gzip: 0, br: 0 };
+  for (const file of walk(root)) {
+    const raw = fs.readFileSync(file);
+    if (raw.length < MIN_SIZE) {
+      continue;
+    }
+    const gz = zlib.gzipSync(raw, { level: 9 });
+    const br = zlib.brotliCompressSync(raw, {
+      params: {
+        [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+        [zlib.constants.BROTLI_PARAM_SIZE_HINT]: raw.length,
+      },
+    });
+    // Same mtime as the original, so Last-Modified does not depend on the encoding
+    const { mtime } = fs.statSync(file);
+    for (const [suffix, data] of [[".gz", gz], [".br", br]]) {
+      fs.writeFileSync(file + suffix, data);
+      fs.utimesSync(file + suffix, mtime, mtime);
+    }
+    totals.files += 1;
+    totals.raw += raw.length;
+    totals.gzip += gz.length;
+    totals.br += br.length;
+  }
+  const pct = (n) => (totals.raw ? ((100 * n) / totals.raw).toFixed(1) + "%" : "-");
+  console.log(
+    `Precompressed ${totals.files} files: ${totals.raw} B raw, ` +
+      `${totals.gzip} B gzip (${pct(totals.gzip)}), ${totals.br} B brotli (${pct(totals.br)})`
+  );
+}
+
+main();
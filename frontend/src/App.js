@@ -16,6 +16,7 @@ function App() {
   });
   const [uploadedLogo, setUploadedLogo] = useState(null);
   const [quotes, setQuotes] = useState([]);
+  const [quotesCursor, setQuotesCursor] = useState(null);
 
   useEffect(() => {
     // Check for existing token
@@ -26,6 +27,12 @@ function App() {
     fetchProducts();
   }, []);
 
+  useEffect(() => {
+    if (currentView === 'quotes') {
+      fetchQuotes();
+    }
+  }, [currentView, user]);
+
   const fetchCurrentUser = async (token) => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/auth/me`, {
@@ -55,17 +62,20 @@ function App() {
     }
   };
 
-  const fetchQuotes = async () => {
+  // Quotes come a page at a time; passing the last page's next_cursor appends the next one
+  const fetchQuotes = async (after = null) => {
     if (!user) return;
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(`${API_BASE_URL}/api/quotes`, {
+      const query = after ? `?after=${encodeURIComponent(after)}` : '';
+      const response = await fetch(`${API_BASE_URL}/api/quotes${query}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
       const data = await response.json();
-      setQuotes(data.quotes);
+      setQuotes(previous => after ? [...previous, ...data.quotes] : data.quotes);
+      setQuotesCursor(data.next_cursor);
     } catch (error) {
       console.error('Error fetching quotes:', error);
     }
@@ -180,7 +190,6 @@ function App() {
       if (response.ok) {
         alert('Quote request submitted successfully! We\'ll contact you within 24 hours.');
         setCurrentView('quotes');
-        fetchQuotes();
       }
     } catch (error) {
       console.error('Error requesting quote:', error);
@@ -353,7 +362,7 @@ function App() {
                     transform: 'translate(-50%, -50%)'
                   }}
                 >
-                  <img src={uploadedLogo} alt="Logo" />
+                  <img src={`${API_BASE_URL}${uploadedLogo}?w=256`} alt="Logo" />
                 </div>
               )}
               {customization.business_name && (
@@ -494,10 +503,6 @@ function App() {
   };
 
   const QuotesView = () => {
-    useEffect(() => {
-      fetchQuotes();
-    }, []);
-
     return (
       <div className="quotes-container">
         <h2>Your Quote Requests</h2>
@@ -515,6 +520,11 @@ function App() {
                 {quote.message && <p><strong>Message:</strong> {quote.message}</p>}
               </div>
             ))}
+            {quotesCursor && (
+              <button className="load-more-button" onClick={() => fetchQuotes(quotesCursor)}>
+                Load more
+              </button>
+            )}
           </div>
         )}
       </div>
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The backend is a flat set of modules run from its own directory
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="test-uploads-"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
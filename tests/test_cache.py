@@ -0,0 +1,97 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+
+from benchmarks.memory_mongo import MemoryClient
+from benchmarks.memory_redis import MemoryRedis
+from cache import SharedCache
+from database import Database
+
+pytestmark = pytest.mark.anyio
+
+
+async def settle():
+    # Lets the pub/sub listeners subscribe and deliver
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def workers():
+    # Two workers' caches on one Redis server
+    redis = MemoryRedis()
+    caches = [SharedCache(redis), SharedCache(redis)]
+    for cache in caches:
+        await cache.start()
+    await settle()
+    yield caches
+    for cache in caches:
+        await cache.close()
+
+
+async def test_delete_drops_other_workers_local_copy(workers):
+    a, b = (cache.namespace("profiles", 100, 60) for cache in workers)
+    await a.set("key", {"v": 1})
+    # b reads through Redis and now holds its own local copy
+    assert await b.get("key") == {"v": 1}
+    assert b.local.get("key") == {"v": 1}
+
+    await a.delete("key")
+    await settle()
+    assert b.local.get("key") is None
+    assert await b.get("key") is None
+
+
+async def test_clear_moves_every_worker_to_a_new_generation(workers):
+    a, b = (cache.namespace("catalog", 100, 60) for cache in workers)
+    await a.set("key", "old")
+    assert await b.get("key") == "old"
+
+    await a.clear()
+    await settle()
+    assert b.generation == a.generation == 1
+    assert len(b.local) == 0
+    assert await b.get("key") is None
+
+
+async def test_invalidation_is_bounded_by_ttl_while_redis_is_down(workers):
+    a, b = (cache.namespace("profiles", 100, 0.05) for cache in workers)
+    await a.set("key", "old")
+    assert await b.get("key") == "old"
+
+    workers[0].redis.down = True
+    await a.delete("key")
+    assert b.local.get("key") == "old"
+    await asyncio.sleep(0.06)
+    assert b.local.get("key") is None
+
+
+async def test_profile_update_in_one_worker_is_seen_by_the_other(workers):
+    client = MemoryClient()
+    name = "test_%s" % uuid.uuid4().hex[:8]
+    first, second = Database(client, name), Database(client, name)
+    first.use_cache(workers[0])
+    second.use_cache(workers[1])
+    await first.users.create({
+        "id": str(uuid.uuid4()), "email": "owner@example.com", "business_name": "Old Name",
+        "account_type": "wholesale", "wholesale_approved": False, "created_at": datetime.utcnow(),
+    })
+    assert (await second.users.get_profile("owner@example.com"))["wholesale_approved"] is False
+
+    await first.users.update("owner@example.com", {"wholesale_approved": True})
+    await settle()
+    assert (await second.users.get_profile("owner@example.com"))["wholesale_approved"] is True
+
+
+async def test_listener_survives_undecodable_broadcasts(workers):
+    a, b = (cache.namespace("profiles", 100, 60) for cache in workers)
+    await a.set("key", "old")
+    assert await b.get("key") == "old"
+
+    for junk in ("not json", '{"key": "no namespace"}', "[]"):
+        await workers[0].redis.publish(workers[0].channel, junk)
+    await a.delete("key")
+    await settle()
+    assert b.local.get("key") is None
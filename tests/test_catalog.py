@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.memory_mongo import MemoryClient
+from catalog import LiveCatalog
+from database import Database
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unloadable_version_keeps_the_previous_snapshot():
+    db = Database(MemoryClient(), "test")
+    live = LiveCatalog(db.catalog, [], poll_interval=3600)
+    await live.start()
+    try:
+        await db.catalog.publish([{"name": "No id or prices"}], 2)
+        await live._refresh_quietly()
+        assert live.snapshot.version == 1
+
+        # The poller is still there to pick up the corrected version
+        await db.catalog.publish([], 3)
+        await live._refresh_quietly()
+        assert live.snapshot.version == 3 and not live._poller.done()
+    finally:
+        await live.close()
@@ -0,0 +1,8 @@
+from derivatives import DerivativeCache
+
+
+def test_renditions_of_legacy_files_sharing_a_stem_are_kept_apart(tmp_path):
+    cache = DerivativeCache(tmp_path)
+    png, jpg = cache.path_for("logo.png", 128, "webp"), cache.path_for("logo.jpg", 128, "webp")
+    assert png != jpg
+    assert png.parent == jpg.parent == tmp_path
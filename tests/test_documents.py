@@ -0,0 +1,29 @@
+import pytest
+
+from documents import QuoteDocuments, document_data
+
+pytestmark = pytest.mark.anyio
+
+
+def quote(status):
+    return {"id": "q1", "product_id": "p1", "product_name": "Mesh Banner", "quantity": 2,
+            "business_name": "Shop", "user_email": "owner@example.com", "status": status}
+
+
+@pytest.fixture
+def documents(tmp_path):
+    documents = QuoteDocuments(tmp_path, workers=1)
+    documents.start()
+    yield documents
+    documents.shutdown()
+
+
+async def test_new_version_replaces_the_old_once_written(documents):
+    old = await documents.get(document_data("Q-1", [quote("pending")], {}), None)
+    # A range response still streaming the old version
+    with open(old, "rb") as streaming:
+        new = await documents.get(document_data("Q-1", [quote("approved")], {}), None)
+        assert streaming.read(5) == b"%PDF-"
+
+    assert new != old and new.read_bytes().startswith(b"%PDF-")
+    assert list(new.parent.glob("*.pdf")) == [new]
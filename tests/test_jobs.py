@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from benchmarks.memory_mongo import MemoryClient
+from database import JOB_DONE, JOB_FAILED, Database, JobRepository
+from jobs import JobRunner, PermanentJobError, QueueConfig
+from storage import BlobStore
+from worker import build_handlers
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def repository():
+    return JobRepository(MemoryClient()["test"].jobs)
+
+
+async def test_expired_lease_is_redelivered_to_another_worker(repository):
+    await repository.enqueue_many([JobRepository.new_job("logos", {"n": 1}, job_id="job-1")])
+
+    first = await repository.claim("logos", "worker-a", lease=0.05)
+    assert first["_id"] == "job-1" and first["attempts"] == 1
+    assert await repository.claim("logos", "worker-b", lease=0.05) is None
+
+    # Nothing is requeued while the lease holds
+    assert await repository.requeue_expired() == 0
+    await asyncio.sleep(0.1)
+    assert await repository.requeue_expired() == 1
+
+    second = await repository.claim("logos", "worker-b", lease=60)
+    assert second["_id"] == "job-1" and second["attempts"] == 2
+    # The first worker lost its lease and can no longer finish the job
+    assert not await repository.complete("job-1", "worker-a")
+    assert not await repository.renew("job-1", "worker-a", 60)
+    assert await repository.complete("job-1", "worker-b")
+    assert (await repository.collection.find_one({"_id": "job-1"}))["status"] == JOB_DONE
+
+
+async def test_fixed_job_ids_are_enqueued_once(repository):
+    job = JobRepository.new_job("notifications", {"n": 1}, job_id="notify-quote:1")
+    await repository.enqueue_many([job])
+    await repository.enqueue_many([JobRepository.new_job("notifications", {"n": 2}, job_id="notify-quote:1")])
+    assert await repository.collection.count_documents({}) == 1
+    assert (await repository.collection.find_one({"_id": "notify-quote:1"}))["payload"] == {"n": 1}
+
+
+async def test_runner_picks_up_job_of_dead_worker(repository):
+    await repository.enqueue_many([JobRepository.new_job("logos", {"n": 1}, job_id="job-1")])
+    # Claimed by a worker that then dies without renewing
+    await repository.claim("logos", "dead-worker", lease=0.1)
+
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload["n"])
+
+    config = QueueConfig("logos", concurrency=1, lease=0.1)
+    runner = JobRunner(repository, {"logos": handler}, {"logos": config}, poll_interval=0.02, worker_id="live")
+    await runner.start()
+    try:
+        for _ in range(100):
+            if runner.completed:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await runner.close(grace=1)
+
+    assert handled == [1]
+    job = await repository.collection.find_one({"_id": "job-1"})
+    assert job["status"] == JOB_DONE and job["attempts"] == 2
+
+
+async def test_job_that_keeps_losing_its_lease_fails(repository):
+    await repository.enqueue_many([JobRepository.new_job("logos", {"n": 1}, job_id="job-1")])
+    config = QueueConfig("logos", concurrency=1, max_attempts=2, lease=0.05)
+    for attempt in range(config.max_attempts):
+        await repository.claim("logos", "crashing-%d" % attempt, lease=config.lease)
+        await asyncio.sleep(0.06)
+        assert await repository.requeue_expired() == 1
+
+    async def handler(payload):
+        raise AssertionError("should not run again")
+
+    runner = JobRunner(repository, {"logos": handler}, {"logos": config}, poll_interval=0.02, worker_id="live")
+    await runner.start()
+    try:
+        for _ in range(100):
+            if runner.failed:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await runner.close(grace=1)
+
+    job = await repository.collection.find_one({"_id": "job-1"})
+    assert job["status"] == JOB_FAILED and job["last_error"] == "lease expired 2 times"
+
+
+async def test_runner_keeps_polling_when_recording_an_outcome_fails(repository, monkeypatch):
+    await repository.enqueue_many([JobRepository.new_job("logos", {"n": n}, job_id="job-%d" % n) for n in range(2)])
+    complete = repository.complete
+    outages = []
+
+    async def flaky_complete(job_id, worker_id):
+        if not outages:
+            outages.append(job_id)
+            raise AutoReconnect("primary stepped down")
+        return await complete(job_id, worker_id)
+
+    monkeypatch.setattr(repository, "complete", flaky_complete)
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload["n"])
+
+    config = QueueConfig("logos", concurrency=1, lease=60)
+    runner = JobRunner(repository, {"logos": handler}, {"logos": config}, poll_interval=0.02, worker_id="live")
+    await runner.start()
+    try:
+        for _ in range(100):
+            if len(handled) == 2:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await runner.close(grace=1)
+
+    assert sorted(handled) == [0, 1]
+    assert await repository.collection.count_documents({"status": JOB_DONE}) == 1
+
+
+async def test_malformed_logo_url_fails_the_job_for_good(tmp_path):
+    db = Database(MemoryClient(), "test")
+    await db.db.quotes.insert_one({"id": "q1", "customization_data": {"logo_url": ["not", "a", "url"]}})
+    handlers = build_handlers(db, BlobStore(tmp_path), webhook=None)
+    with pytest.raises(PermanentJobError):
+        await handlers["logos"]({"quote_id": "q1"})
@@ -0,0 +1,91 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.memory_mongo import MemoryClient
+from database import Database
+from pagination import decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+OWNER = "owner@example.com"
+START = datetime(2024, 6, 1, 12, 0, 0, 123000)
+
+
+@pytest.fixture
+def db():
+    return Database(MemoryClient(), "test")
+
+
+async def add_quotes(db, created_ats, owner=OWNER):
+    docs = [{"id": str(uuid.uuid4()), "user_email": owner, "created_at": created_at, "product_name": "Banner"}
+            for created_at in created_ats]
+    await db.db.quotes.insert_many([dict(doc) for doc in docs])
+    # Newest first, ties broken by id descending
+    return sorted(docs, key=lambda doc: (doc["created_at"], doc["id"]), reverse=True)
+
+
+async def all_pages(db, limit, owner=OWNER):
+    pages, after = [], None
+    while True:
+        page, next_cursor = await db.quotes.list_for_user(owner, limit, after)
+        pages.append([doc["id"] for doc in page])
+        if next_cursor is None:
+            return pages
+        after = decode_cursor(next_cursor)
+
+
+def test_cursor_round_trip():
+    doc = {"created_at": START, "id": "b4c3"}
+    token = encode_cursor(doc)
+    assert "=" not in token
+    assert decode_cursor(token) == (START, "b4c3")
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "WzFd", "bnVsbA", encode_cursor({"created_at": START, "id": "x"})[:-3]])
+def test_malformed_cursors_are_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+async def test_pages_split_quotes_sharing_a_timestamp(db):
+    # Ten quotes, every page boundary falls inside a group with equal created_at
+    expected = await add_quotes(db, [START] * 4 + [START - timedelta(seconds=1)] * 6)
+    pages = await all_pages(db, 3)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sum(pages, []) == [doc["id"] for doc in expected]
+
+
+async def test_exact_multiple_of_page_size_has_no_empty_last_page(db):
+    expected = await add_quotes(db, [START - timedelta(minutes=n) for n in range(6)])
+    pages = await all_pages(db, 3)
+    assert pages == [[doc["id"] for doc in expected[:3]], [doc["id"] for doc in expected[3:]]]
+
+
+async def test_no_quotes_and_other_owners(db):
+    await add_quotes(db, [START], owner="someone-else@example.com")
+    assert await db.quotes.list_for_user(OWNER, 10) == ([], None)
+
+
+async def test_newer_quotes_do_not_shift_later_pages(db):
+    expected = await add_quotes(db, [START - timedelta(minutes=n) for n in range(5)])
+    first, next_cursor = await db.quotes.list_for_user(OWNER, 2)
+    # Arrives between page loads; offset paging would repeat a quote here
+    await add_quotes(db, [START + timedelta(minutes=1)])
+    second, _ = await db.quotes.list_for_user(OWNER, 2, decode_cursor(next_cursor))
+    assert [doc["id"] for doc in first + second] == [doc["id"] for doc in expected[:4]]
+
+
+async def test_invalid_cursor_is_a_client_error():
+    from fastapi.testclient import TestClient
+
+    from benchmarks.load import install_stand_in
+
+    with TestClient(install_stand_in(0)) as client:
+        token = client.post("/api/auth/register", json={
+            "email": "pager@example.com", "password": "Sup3rsecret!", "business_name": "Pager", "phone": "555-0100",
+        }).json()["access_token"]
+        response = client.get("/api/quotes", params={"after": "garbage"},
+                              headers={"Authorization": "Bearer %s" % token})
+    assert response.status_code == 400
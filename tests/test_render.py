@@ -0,0 +1,50 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from render import MockupRenderer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def product(tmp_path):
+    path = tmp_path / "banner.png"
+    Image.new("RGB", (600, 300), (194, 65, 12)).save(path)
+    return {"id": "p1", "image_url": path.as_uri()}
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    renderer = MockupRenderer(tmp_path / "renders", workers=1, max_bytes=0)
+    renderer.start()
+    yield renderer
+    renderer.shutdown()
+
+
+async def test_cache_keeps_only_the_newest_render_over_budget(renderer, product):
+    first = await renderer.render({"business_name": "First"}, product, None)
+    second = await renderer.render({"business_name": "Second"}, product, None)
+    assert second.exists() and not first.exists()
+    assert renderer.evicted == 1
+    # The product image cache is not part of the budget
+    assert len(list((renderer.cache_dir / "products").iterdir())) == 1
+
+
+async def test_undecodable_logo_is_not_an_os_error_about_the_product(renderer, product, tmp_path):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64)
+    with pytest.raises(UnidentifiedImageError):
+        await renderer.render({"logo_url": "/api/files/logo.png"}, product, logo)
+
+
+async def test_broken_pool_is_replaced(renderer, product):
+    # A worker process dying takes the whole pool with it
+    renderer.executor.submit(os._exit, 1)
+    with pytest.raises(BrokenProcessPool):
+        for n in range(50):
+            await renderer.render({"business_name": "Shop %d" % n}, product, None)
+    assert renderer.restarts == 1
+    assert (await renderer.render({"business_name": "After"}, product, None)).exists()
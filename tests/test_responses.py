@@ -0,0 +1,81 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from responses import parse_range, ranged_file_response
+
+BODY = bytes(range(256)) * 4
+ETAG = '"doc-v1"'
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "quote.pdf"
+    path.write_bytes(BODY)
+    app = FastAPI()
+
+    @app.get("/doc")
+    async def doc(request: Request):
+        return ranged_file_response(request, path, "application/pdf", {"ETag": ETAG})
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=1023-1023", (1023, 1023)),
+    # Ignored: multiple ranges, reversed, malformed, other units
+    ("bytes=0-1,5-6", None),
+    ("bytes=9-3", None),
+    ("bytes=-", None),
+    ("bytes=abc", None),
+    ("items=0-5", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(BODY)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=4096-5000"])
+def test_parse_range_past_the_end(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(BODY))
+
+
+def test_full_response_advertises_ranges(client):
+    response = client.get("/doc")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == ETAG
+    assert response.content == BODY
+
+
+def test_partial_content(client):
+    response = client.get("/doc", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/1024"
+    assert response.headers["content-length"] == "10"
+    assert response.content == BODY[10:20]
+
+
+def test_suffix_range(client):
+    response = client.get("/doc", headers={"Range": "bytes=-1000"})
+    assert response.status_code == 206
+    assert response.content == BODY[-1000:]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/doc", headers={"Range": "bytes=2048-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+@pytest.mark.parametrize("if_range, status", [(ETAG, 206), ('"doc-v0"', 200)])
+def test_if_range(client, if_range, status):
+    response = client.get("/doc", headers={"Range": "bytes=0-9", "If-Range": if_range})
+    assert response.status_code == status
+    assert response.content == (BODY[:10] if status == 206 else BODY)
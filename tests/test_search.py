@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.memory_mongo import MemoryClient
+from database import Database
+from search import SearchService
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 6, 1)
+
+
+async def add_quotes(db, first, count):
+    docs = [{
+        "id": str(uuid.uuid4()), "user_email": "owner@example.com",
+        "created_at": START + timedelta(seconds=n), "business_name": "Shop %d" % n, "product_name": "Mesh Banner",
+    } for n in range(first, first + count)]
+    await db.db.quotes.insert_many([dict(doc) for doc in docs])
+    return [doc["id"] for doc in docs]
+
+
+@pytest.fixture
+def service():
+    catalog = SimpleNamespace(snapshot=SimpleNamespace(
+        version=1, catalog=SimpleNamespace(products=[], get=lambda product_id: None)))
+    db = Database(MemoryClient(), "test")
+    return db, lambda **kwargs: SearchService(db, catalog, **kwargs)
+
+
+async def test_capped_index_holds_the_newest_documents(service):
+    db, make = service
+    ids = await add_quotes(db, 0, 30)
+    search = make(max_documents=10)
+    await search.catch_up()
+    assert search.quotes.size == 10
+    assert search.indexed_since["quotes"] == START + timedelta(seconds=20)
+    assert sorted(search.quotes.search("mesh banner", limit=100)[0]) == sorted(ids[20:])
+
+    # Refreshes add new documents without re-reading the ones past the cutoff
+    await add_quotes(db, 30, 2)
+    await search.catch_up()
+    assert search.quotes.size == 12
+
+
+async def test_capped_index_is_rebuilt_once_past_the_slack(service):
+    db, make = service
+    await add_quotes(db, 0, 10)
+    search = make(max_documents=10)
+    await search.catch_up()
+    before = search.quotes
+
+    await add_quotes(db, 10, 3)
+    await search.catch_up()
+    assert search.quotes is not before
+    assert search.quotes.size == 10
+    assert search.indexed_since["quotes"] == START + timedelta(seconds=3)
+
+    await add_quotes(db, 13, 1)
+    await search.catch_up()
+    assert search.quotes.size == 11
+
+
+async def test_uncapped_index_holds_everything(service):
+    db, make = service
+    await add_quotes(db, 0, 30)
+    search = make()
+    await search.catch_up()
+    assert search.quotes.size == 30
+    assert search.indexed_since["quotes"] is None
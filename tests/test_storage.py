@@ -0,0 +1,40 @@
+import hashlib
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.memory_mongo import MemoryClient
+from database import Database
+from storage import UPLOAD_URL_PREFIX, BlobStore, collect_garbage, store_upload
+from uploads import StoredUpload
+
+pytestmark = pytest.mark.anyio
+
+
+async def upload(db, blobs, tmp_path, content: bytes) -> str:
+    path = tmp_path / ("%s.part" % uuid.uuid4().hex)
+    path.write_bytes(content)
+    stored = StoredUpload("logo.png", ".png", path, len(content), hashlib.sha256(content).hexdigest())
+    record, _ = await store_upload(db, blobs, stored)
+    return record["file_id"]
+
+
+async def test_gc_keeps_logos_referenced_by_customizations_or_quotes(tmp_path):
+    db = Database(MemoryClient(), "test")
+    blobs = BlobStore(tmp_path / "blobs")
+    in_customization = await upload(db, blobs, tmp_path, b"\x89PNG customization")
+    in_quote = await upload(db, blobs, tmp_path, b"\x89PNG quote only")
+    orphan = await upload(db, blobs, tmp_path, b"\x89PNG orphan")
+
+    await db.db.customizations.insert_one({"id": "c1", "logo_url": UPLOAD_URL_PREFIX + in_customization})
+    # The customization was later changed or deleted; the quote still shows this logo
+    await db.db.quotes.insert_one({"id": "q1", "customization_data": {"logo_url": UPLOAD_URL_PREFIX + in_quote}})
+    await db.db.quotes.insert_one({"id": "q2", "customization_data": {"logo_url": ["not", "a", "url"]}})
+    await db.db.quotes.insert_one({"id": "q3", "customization_data": {}})
+
+    result = await collect_garbage(db, blobs, grace=timedelta(0))
+
+    assert result["removed"] == [orphan]
+    assert blobs.resolve(in_customization) and blobs.resolve(in_quote)
+    assert blobs.resolve(orphan) is None
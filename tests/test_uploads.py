@@ -0,0 +1,96 @@
+import io
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from uploads import NOT_ALLOWED, receive_upload
+
+
+def png_bytes(size=(32, 32)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (194, 65, 12)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    return tmp_path
+
+
+@pytest.fixture
+def client(upload_dir):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        stored = await receive_upload(request, upload_dir, max_bytes=1024 * 1024)
+        return {"extension": stored.extension, "size": stored.size, "sha256": stored.sha256}
+
+    return TestClient(app)
+
+
+def leftovers(upload_dir):
+    return [path.name for path in upload_dir.iterdir()]
+
+
+def test_genuine_png_is_accepted(client):
+    body = png_bytes()
+    response = client.post("/upload", files={"file": ("logo.PNG", body, "image/png")})
+    assert response.status_code == 200
+    assert response.json()["extension"] == ".png"
+    assert response.json()["size"] == len(body)
+
+
+@pytest.mark.parametrize("filename, content", [
+    # Right extension, wrong bytes
+    ("logo.png", b"Test file content"),
+    ("logo.jpg", png_bytes()),
+    ("brochure.pdf", b"<html><body>not a pdf</body></html>"),
+    ("artwork.ai", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64),
+    # Types that are never accepted, whatever they contain
+    ("logo.svg", b"<svg xmlns='http://www.w3.org/2000/svg'/>"),
+    ("setup.exe", b"MZ" + b"\x00" * 64),
+    ("noextension", png_bytes()),
+    # Shorter than the sniffed prefix
+    ("tiny.png", b"\x89PN"),
+])
+def test_mismatched_content_is_rejected(client, upload_dir, filename, content):
+    response = client.post("/upload", files={"file": (filename, content, "application/octet-stream")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == NOT_ALLOWED
+    assert leftovers(upload_dir) == []
+
+
+def test_illustrator_postscript_is_accepted(client):
+    response = client.post("/upload", files={"file": ("artwork.ai", b"%!PS-Adobe-3.0\n%%EOF\n", "application/postscript")})
+    assert response.status_code == 200
+
+
+def test_truncated_body_leaves_no_temp_file(client, upload_dir):
+    body = (b'--XX\r\nContent-Disposition: form-data; name="file"; filename="logo.png"\r\n'
+            b"Content-Type: image/png\r\n\r\n" + png_bytes((400, 400)))
+    response = client.post("/upload", content=body, headers={"Content-Type": "multipart/form-data; boundary=XX"})
+    assert response.status_code == 400
+    assert leftovers(upload_dir) == []
+
+
+@pytest.mark.parametrize("body", [
+    # A complete file part, then a header line without a colon: the stored file is removed too
+    b'--XX\r\nContent-Disposition: form-data; name="file"; filename="logo.png"\r\n'
+    b"Content-Type: image/png\r\n\r\n" + png_bytes() + b"\r\n--XX\r\nbroken header\r\n\r\nx\r\n--XX--\r\n",
+    # Doesn't start with the declared boundary
+    b"--YY\r\nContent-Disposition: form-data; name=\"file\"\r\n\r\nx\r\n--YY--\r\n",
+])
+def test_malformed_body_is_a_client_error(client, upload_dir, body):
+    response = client.post("/upload", content=body, headers={"Content-Type": "multipart/form-data; boundary=XX"})
+    assert response.status_code == 400
+    assert leftovers(upload_dir) == []
+
+
+def test_oversized_upload_is_rejected(client, upload_dir):
+    body = b"%PDF-1.7\n" + b"0" * (1024 * 1024)
+    response = client.post("/upload", files={"file": ("big.pdf", body, "application/pdf")})
+    assert response.status_code == 413
+    assert leftovers(upload_dir) == []
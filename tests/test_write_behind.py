@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from bson import ObjectId, json_util
+
+from benchmarks.memory_mongo import MemoryClient
+from write_behind import WriteBehindBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+def journal_lines(docs, collection="quotes"):
+    return "".join(json_util.dumps({"c": collection, "d": doc}) + "\n" for doc in docs)
+
+
+async def stored(db, collection="quotes"):
+    return await db[collection].find({}).sort("n", 1).to_list(length=None)
+
+
+async def test_crash_leaves_journal_that_next_start_replays(tmp_path):
+    db = MemoryClient()["test"]
+    # Nothing flushes on its own: every acknowledged write is still only journaled
+    crashed = WriteBehindBuffer(db, tmp_path, max_batch=1000, flush_interval=3600)
+    await crashed.start()
+    await asyncio.gather(*(crashed.enqueue("quotes", {"n": n}) for n in range(5)))
+    assert await stored(db) == []
+
+    # Simulate the process dying: tasks stop, the journal's lock goes away
+    for task in crashed._tasks:
+        task.cancel()
+    await asyncio.gather(*crashed._tasks, return_exceptions=True)
+    crashed._journal.close()
+
+    restarted = WriteBehindBuffer(db, tmp_path, flush_interval=0.01)
+    await restarted.start()
+    assert [doc["n"] for doc in await stored(db)] == [0, 1, 2, 3, 4]
+    await restarted.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_orphan_replay_skips_torn_line_and_already_written_docs(tmp_path):
+    db = MemoryClient()["test"]
+    docs = [{"_id": ObjectId(), "n": n} for n in range(3)]
+    # The first document reached Mongo before the crash
+    await db.quotes.insert_one(dict(docs[0]))
+    (tmp_path / "journal-4242.1.segment").write_text(journal_lines(docs) + '{"c": "quotes", "d": {"n"')
+
+    inserted = []
+    buffer = WriteBehindBuffer(db, tmp_path)
+
+    async def record(chunk):
+        inserted.extend(doc["n"] for doc in chunk)
+
+    buffer.after_insert["quotes"] = record
+    await buffer.start()
+    await buffer.close()
+
+    assert [doc["n"] for doc in await stored(db)] == [0, 1, 2]
+    assert sorted(inserted) == [1, 2]
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_concurrent_replays_write_each_document_once(tmp_path):
+    # Latency lets the two workers' replays interleave
+    db = MemoryClient(latency=0.001)["test"]
+    docs = [{"_id": ObjectId(), "n": n} for n in range(50)]
+    (tmp_path / "journal-4242.log").write_text(journal_lines(docs[:25]))
+    (tmp_path / "journal-4243.1.segment").write_text(journal_lines(docs[25:] + docs[:10]))
+
+    workers = [WriteBehindBuffer(db, tmp_path, max_batch=7) for _ in range(3)]
+    await asyncio.gather(*(worker._replay_orphans() for worker in workers))
+
+    assert [doc["n"] for doc in await stored(db)] == list(range(50))
+    assert not list(tmp_path.glob("journal-424*"))
+
+
+async def test_flusher_survives_unexpected_errors(tmp_path, monkeypatch):
+    db = MemoryClient()["test"]
+    buffer = WriteBehindBuffer(db, tmp_path, flush_interval=0.01)
+    await buffer.start()
+    rotate = buffer._rotate
+    failures = []
+
+    def flaky_rotate(segment):
+        if not failures:
+            failures.append(segment)
+            raise OSError("disk full")
+        rotate(segment)
+
+    monkeypatch.setattr(buffer, "_rotate", flaky_rotate)
+    await asyncio.gather(*(buffer.enqueue("quotes", {"n": n}) for n in range(3)))
+    for _ in range(100):
+        if len(await stored(db)) == 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert failures and buffer.failed_flushes == 1
+    assert [doc["n"] for doc in await stored(db)] == [0, 1, 2]
+    await buffer.close()